@@ -1,13 +1,25 @@
 import json
 import time
+from typing import Literal
 import torch
 import sqlite3
 import pandas as pd
 from transformers import AutoTokenizer, AutoModelForCausalLM
-import re
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
+import conversation_store
+import intent_router
+import llm_engine
+import metrics
+import reading_ring
+import response_cache
+import segment_log
+import sensor_db
+import tool_executor
+import tool_grammar
+import tool_registry
+
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -16,6 +28,16 @@ CORS(app)  # Enable CORS for all routes
 # 1️⃣ Load the LLM and its specific tool-use template
 # ========================
 MODEL_NAME = "LiquidAI/LFM2-350M"
+STORAGE_BACKEND = "sqlite"  # must match the VLM server: "sqlite" or "segment_log"
+ENABLE_INTENT_ROUTER = True  # answer common commands without running the LLM
+LLM_MAX_BATCH_SIZE = 4  # concurrent /interact requests decoded together
+LLM_BATCH_WAIT = 0.02  # seconds the scheduler waits for more requests to batch
+CONSTRAIN_TOOL_CALLS = True  # only let the model emit schema-valid tool calls
+MAX_TOOL_STEPS = 4  # tool-call rounds per user turn before the loop gives up
+TOOL_TIMEOUT = 10.0  # seconds a single tool call may take before it is reported as timed out
+RESPONSE_CACHE_SIZE = 256  # stateless answers kept per reading; any new reading invalidates them
+SESSION_CACHE_BYTES = 512 * 1024 * 1024  # KV cache memory shared by all conversation sessions
+SESSION_MAX_TOKENS = 8192  # a longer conversation starts over from the system prompt
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, trust_remote_code=True)
 model = AutoModelForCausalLM.from_pretrained(MODEL_NAME, trust_remote_code=True)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -23,12 +45,20 @@ model = model.to(device)
 
 print(f"[INFO] LLM loaded successfully on {device}.")
 
+metrics.MODEL_MEMORY_BYTES.labels("llm").set_function(lambda: metrics.model_memory_bytes(model))
+
 # ========================
 # 2️⃣ Function definitions for tools
 # ========================
-def control_fan(state: str):
+# Tools are registered with @TOOL_REGISTRY.tool: the schema shown to the model
+# comes from the signature and the docstring's first paragraph and Args
+TOOL_REGISTRY = tool_registry.ToolRegistry()
+ENABLED_TOOLS = None  # tool names offered to the model, None for every registered tool
+
+@TOOL_REGISTRY.tool
+def control_fan(state: Literal["on", "off"]):
     """
-    Controls the state of the fan.
+    Controls the state of the fan. Use this to turn the fan on or off.
     Args:
         state (str): The desired state of the fan, either "on" or "off".
     Returns:
@@ -45,9 +75,10 @@ def control_fan(state: str):
     else:
         return "Invalid state. Please specify 'on' or 'off'."
 
-def control_drain(state: str):
+@TOOL_REGISTRY.tool
+def control_drain(state: Literal["open", "closed"]):
     """
-    Controls the state of the drain.
+    Controls the state of the drain. Use this to open or close the drain.
     Args:
         state (str): The desired state of the drain, either "open" or "closed".
     Returns:
@@ -64,26 +95,54 @@ def control_drain(state: str):
     else:
         return "Invalid state. Please specify 'open' or 'closed'."
 
+readings_ring = None
+
+def get_readings_ring():
+    """Open (or reopen after a VLM server restart) the shared readings ring"""
+    global readings_ring
+    if readings_ring is None or readings_ring.is_stale():
+        readings_ring = reading_ring.open_reader()
+    return readings_ring
+
+def reading_version():
+    """Version of the latest readings (advanced by the VLM server per reading); None without the ring"""
+    ring = get_readings_ring()
+    return ring.version if ring is not None else None
+
+@TOOL_REGISTRY.tool(cacheable=True)
 def get_sensor_data():
     """
-    Fetches the latest sensor data from the SQLite database.
+    Retrieves the most recent temperature, pressure, and rain data from the sensors database.
+    Use this tool when asked about current sensor readings or environmental conditions.
+
+    Reads the shared ring written by the VLM server when it is running,
+    otherwise the configured storage backend.
     Returns:
         str: A JSON string containing the latest temperature, pressure, and rain.
     """
+    ring = get_readings_ring()
+    latest = ring.latest() if ring is not None else None
+    if latest is None and STORAGE_BACKEND == "segment_log":
+        latest = segment_log.SegmentLog().latest()
+    if latest is not None:
+        latest.pop("ts")
+        return json.dumps({"status": "success", "data": latest})
+
     db_path = "sensors-json.db"
     try:
         conn = sqlite3.connect(db_path)
         # Select the latest temperature, pressure, and rain from the sensor_data table
         # Note: The error "no such column: humidity" suggests your database might not have a 'humidity' column.
         # I've adjusted the query to only include columns that are present in your original code (temperature, pressure, rain).
-        query = "SELECT temperature, pressure, rain FROM sensor_data ORDER BY timestamp DESC LIMIT 1"
+        query = f"SELECT temperature, pressure, rain FROM sensor_data ORDER BY {sensor_db.order_column(conn)} DESC LIMIT 1"
         df = pd.read_sql_query(query, conn)
         conn.close()
 
         if df.empty:
             return json.dumps({"status": "error", "message": "No data found in the database."})
 
-        latest_data = df.iloc[0].to_dict()
+        # Gauges the VLM could not read are stored as NULL, not 0
+        latest_data = {k: (None if pd.isna(v) else v) for k, v in df.iloc[0].to_dict().items()}
         return json.dumps({"status": "success", "data": latest_data})
 
     except sqlite3.Error as e:
@@ -91,87 +150,365 @@ def get_sensor_data():
     except Exception as e:
         return json.dumps({"status": "error", "message": f"An unexpected error occurred: {e}"})
 
+# Read-only tool results and whole stateless answers are reused until the next
+# reading arrives; without the readings ring nothing is cached
+TOOL_RESULT_CACHE = response_cache.VersionedCache("tool_result", reading_version)
+RESPONSE_CACHE = response_cache.VersionedCache("response", reading_version, max_entries=RESPONSE_CACHE_SIZE)
+
+# Calls to different tools in one block run concurrently, results in call order
+TOOL_EXECUTOR = tool_executor.ToolExecutor(TOOL_REGISTRY.functions, timeout=TOOL_TIMEOUT,
+                                           result_cache=TOOL_RESULT_CACHE, cacheable=TOOL_REGISTRY.cacheable)
+
+# Compiled patterns first, then a word-overlap classifier for close paraphrases
+INTENT_ROUTER = intent_router.IntentRouter(
+    classifier=intent_router.KeywordClassifier(intent_router.DEFAULT_EXAMPLES))
+
+def render_system_message():
+    """The LFM2 system prompt listing the enabled tools (rendered once per tool set)."""
+    return TOOL_REGISTRY.system_message(ENABLED_TOOLS)
+
+def prepare_prompt_cache():
+    """Points the prefix cache at the enabled tools' system turn; returns its ids."""
+    prefix_ids = TOOL_REGISTRY.prompt_ids(tokenizer, ENABLED_TOOLS)
+    PROMPT_CACHE.prepare(render_system_message(), prefix_ids)
+    return prefix_ids
+
+# Key/value state of the system prompt, prefilled once and copied per request;
+# enabling other tools changes the rendered prompt and triggers a new prefill
+PROMPT_CACHE = llm_engine.PrefixCache(model, tokenizer, device)
+prepare_prompt_cache()
+PROMPT_CACHE.calibrate()
+
+tool_call_grammars = {}
+
+def get_tool_call_grammar():
+    """Grammar for the enabled tools, built once per tool set."""
+    key = TOOL_REGISTRY.key(ENABLED_TOOLS)
+    if key not in tool_call_grammars:
+        try:
+            tool_call_grammars[key] = tool_grammar.ToolCallGrammar(TOOL_REGISTRY.schemas(key), tokenizer)
+        except ValueError as e:
+            print(f"[WARN] Tool calls will not be constrained: {e}")
+            tool_call_grammars[key] = None
+    return tool_call_grammars[key]
+
+# All generation goes through one scheduler thread that batches concurrent requests
+SCHEDULER = llm_engine.BatchScheduler(
+    model, tokenizer, device,
+    prefix_cache=PROMPT_CACHE,
+    max_batch_size=LLM_MAX_BATCH_SIZE,
+    max_wait=LLM_BATCH_WAIT,
+    temperature=0.3,
+    min_p=0.15,
+    repetition_penalty=1.05,
+)
+# Generation ends at the end of the turn or as soon as a tool call is closed
+TOOL_CALL_START_ID = tokenizer.convert_tokens_to_ids(tool_grammar.TOOL_CALL_START)
+TOOL_CALL_END_ID = tokenizer.convert_tokens_to_ids(tool_grammar.TOOL_CALL_END)
+IM_END_ID = tokenizer.convert_tokens_to_ids("<|im_end|>")
+STOP_IDS = SCHEDULER.default_stop_ids() | {TOOL_CALL_END_ID}
+get_tool_call_grammar()
+
+# Conversation histories by session id; their KV caches are evicted least
+# recently used first and recomputed from the history when needed again
+SESSIONS = conversation_store.ConversationStore(llm_engine.cache_nbytes, max_cache_bytes=SESSION_CACHE_BYTES)
+
 # ========================
 # 3️⃣ Main processing function
 # ========================
-def process_llm_response(user_input):
-    # Construct the prompt with all tool definitions
-    system_message = """List of tools: <|tool_list_start|>[
-        {"name": "control_fan", "description": "Controls the state of the fan. Use this to turn the fan on or off.", "parameters": {"type": "object", "properties": {"state": {"type": "string", "enum": ["on", "off"], "description": "The desired state of the fan ('on' or 'off')."}}, "required": ["state"]}},
-        {"name": "control_drain", "description": "Controls the state of the drain. Use this to open or close the drain.", "parameters": {"type": "object", "properties": {"state": {"type": "string", "enum": ["open", "closed"], "description": "The desired state of the drain ('open' or 'closed')."}}, "required": ["state"]}},
-        {"name": "get_sensor_data", "description": "Retrieves the most recent temperature, pressure, and rain data from the sensors database. Use this tool when asked about current sensor readings or environmental conditions.", "parameters": {"type": "object", "properties": {}}}
-    ]<|tool_list_end|>
-    You are a helpful assistant.
-    """
-    messages = [
-        {"role": "system", "content": system_message},
-        {"role": "user", "content": user_input}
-    ]
-
-    input_ids = tokenizer.apply_chat_template(
-        messages,
-        add_generation_prompt=True,
-        return_tensors="pt",
-        tokenize=True,
-    ).to(device)
-
-    # Generate the model's response
-    output = model.generate(
+def handle_interaction(user_input, session_id=None):
+    """
+    Answers one /interact request: commands the intent router recognizes are
+    dispatched straight to their tool, everything else goes to the LLM.
+    Args:
+        user_input (str): The user's message.
+        session_id (str): Conversation to continue, or None for a one-off turn.
+    Returns:
+        dict: The response plus `served_by` ("intent_router" or "llm").
+    """
+    with metrics.timed("intent_route"):
+        intent = INTENT_ROUTER.route(user_input) if ENABLE_INTENT_ROUTER else None
+
+    with SESSIONS.checkout(session_id) as session:
+        if intent is not None:
+            tool_response = TOOL_EXECUTOR.run([(intent["tool"], intent["args"])])[0]
+            metrics.INTERACT_REQUESTS_TOTAL.labels("intent_router").inc()
+            record_routed_turn(session, user_input, intent, tool_response)
+            result = {
+                "response": f"<|tool_response_start|>{tool_response}<|tool_response_end|>",
+                "served_by": "intent_router",
+                "intent": intent["intent"],
+                "match": intent["source"],
+            }
+        elif session_id is None:
+            # Stateless questions repeat; their answers hold until the next reading
+            key = response_cache_key(user_input)
+            version = RESPONSE_CACHE.version()
+            cached = RESPONSE_CACHE.get(key, version)
+            if cached is not None:
+                metrics.INTERACT_REQUESTS_TOTAL.labels("response_cache").inc()
+                result = {**cached, "served_by": "response_cache"}
+            else:
+                metrics.INTERACT_REQUESTS_TOTAL.labels("llm").inc()
+                result = {**process_llm_response(user_input, session), "served_by": "llm"}
+                if is_cacheable_response(result["response"], result["tool_calls"]):
+                    RESPONSE_CACHE.put(key, version, result)
+        else:
+            metrics.INTERACT_REQUESTS_TOTAL.labels("llm").inc()
+            result = {**process_llm_response(user_input, session), "served_by": "llm"}
+
+    if session_id is not None:
+        result["session_id"] = session_id
+    return result
+
+def response_cache_key(user_input):
+    """Answers are shared by inputs that normalize alike, per enabled tool set."""
+    return intent_router.normalize(user_input), TOOL_REGISTRY.key(ENABLED_TOOLS)
+
+def is_cacheable_response(response, tool_calls):
+    """Only answers that called read-only tools (or none) may be replayed."""
+    if response.startswith("Error"):
+        return False
+    return all(call["name"] in TOOL_REGISTRY.cacheable for call in tool_calls)
+
+def render_user_turn(user_input, context_ids=None):
+    """Chat-template text that appends a user message to a conversation."""
+    if not context_ids:
+        # Directly after the system turn, which ends in a newline
+        return f"<|im_start|>user\n{user_input}<|im_end|>\n<|im_start|>assistant\n"
+    # A turn cut off before the model closed it is closed here
+    closing = "" if context_ids[-1] == IM_END_ID else "<|im_end|>"
+    return f"{closing}\n<|im_start|>user\n{user_input}<|im_end|>\n<|im_start|>assistant\n"
+
+def build_llm_prompt(user_input):
+    """Token ids of the system prompt plus the user's message for generation."""
+    # The system turn with all tool definitions is tokenized once per tool set;
+    # only the user's message is tokenized per request
+    prefix_ids = prepare_prompt_cache()
+    with metrics.timed("preprocess"):
+        return prefix_ids + tokenizer(render_user_turn(user_input), add_special_tokens=False).input_ids
+
+def session_prompt(session, user_input):
+    """
+    Prompt ids for the next turn of a session, and the cache to resume from.
+    Returns:
+        tuple: (token ids list, past_key_values or None)
+    """
+    system_message = render_system_message()
+    if (session.context_ids and session.system_message == system_message
+            and len(session.context_ids) < SESSION_MAX_TOKENS):
+        prepare_prompt_cache()
+        with metrics.timed("preprocess"):
+            turn_ids = tokenizer(render_user_turn(user_input, session.context_ids), add_special_tokens=False).input_ids
+        return session.context_ids + turn_ids, session.past_key_values
+    session.reset()
+    return build_llm_prompt(user_input), None
+
+def render_tool_call(func_name, args):
+    """Renders a call the way the model writes it, e.g. control_fan(state="on")."""
+    return f"{func_name}({', '.join(f'{key}={json.dumps(value)}' for key, value in args.items())})"
+
+def record_routed_turn(session, user_input, intent, tool_response):
+    """Adds a turn the intent router answered to the session's history."""
+    if session.session_id is None:
+        return
+    context_ids, past_key_values = session_prompt(session, user_input)
+    call = render_tool_call(intent["tool"], intent["args"])
+    text = (f"<|tool_call_start|>[{call}]<|tool_call_end|>" + render_tool_turn([tool_response])
+            + f"{tool_response}<|im_end|>")
+    # The cache still covers a prefix of the history; the next LLM turn feeds the rest
+    context_ids += tokenizer(text, add_special_tokens=False).input_ids
+    SESSIONS.update(session, context_ids, past_key_values, render_system_message())
+
+def submit_llm_request(input_ids, streamer, past_key_values=None, allow_tool_calls=True):
+    """Queues a prompt on the scheduler with the tool-call stop and grammar."""
+    # The scheduler batches it with concurrent requests, or continues from
+    # the prefilled system prompt (or the previous step's cache) when alone
+    grammar = get_tool_call_grammar() if CONSTRAIN_TOOL_CALLS else None
+    return SCHEDULER.submit(
         input_ids,
         max_new_tokens=512,  # Adjust as needed
-        do_sample=True,
-        temperature=0.3,
-        min_p=0.15,
-        repetition_penalty=1.05,
+        # Without tool calls, opening a call block ends the generation instead
+        stop_ids=STOP_IDS if allow_tool_calls else STOP_IDS | {TOOL_CALL_START_ID},
+        streamer=streamer,
+        constraint=grammar.new_state() if grammar is not None else None,
+        past_key_values=past_key_values,
+        keep_cache=True,
     )
 
-    decoded_output = tokenizer.decode(output[0], skip_special_tokens=False)
+def render_tool_turn(results):
+    """Closes the assistant's tool-call turn and adds the tool results as a tool turn."""
+    content = results[0] if len(results) == 1 else json.dumps(results)
+    return (f"<|im_end|>\n<|im_start|>tool\n<|tool_response_start|>{content}<|tool_response_end|><|im_end|>\n"
+            f"<|im_start|>assistant\n")
+
+def run_llm_turn(user_input, session):
+    """
+    Runs one user turn through the LLM, executing tool calls until the model
+    answers in text (or MAX_TOOL_STEPS rounds have run). After each round the
+    tool results are appended and decoding resumes from the same KV cache, so
+    only the new tokens are prefilled; the session keeps both for its next turn.
+    Yields:
+        tuple: ("token", text), ("tool_call", name, args),
+            ("tool_result", name, result), ("error", message) and finally
+            ("answer", text, steps).
+    """
+    context_ids, past_key_values = session_prompt(session, user_input)
+    for step in range(1, MAX_TOOL_STEPS + 2):
+        # After MAX_TOOL_STEPS rounds the model must answer with what it has
+        final_step = step > MAX_TOOL_STEPS
+        stream = llm_engine.TokenStream(tokenizer)
+        llm_request = submit_llm_request(torch.tensor([context_ids], device=device), stream, past_key_values,
+                                         allow_tool_calls=not final_step)
+
+        answer = []
+        calls = []
+        call_ids = None  # token ids inside an open tool-call block
+        for token_id, text in stream.iter_text():
+            if token_id == TOOL_CALL_START_ID:
+                call_ids = []
+            elif call_ids is not None:
+                if token_id != TOOL_CALL_END_ID:
+                    call_ids.append(token_id)
+                    continue
+                block = tokenizer.decode(call_ids, skip_special_tokens=False)
+                call_ids = None
+                try:
+                    with metrics.timed("parse"):
+                        parsed = tool_executor.parse_tool_calls(block)
+                except ValueError as e:
+                    metrics.PARSE_FAILURES_TOTAL.labels("llm").inc()
+                    yield ("error", f"Could not parse tool call {block}: {e}")
+                    continue
+                for func_name, args in parsed:
+                    yield ("tool_call", func_name, args)
+                calls.extend(parsed)
+            elif text:
+                answer.append(text)
+                yield ("token", text)
+
+        new_ids = llm_request.result()
+        stream.record_metrics()
+        if final_step and new_ids and new_ids[-1] == TOOL_CALL_START_ID:
+            # The cut-off call is not kept in the history; the cache never held it
+            new_ids = new_ids[:-1]
+        context_ids += new_ids
+        past_key_values = llm_request.past_key_values
+
+        if not calls or final_step:
+            SESSIONS.update(session, context_ids, past_key_values, render_system_message())
+            yield ("answer", "".join(answer).strip(), step)
+            return
 
-    # Parse the output for tool calls
-    tool_call_match = re.search(r"<\|tool_call_start\|>\[(.*?)\]<\|tool_call_end\|>", decoded_output, re.DOTALL)
+        results = []
+        for (func_name, _), result in zip(calls, TOOL_EXECUTOR.iter_results(calls)):
+            results.append(result)
+            yield ("tool_result", func_name, result)
+        with metrics.timed("preprocess"):
+            context_ids += tokenizer(render_tool_turn(results), add_special_tokens=False).input_ids
 
-    if tool_call_match:
-        tool_call_str = tool_call_match.group(1).strip()
+def process_llm_response(user_input, session):
+    """
+    Runs the LLM turn to completion.
+    Returns:
+        dict: The final answer, every tool call with its result, and the step count.
+    """
+    tool_calls = []
+    answered = 0  # results arrive in call order
+    answer, steps = "", 0
+    for event in run_llm_turn(user_input, session):
+        if event[0] == "tool_call":
+            tool_calls.append({"name": event[1], "args": event[2]})
+        elif event[0] == "tool_result":
+            tool_calls[answered]["result"] = event[2]
+            answered += 1
+        elif event[0] == "error":
+            answer = f"Error: {event[1]}"
+        elif event[0] == "answer":
+            answer, steps = event[1] or answer, event[2]
+
+    results = [call["result"] for call in tool_calls if "result" in call]
+    if not answer:
+        answer = ("<|tool_response_start|>" + results[-1] + "<|tool_response_end|>"
+                  if results else "Could not understand the request or generate a response.")
+    return {"response": answer, "tool_calls": tool_calls, "steps": steps}
+
+def sse_event(event_type, **fields):
+    """Formats one server-sent event carrying a JSON object."""
+    return f"data: {json.dumps({'type': event_type, **fields})}\n\n"
+
+def stream_interaction(user_input, session_id=None):
+    """
+    Streams one /interact request as server-sent events: `token` events with
+    text as it is generated, a `tool_call` event as soon as the call block
+    closes, the `tool_result` once the tool has run, and a final `done`.
+    """
+    with metrics.timed("intent_route"):
+        intent = INTENT_ROUTER.route(user_input) if ENABLE_INTENT_ROUTER else None
+    session_fields = {"session_id": session_id} if session_id is not None else {}
+
+    with SESSIONS.checkout(session_id) as session:
+        if intent is not None:
+            metrics.INTERACT_REQUESTS_TOTAL.labels("intent_router").inc()
+            yield sse_event("tool_call", name=intent["tool"], args=intent["args"])
+            tool_response = TOOL_EXECUTOR.run([(intent["tool"], intent["args"])])[0]
+            record_routed_turn(session, user_input, intent, tool_response)
+            yield sse_event("tool_result", name=intent["tool"], result=tool_response)
+            yield sse_event("done", served_by="intent_router", intent=intent["intent"], match=intent["source"],
+                            **session_fields)
+            return
+
+        if session_id is None:
+            key = response_cache_key(user_input)
+            version = RESPONSE_CACHE.version()
+            cached = RESPONSE_CACHE.get(key, version)
+            if cached is not None:
+                metrics.INTERACT_REQUESTS_TOTAL.labels("response_cache").inc()
+                for call in cached["tool_calls"]:
+                    yield sse_event("tool_call", name=call["name"], args=call["args"])
+                    yield sse_event("tool_result", name=call["name"], result=call.get("result"))
+                yield sse_event("token", text=cached["response"])
+                yield sse_event("done", served_by="response_cache", response=cached["response"],
+                                steps=cached["steps"])
+                return
+
+        metrics.INTERACT_REQUESTS_TOTAL.labels("llm").inc()
+        tool_calls = []
+        failed = False
         try:
-            # Basic parsing for function calls
-            func_name_match = re.match(r"(\w+)\((.*)\)", tool_call_str)
-            if func_name_match:
-                func_name = func_name_match.group(1)
-                args_str = func_name_match.group(2)
-                args = {}
-                # Parse arguments (simple key-value pairs)
-                for arg_pair in args_str.split(','):
-                    if '=' in arg_pair:
-                        key, value = arg_pair.split('=', 1)
-                        # Clean up potential quotes around values
-                        args[key.strip()] = value.strip().strip('"\'')
-
-                if func_name == "control_fan":
-                    tool_response = control_fan(**args)
-                elif func_name == "control_drain":
-                    tool_response = control_drain(**args)
-                elif func_name == "get_sensor_data":
-                    tool_response = get_sensor_data()
-                else:
-                    return "Error: Unsupported tool call."
-                
-                # Format the tool response to send back to the LLM
-                return f"<|tool_response_start|>{tool_response}<|tool_response_end|>"
-            else:
-                return "Error: Could not parse tool call arguments."
+            for event in run_llm_turn(user_input, session):
+                if event[0] == "token":
+                    yield sse_event("token", text=event[1])
+                elif event[0] == "tool_call":
+                    tool_calls.append({"name": event[1], "args": event[2]})
+                    yield sse_event("tool_call", name=event[1], args=event[2])
+                elif event[0] == "tool_result":
+                    next(call for call in tool_calls if "result" not in call)["result"] = event[2]
+                    yield sse_event("tool_result", name=event[1], result=event[2])
+                elif event[0] == "error":
+                    failed = True
+                    yield sse_event("error", message=event[1])
+                elif event[0] == "answer":
+                    if session_id is None and event[1] and not failed and is_cacheable_response(event[1], tool_calls):
+                        RESPONSE_CACHE.put(key, version, {"response": event[1], "tool_calls": tool_calls,
+                                                          "steps": event[2]})
+                    yield sse_event("done", served_by="llm", response=event[1], steps=event[2], **session_fields)
         except Exception as e:
-            return f"Error executing tool call: {e}"
-    else:
-        # If no tool call, return the decoded assistant response
-        assistant_response_match = re.search(r"<\|im_start\|>assistant(.*?)<\|im_end\|>", decoded_output, re.DOTALL)
-        if assistant_response_match:
-            return assistant_response_match.group(1).strip()
-        else:
-            return "Could not understand the request or generate a response."
+            SESSIONS.drop_cache(session)
+            yield sse_event("error", message=str(e))
 
 # ========================
 # 4️⃣ Flask API Endpoint
 # ========================
+def request_session_id(data):
+    """
+    Session id from an /interact payload: the given `session_id`, a new one
+    when the key is present but empty, or None for a stateless request.
+    """
+    if 'session_id' not in data:
+        return None
+    return str(data['session_id']) if data['session_id'] else SESSIONS.new_session_id()
+
 @app.route('/interact', methods=['POST', 'OPTIONS'])
 def interact_with_llm():
     """
@@ -195,16 +532,48 @@ def interact_with_llm():
     if not user_input:
         return jsonify({"error": "Missing 'user_input' in request payload"}), 400
 
-    # Process the user input with the LLM
-    response = process_llm_response(user_input)
+    # Common commands are served by the intent router, the rest by the LLM
+    response = handle_interaction(user_input, request_session_id(data))
 
     # The response might be a tool call response or a direct assistant response
     # For simplicity, we'll just return the processed response as JSON
     # In a more complex app, you might want to handle tool call chaining differently
-    result = jsonify({"response": response})
+    result = jsonify(response)
+    result.headers.add('Access-Control-Allow-Origin', '*')
+    return result
+
+@app.route('/interact/stream', methods=['POST', 'OPTIONS'])
+def interact_with_llm_stream():
+    """
+    Streaming variant of /interact: same JSON payload, answered as
+    server-sent events (token, tool_call, tool_result, done).
+    """
+    # Handle CORS preflight request
+    if request.method == 'OPTIONS':
+        response = jsonify({'status': 'OK'})
+        response.headers.add('Access-Control-Allow-Origin', '*')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,ngrok-skip-browser-warning')
+        response.headers.add('Access-Control-Allow-Methods', 'POST,OPTIONS')
+        return response
+
+    if not request.is_json:
+        return jsonify({"error": "Request must be JSON"}), 415
+
+    data = request.get_json()
+    user_input = data.get('user_input')
+    if not user_input:
+        return jsonify({"error": "Missing 'user_input' in request payload"}), 400
+
+    result = Response(stream_interaction(user_input, request_session_id(data)), mimetype='text/event-stream')
     result.headers.add('Access-Control-Allow-Origin', '*')
+    result.headers.add('Cache-Control', 'no-cache')
     return result
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose LLM metrics in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype=metrics.CONTENT_TYPE)
+
 # ========================
 # 5️⃣ Run the Flask App
 # ========================
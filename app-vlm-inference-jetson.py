@@ -1,16 +1,28 @@
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response, render_template_string, request
 from flask_cors import CORS
 import os
 import time
 import base64
+import hashlib
 import json
 import threading
 import random
 from PIL import Image
 import io
+import itertools
 import sqlite3
+from collections import deque
 from datetime import datetime
 
+import numpy as np
+
+import frame_store
+import lttb
+import metrics
+import reading_ring
+import segment_log
+import sensor_db
+
 
 # Import VLM processor
 try:
@@ -27,12 +39,30 @@ CORS(app)
 # Configuration
 # IMAGE_FOLDER = 'merged_gauges_csv'
 IMAGE_FOLDER = 'merged_gauges_csv'
+STREAM_NAME = sensor_db.DEFAULT_STREAM  # camera/stream id stored with each reading
 STREAM_INTERVAL = 60  # seconds
+STORAGE_BACKEND = 'sqlite'  # 'sqlite', or 'segment_log' for append-only segment files at high frame rates
 ENABLE_VLM = VLM_AVAILABLE  # Only enable if VLM is available
 
+TIMING_HISTORY_SIZE = 100  # frames kept for /status timing aggregates
+
+# Frames behind each reading, deduplicated by content hash and shrunk on write
+FRAME_STORE = frame_store.FrameStore(frame_store.FRAME_STORE_DIR, max_side=768)
+
+# Raw readings older than this are pruned; rollups keep the history, and
+# frames no remaining reading refers to are released with them
+RETENTION_POLICY = sensor_db.RetentionPolicy(raw_days=7, frame_store=FRAME_STORE)
+
 # Global VLM processor
 vlm_processor = None
 
+# Per-stage timing blocks of the most recent VLM results
+recent_timings = deque(maxlen=TIMING_HISTORY_SIZE)
+
+# Shared-memory ring of recent readings for the LLM server and dashboards
+readings_ring = None
+readings_ring_lock = threading.Lock()
+
 def get_image_files():
     if not os.path.exists(IMAGE_FOLDER):
         return []
@@ -46,16 +76,20 @@ def get_image_files():
     
     return sorted(image_files)
 
-def encode_image_to_base64(image_path):
-    """Convert image to base64 string"""
+def read_image(image_path):
+    """Read raw image bytes, or None if the file cannot be read"""
     try:
-        with open(image_path, 'rb') as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-            return encoded_string
+        with metrics.timed("image_read"):
+            with open(image_path, 'rb') as image_file:
+                return image_file.read()
     except Exception as e:
-        print(f"Error encoding image {image_path}: {e}")
+        print(f"Error reading image {image_path}: {e}")
         return None
 
+def encode_image_to_base64(image_bytes):
+    """Convert image bytes to base64 string"""
+    return base64.b64encode(image_bytes).decode('utf-8')
+
 def process_image_with_vlm(image_path):
     """Process image with VLM and return gauge readings"""
     global vlm_processor
@@ -77,11 +111,15 @@ def process_image_with_vlm(image_path):
             vlm_processor = initialize_vlm()
             print("VLM processor initialized successfully!")
         
-        # Process image
+        # Process image; latency_ms times only the model call, unrounded
+        vlm_start = time.perf_counter()
         result = process_image_for_gauges(image_path=image_path)
+        result['latency_ms'] = (time.perf_counter() - vlm_start) * 1000
         processing_time = time.time() - start_time
         
         result['processing_time'] = round(processing_time, 2)
+        if result.get('timings'):
+            recent_timings.append(result['timings'])
         return result
         
     except Exception as e:
@@ -94,34 +132,58 @@ def process_image_with_vlm(image_path):
             'processing_time': 0
         }
 
-def save_vlm_readings_to_db(vlm_result):
-    """Save VLM gauge readings to SQLite database."""
+def summarize_timings():
+    """Aggregate the recent VLM timing blocks into mean/p50/p95/last per field"""
+    history = list(recent_timings)
+    summary = {'samples': len(history)}
+    if not history:
+        return summary
+    
+    for key in history[-1]:
+        values = sorted(t[key] for t in history if t.get(key) is not None)
+        if not values:
+            continue
+        summary[key] = {
+            'mean': round(sum(values) / len(values), 4),
+            'p50': values[len(values) // 2],
+            'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+            'last': history[-1][key]
+        }
+    return summary
+
+def publish_reading(ts, readings):
+    """Append a reading to the shared ring; one stream thread writes at a time"""
+    global readings_ring
+    with readings_ring_lock:
+        if readings_ring is None:
+            readings_ring = reading_ring.ReadingRing(create=True)
+        readings_ring.append(ts, readings)
+
+def get_reading_writer():
+    """Writer for the configured STORAGE_BACKEND; both share the submit() API"""
+    if STORAGE_BACKEND == 'segment_log':
+        return segment_log.get_log_writer(retention=RETENTION_POLICY)
+    return sensor_db.get_db_writer(retention=RETENTION_POLICY)
+
+def save_vlm_readings_to_db(vlm_result, image_bytes=None):
+    """Queue VLM gauge readings for the storage writer thread; True if queued."""
     if not vlm_result.get('success'):
-        return
+        return False
+    
+    ts = sensor_db.now_ms()
+    reading = sensor_db.reading_from_vlm_result(vlm_result, ts, stream=STREAM_NAME)
+    reading['timestamp'] = datetime.fromtimestamp(ts / 1000).strftime("%Y-%m-%d %H:%M:%S")
     
-    readings = vlm_result.get('gauge_readings', {})
-    temperature = float(readings.get("thermometer", 0))
-    pressure = float(readings.get("pressure_gauge", 0))
-    rain = float(readings.get("rain_gauge", 0))
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    publish_reading(ts, {column: reading[column] for column in sensor_db.GAUGE_COLUMNS})
     
-    conn = sqlite3.connect("sensors-json.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sensor_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT,
-            temperature REAL,
-            pressure REAL,
-            rain REAL
-        )
-    """)
-    cursor.execute("""
-        INSERT INTO sensor_data (timestamp, temperature, pressure, rain)
-        VALUES (?, ?, ?, ?)
-    """, (timestamp, temperature, pressure, rain))
-    conn.commit()
-    conn.close()
+    # Archive the frame before its row can be committed; frames of failed
+    # readings are never referenced, so they are not stored at all
+    if image_bytes is not None:
+        with metrics.timed("frame_store"):
+            FRAME_STORE.put(image_bytes, vlm_result['image_hash'])
+    
+    # Queued for the background writer, which commits in batches
+    return get_reading_writer().submit(reading)
 
 
 def generate_image_stream():
@@ -138,14 +200,17 @@ def generate_image_stream():
             current_image = image_files[image_index]
             image_path = os.path.join(IMAGE_FOLDER, current_image)
             
-            encoded_image = encode_image_to_base64(image_path)
+            image_bytes = read_image(image_path)
             
-            if encoded_image:
+            if image_bytes:
+                encoded_image = encode_image_to_base64(image_bytes)
+                
                 # Process image with VLM
                 vlm_result = process_image_with_vlm(image_path)
+                vlm_result['image_hash'] = hashlib.sha256(image_bytes).hexdigest()
                 
-                # Save readings to DB
-                save_vlm_readings_to_db(vlm_result)
+                # Save readings (and their frame) to DB
+                save_vlm_readings_to_db(vlm_result, image_bytes)
 
                 data = {
                     'image': encoded_image,
@@ -156,7 +221,10 @@ def generate_image_stream():
                     'vlm_analysis': vlm_result
                 }
                 
+                send_start = time.perf_counter()
                 yield f"data: {json.dumps(data)}\n\n"
+                metrics.observe_stage("sse_send", time.perf_counter() - send_start)
+                metrics.FRAMES_TOTAL.inc()
                 
                 # Enhanced logging
                 if vlm_result['success']:
@@ -177,6 +245,7 @@ def generate_image_stream():
                         'processing_time': 0
                     }
                 }
+                metrics.DROPPED_FRAMES_TOTAL.labels("image_load").inc()
                 yield f"data: {json.dumps(error_data)}\n\n"
             
             image_index = (image_index + 1) % len(image_files)
@@ -188,6 +257,7 @@ def generate_image_stream():
                 'error': f'Stream error: {str(e)}',
                 'timestamp': time.time()
             }
+            metrics.DROPPED_FRAMES_TOTAL.labels("stream_error").inc()
             yield f"data: {json.dumps(error_data)}\n\n"
             time.sleep(STREAM_INTERVAL)
 
@@ -222,9 +292,123 @@ def status():
             'available': VLM_AVAILABLE,
             'enabled': ENABLE_VLM,
             'initialized': vlm_processor is not None
-        }
+        },
+        'vlm_timings': summarize_timings()
     }
 
+RAW_FIELDS = ('ts', 'value', 'confidence')
+BUCKET_FIELDS = ('bucket', 'count', 'mean', 'min', 'max', 'last')
+
+# Compact column types for downsampling; integer columns are never NULL
+FIELD_DTYPES = {'ts': 'i8', 'bucket': 'i8', 'count': 'i8'}
+
+def downsample_points(points, fields, max_points):
+    """
+    Keep at most max_points of a series via LTTB. The range is streamed into
+    one structured NumPy array (8 bytes per field and row, NULL as NaN)
+    instead of lists of boxed Python values.
+    """
+    dtype = np.dtype([(f, FIELD_DTYPES.get(f, 'f8')) for f in fields])
+    rows = np.fromiter(
+        (tuple(np.nan if point.get(f) is None else point[f] for f in fields) for point in points),
+        dtype=dtype)
+    y_field = 'value' if fields is RAW_FIELDS else 'mean'
+    # LTTB cannot place points without a value
+    rows = rows[~np.isnan(rows[y_field])]
+    keep = lttb.lttb_indices(rows[fields[0]], rows[y_field], max_points)
+    for row in rows[keep].tolist():
+        yield {f: (None if value != value else value) for f, value in zip(fields, row)}
+
+def open_series(gauge, start_ms, end_ms, bucket, stream):
+    """
+    Open the DB and start the series query before the response begins, so
+    a missing table or other DB error becomes an error status rather than
+    a truncated body. Returns (connection, points iterator).
+    """
+    conn = sensor_db.connect()
+    try:
+        # The writer may not have opened this database yet
+        sensor_db.ensure_schema(conn)
+        points = sensor_db.iter_series(conn, gauge, start_ms, end_ms, bucket=bucket, stream=stream)
+        first = next(points, None)
+    except Exception:
+        conn.close()
+        raise
+    return conn, (points if first is None else itertools.chain([first], points))
+
+def generate_series(conn, points, gauge, start_ms, end_ms, bucket, stream, output_format, max_points=None):
+    """Yield the /readings body chunk by chunk straight from the DB cursor"""
+    try:
+        fields = RAW_FIELDS if bucket == 'raw' else BUCKET_FIELDS
+        if max_points:
+            # LTTB needs the whole range, but only as compact columns
+            points = downsample_points(points, fields, max_points)
+        if output_format == 'csv':
+            yield ','.join(fields) + '\n'
+            for point in points:
+                yield ','.join('' if point.get(f) is None else str(point[f]) for f in fields) + '\n'
+        else:
+            header = {'gauge': gauge, 'stream': stream, 'bucket': bucket, 'start': start_ms, 'end': end_ms}
+            yield json.dumps(header)[:-1] + ', "points": ['
+            separator = ''
+            for point in points:
+                yield separator + json.dumps({f: point.get(f) for f in fields})
+                separator = ','
+            yield ']}'
+    finally:
+        conn.close()
+
+@app.route('/readings')
+def readings():
+    """
+    Reading history for one gauge.
+    Query params: gauge (required), stream, start/end (epoch ms, default
+    last 24h), bucket (raw | minute | hour | day | width in ms, default
+    hour), format (json | csv) and max_points (LTTB-downsample to at most
+    this many chart points).
+    """
+    gauge = request.args.get('gauge')
+    if not gauge or sensor_db.column_for_gauge(gauge) is None:
+        return {'error': f"Unknown or missing 'gauge', expected one of {list(sensor_db.GAUGE_NAMES)}"}, 400
+    
+    try:
+        end_ms = int(request.args.get('end', sensor_db.now_ms()))
+        start_ms = int(request.args.get('start', end_ms - sensor_db.ROLLUP_RESOLUTIONS['day']))
+    except ValueError:
+        return {'error': "'start' and 'end' must be epoch milliseconds"}, 400
+    
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in sensor_db.ROLLUP_RESOLUTIONS and bucket != 'raw':
+        if not bucket.isdigit() or int(bucket) <= 0:
+            return {'error': "'bucket' must be raw, minute, hour, day or a width in ms"}, 400
+        bucket = int(bucket)
+    
+    output_format = request.args.get('format', 'json')
+    if output_format not in ('json', 'csv'):
+        return {'error': "'format' must be json or csv"}, 400
+    
+    max_points = request.args.get('max_points')
+    if max_points is not None:
+        if not max_points.isdigit() or int(max_points) < 3:
+            return {'error': "'max_points' must be an integer >= 3"}, 400
+        max_points = int(max_points)
+    
+    stream = request.args.get('stream')
+    try:
+        conn, points = open_series(gauge, start_ms, end_ms, bucket, stream)
+    except sqlite3.Error as e:
+        return {'error': f"Database error: {e}"}, 503
+    
+    return Response(
+        generate_series(conn, points, gauge, start_ms, end_ms, bucket, stream, output_format, max_points),
+        mimetype='text/csv' if output_format == 'csv' else 'application/json'
+    )
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose pipeline metrics in the Prometheus text format"""
+    return Response(metrics.registry.render(), mimetype=metrics.CONTENT_TYPE)
+
 CLIENT_HTML = '''
 <!DOCTYPE html>
 <html lang="en">
@@ -429,6 +613,14 @@ CLIENT_HTML = '''
 
             html += '</div>';
             html += `<div class="processing-time">Processed in ${processingTime}s</div>`;
+            
+            const timings = vlmData.timings;
+            if (timings && timings.time_to_first_token !== null && timings.time_to_first_token !== undefined) {
+                const tps = timings.tokens_per_second ? timings.tokens_per_second.toFixed(1) : '-';
+                html += `<div class="processing-time">Prefill ${timings.time_to_first_token}s ` +
+                        `(${timings.prompt_tokens} tokens, ${timings.image_tokens} image) · ` +
+                        `Decode ${timings.generated_tokens} tokens at ${tps} tok/s</div>`;
+            }
 
             vlmContent.innerHTML = html;
         }
@@ -528,6 +720,8 @@ if __name__ == '__main__':
     print("- Client page: http://localhost:5001/")
     print("- Stream endpoint: http://localhost:5001/stream")
     print("- Status endpoint: http://localhost:5001/status")
+    print("- Metrics endpoint: http://localhost:5001/metrics")
+    print("- Readings endpoint: http://localhost:5001/readings?gauge=thermometer&bucket=hour")
     
     if VLM_AVAILABLE and ENABLE_VLM:
         print("\n⚡ VLM Integration Active - Images will be analyzed for gauge readings!")
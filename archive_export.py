@@ -0,0 +1,241 @@
+"""
+Archive Export Module for Reading History
+Streams sensor_data into day-partitioned files for offline analysis: Parquet
+(needs pyarrow) or the dependency-light delta/XOR series codec for edge storage
+
+Usage:
+    python3 archive_export.py [db_path] [archive_dir] [parquet|series]
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+import sensor_db
+import series_codec
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "archive"
+STATE_FILE = "_export_state.json"
+CODECS = ("parquet", "series")
+SERIES_SUFFIX = ".series"
+
+
+def _require_pyarrow():
+    if not PYARROW_AVAILABLE:
+        raise RuntimeError("pyarrow is required for Parquet archives: pip install pyarrow")
+
+
+def _day(ts):
+    return datetime.fromtimestamp(ts / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _gauge_columns(conn, table="sensor_data"):
+    """Registry gauges stored in the table as (archive column, stored column) pairs"""
+    columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+    return sensor_db.stored_gauge_columns(columns)
+
+
+def archive_schema(gauges):
+    """Compact columnar schema: ms timestamps, int64 ids, float32 gauge values"""
+    _require_pyarrow()
+    fields = [pa.field("ts", pa.timestamp("ms", tz="UTC")), pa.field("id", pa.int64())]
+    fields += [pa.field(gauge, pa.float32()) for gauge in gauges]
+    return pa.schema(fields)
+
+
+def load_state(archive_dir):
+    """Read the export high-water mark (last exported row id)"""
+    path = os.path.join(archive_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {"last_id": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(archive_dir, state):
+    path = os.path.join(archive_dir, STATE_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _write_day(archive_dir, day, schema, rows, first_id):
+    day_dir = os.path.join(archive_dir, f"date={day}")
+    os.makedirs(day_dir, exist_ok=True)
+    columns = list(zip(*rows))
+    table = pa.Table.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema,
+    )
+    # One file per (day, chunk); the first id keeps names unique and ordered
+    pq.write_table(table, os.path.join(day_dir, f"part-{first_id:012d}.parquet"), compression="zstd")
+
+
+def _write_day_series(archive_dir, day, gauges, rows, first_id):
+    day_dir = os.path.join(archive_dir, f"date={day}")
+    os.makedirs(day_dir, exist_ok=True)
+    columns = list(zip(*rows))
+    table = {"ts": np.array(columns[0], dtype=np.int64), "id": np.array(columns[1], dtype=np.int64)}
+    for gauge, values in zip(gauges, columns[2:]):
+        table[gauge] = np.array([np.nan if value is None else value for value in values], dtype=np.float32)
+    path = os.path.join(day_dir, f"part-{first_id:012d}{SERIES_SUFFIX}")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(series_codec.encode_table(table))
+    os.replace(tmp_path, path)
+
+
+def export_readings(db_path=sensor_db.DB_PATH, archive_dir=ARCHIVE_DIR, chunk_size=50000, codec="parquet"):
+    """
+    Append rows newer than the high-water mark to the Parquet archive
+
+    Rows are read in chunks of `chunk_size`, so memory stays bounded no matter
+    how large the table is. The high-water mark is only advanced after a
+    chunk's files are written.
+
+    Args:
+        db_path (str): SQLite database to export
+        archive_dir (str): Root of the day-partitioned archive
+        chunk_size (int): Rows fetched and written per chunk
+        codec (str): "parquet", or "series" for delta/XOR-encoded files that
+            need only NumPy to write and read
+
+    Returns:
+        int: Number of rows exported
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec!r}, expected one of {CODECS}")
+    if codec == "parquet":
+        _require_pyarrow()
+    os.makedirs(archive_dir, exist_ok=True)
+    state = load_state(archive_dir)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        # Archives use the registry names (`rain`, not sensors.db's `length`)
+        # and leave out non-gauge REAL columns such as latency_ms
+        pairs = _gauge_columns(conn)
+        gauges = [gauge for gauge, _ in pairs]
+        schema = archive_schema(gauges) if codec == "parquet" else None
+        select = (f"SELECT {sensor_db.TS_COLUMN}, id, {', '.join(stored for _, stored in pairs)} FROM sensor_data "
+                  f"WHERE id > ? AND {sensor_db.TS_COLUMN} IS NOT NULL ORDER BY id LIMIT ?")
+        exported = 0
+        while True:
+            rows = conn.execute(select, (state["last_id"], chunk_size)).fetchall()
+            if not rows:
+                break
+
+            by_day = {}
+            for row in rows:
+                by_day.setdefault(_day(row[0]), []).append(row)
+            for day, day_rows in by_day.items():
+                if codec == "parquet":
+                    _write_day(archive_dir, day, schema, day_rows, day_rows[0][1])
+                else:
+                    _write_day_series(archive_dir, day, gauges, day_rows, day_rows[0][1])
+
+            state["last_id"] = rows[-1][1]
+            save_state(archive_dir, state)
+            exported += len(rows)
+    finally:
+        conn.close()
+
+    logger.info(f"Exported {exported} rows to {archive_dir}")
+    return exported
+
+
+def read_range(start_ms, end_ms, archive_dir=ARCHIVE_DIR, columns=None):
+    """
+    Load readings with start_ms <= ts < end_ms from the archive
+
+    The day partitions and the ts predicate are both pushed down to the
+    dataset scanner, so only the matching files and row groups are read.
+
+    Args:
+        start_ms (int): Inclusive range start (epoch ms)
+        end_ms (int): Exclusive range end (epoch ms)
+        archive_dir (str): Root of the day-partitioned archive
+        columns (list): Columns to load, None for all
+
+    Returns:
+        pyarrow.Table: Matching rows sorted by ts
+    """
+    _require_pyarrow()
+    partitioning = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+    dataset = ds.dataset(archive_dir, format="parquet", partitioning=partitioning)
+    start = pa.scalar(start_ms, type=pa.timestamp("ms", tz="UTC"))
+    end = pa.scalar(end_ms, type=pa.timestamp("ms", tz="UTC"))
+    predicate = (
+        (ds.field("date") >= _day(start_ms)) & (ds.field("date") <= _day(end_ms - 1))
+        & (ds.field("ts") >= start) & (ds.field("ts") < end)
+    )
+    table = dataset.to_table(columns=columns, filter=predicate)
+    if "ts" in table.column_names:
+        table = table.sort_by("ts")
+    return table
+
+
+def read_series_range(start_ms, end_ms, archive_dir=ARCHIVE_DIR, columns=None):
+    """
+    Load readings with start_ms <= ts < end_ms from series-codec files
+
+    Only the day partitions overlapping the range are opened, and only the
+    requested columns (plus ts) are decompressed.
+
+    Args:
+        start_ms (int): Inclusive range start (epoch ms)
+        end_ms (int): Exclusive range end (epoch ms)
+        archive_dir (str): Root of the day-partitioned archive
+        columns (list): Columns to load, None for all
+
+    Returns:
+        dict: Column name -> NumPy array, sorted by ts (epoch ms)
+    """
+    first_day, last_day = _day(start_ms), _day(end_ms - 1)
+    wanted = None if columns is None else set(columns) | {"ts"}
+    parts = []
+    for entry in sorted(os.listdir(archive_dir)) if os.path.isdir(archive_dir) else []:
+        if not entry.startswith("date=") or not first_day <= entry[5:] <= last_day:
+            continue
+        day_dir = os.path.join(archive_dir, entry)
+        for filename in sorted(os.listdir(day_dir)):
+            if not filename.endswith(SERIES_SUFFIX):
+                continue
+            with open(os.path.join(day_dir, filename), "rb") as f:
+                part = series_codec.decode_table(f.read(), columns=wanted)
+            keep = (part["ts"] >= start_ms) & (part["ts"] < end_ms)
+            parts.append({name: values[keep] for name, values in part.items()})
+
+    if not parts:
+        return {}
+    result = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    order = np.argsort(result["ts"], kind="stable")
+    result = {name: values[order] for name, values in result.items()}
+    if columns is not None and "ts" not in columns:
+        result.pop("ts")
+    return result
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    db_path = sys.argv[1] if len(sys.argv) > 1 else sensor_db.DB_PATH
+    archive_dir = sys.argv[2] if len(sys.argv) > 2 else ARCHIVE_DIR
+    codec = sys.argv[3] if len(sys.argv) > 3 else "parquet"
+    count = export_readings(db_path, archive_dir, codec=codec)
+    print(f"Exported {count} new rows from {db_path} to {archive_dir}/")
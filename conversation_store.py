@@ -0,0 +1,180 @@
+"""
+Conversation Store Module for Multi-Turn Sessions
+Keeps each /interact session's token history server-side together with the
+KV cache covering it, so a follow-up turn only prefills its own tokens.
+
+Histories are small and kept for every live session; caches are large and
+live in an LRU bounded by their total size. An evicted session simply has
+no cache, and its next turn recomputes it from the stored history.
+"""
+
+import collections
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class Session:
+    """One conversation; `lock` is held while a turn runs on it"""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.context_ids = []  # every token of the conversation so far
+        self.system_message = None  # system prompt the history was built on
+        self.past_key_values = None  # cache covering context_ids[:-1], or None
+        self.cache_bytes = 0
+        self.turns = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Forget the history (e.g. after the system prompt changed)"""
+        self.context_ids = []
+        self.system_message = None
+        self.past_key_values = None
+        self.cache_bytes = 0
+        self.turns = 0
+
+
+class ConversationStore:
+    """
+    Session histories plus a memory-bounded LRU of their KV caches
+
+    Usage:
+        with store.checkout(session_id) as session:  # None: a stateless turn
+            ... resume from session.past_key_values ...
+            store.update(session, context_ids, past_key_values)
+    """
+
+    def __init__(self, cache_size, max_cache_bytes=DEFAULT_MAX_CACHE_BYTES, max_sessions=256,
+                 idle_seconds=3600):
+        """
+        Args:
+            cache_size (callable): Bytes held by a cache object
+            max_cache_bytes (int): Total size of the caches kept across sessions
+            max_sessions (int): Sessions kept before the least recent is dropped
+            idle_seconds (float): Sessions unused for this long are dropped
+        """
+        self.cache_size = cache_size
+        self.max_cache_bytes = max_cache_bytes
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions = collections.OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        metrics.SESSION_CACHE_BYTES.set_function(self.cache_bytes)
+
+    def cache_bytes(self):
+        """Bytes held by the caches currently kept"""
+        with self._lock:
+            return sum(session.cache_bytes for session in self._sessions.values())
+
+    def __len__(self):
+        return len(self._sessions)
+
+    @staticmethod
+    def new_session_id():
+        """Fresh random session id"""
+        return uuid.uuid4().hex
+
+    def _drop_cache(self, session):
+        if session.past_key_values is not None:
+            metrics.CACHE_EVICTIONS_TOTAL.labels("session_kv").inc()
+        session.past_key_values = None
+        session.cache_bytes = 0
+
+    def _expire(self):
+        """Drop idle sessions and the least recent ones over max_sessions"""
+        now = time.monotonic()
+        # The most recent session is the one being checked out
+        for session_id, session in list(self._sessions.items())[:-1]:
+            if session.lock.locked():
+                continue
+            if now - session.last_used > self.idle_seconds or len(self._sessions) > self.max_sessions:
+                del self._sessions[session_id]
+
+    def drop_cache(self, session):
+        """Discard a session's cache (e.g. after a failed turn), keeping its history"""
+        with self._lock:
+            self._drop_cache(session)
+
+    def _enforce_budget(self):
+        """Evict caches, least recently used first, until they fit the budget"""
+        total = sum(session.cache_bytes for session in self._sessions.values())
+        for session in list(self._sessions.values()):
+            if total <= self.max_cache_bytes:
+                break
+            if session.cache_bytes and not session.lock.locked():
+                total -= session.cache_bytes
+                self._drop_cache(session)
+
+    @contextmanager
+    def checkout(self, session_id=None):
+        """
+        Lock a session for one turn, creating it if unknown
+
+        A turn that raises (or a stream that is abandoned) leaves the cache in
+        an unknown state, so the session keeps its history but loses its cache.
+
+        Args:
+            session_id (str): Session id, or None for a stateless turn whose
+                session is never stored
+
+        Yields:
+            Session: The locked session, now the most recently used
+        """
+        if session_id is None:
+            yield Session(None)
+            return
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id)
+            self._sessions.move_to_end(session_id)
+            self._expire()
+
+        with session.lock:
+            try:
+                yield session
+            except BaseException:
+                with self._lock:
+                    self._drop_cache(session)
+                raise
+            finally:
+                session.last_used = time.monotonic()
+
+    def update(self, session, context_ids, past_key_values, system_message=None):
+        """
+        Store a finished turn's history and cache
+
+        Args:
+            session (Session): Session checked out by the caller
+            context_ids (list): Every token of the conversation so far
+            past_key_values: Cache covering context_ids[:-1], or None if the
+                turn did not produce a reusable one
+            system_message (str): System prompt the history starts with
+        """
+        if session.session_id is None:
+            return
+        size = self.cache_size(past_key_values) if past_key_values is not None else 0
+        with self._lock:
+            session.context_ids = list(context_ids)
+            session.system_message = system_message
+            session.turns += 1
+            if size > self.max_cache_bytes:
+                logger.info(f"Cache of session {session.session_id} exceeds the budget, not keeping it")
+                self._drop_cache(session)
+            else:
+                session.past_key_values = past_key_values
+                session.cache_bytes = size
+            self._sessions.move_to_end(session.session_id)
+            # The session being updated is locked, so it is never evicted here
+            self._enforce_budget()
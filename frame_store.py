@@ -0,0 +1,211 @@
+"""
+Frame Store Module for Archived Gauge Images
+Content-addressed, deduplicated blob store for the frames behind each
+reading. Blobs are keyed by the SHA-256 of the original image bytes (the
+`image_hash` stored in sensor_data) and sharded by hash prefix.
+
+Usage:
+    python3 frame_store.py gc [db_path] [frames_dir] [segment_log_dir]
+
+gc keeps frames referenced by either the database or the segment log.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+import segment_log
+import sensor_db
+
+logger = logging.getLogger(__name__)
+
+FRAME_STORE_DIR = "frames"
+
+
+class FrameStore:
+    """Sharded content-addressed store: <root>/<ab>/<cd>/<sha256>.jpg"""
+
+    def __init__(self, root=FRAME_STORE_DIR, max_side=None, quality=85):
+        """
+        Args:
+            root (str): Directory holding the shards
+            max_side (int): Re-encode frames so the longer side is at most
+                this many pixels, None to store the original bytes
+            quality (int): JPEG quality used when re-encoding
+        """
+        self.root = root
+        self.max_side = max_side
+        self.quality = quality
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def __contains__(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def _encode(self, image_bytes):
+        if self.max_side is None or not PIL_AVAILABLE:
+            return image_bytes
+        image = Image.open(io.BytesIO(image_bytes))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((self.max_side, self.max_side))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=self.quality, optimize=True)
+        # Keep the original if re-encoding does not actually save space
+        return out.getvalue() if out.tell() < len(image_bytes) else image_bytes
+
+    def put(self, image_bytes, digest=None):
+        """
+        Store a frame unless an identical one is already archived
+
+        Args:
+            image_bytes (bytes): Original encoded image
+            digest (str): SHA-256 hex of image_bytes, computed if omitted
+
+        Returns:
+            str: The frame's content hash
+        """
+        digest = digest or hashlib.sha256(image_bytes).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            # A new reading refers to it: restart its grace period
+            try:
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass  # released meanwhile; store it again
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._encode(image_bytes))
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest):
+        """Stored bytes for a hash, or None if it is not archived"""
+        try:
+            with open(self.path_for(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path_for(digest))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_digests(self):
+        """Walk every stored hash with its modification time"""
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".jpg"):
+                    path = os.path.join(dirpath, filename)
+                    yield filename[:-4], os.path.getmtime(path)
+
+    def _mtime(self, digest):
+        try:
+            return os.path.getmtime(self.path_for(digest))
+        except OSError:
+            return None
+
+    def release(self, conn, digests, grace_seconds=3600, referenced=None):
+        """
+        Delete blobs whose last referencing reading has just been removed
+
+        Called by the retention policy with the hashes of the rows it
+        deleted; each check is one lookup on the image_hash index. As in
+        gc(), blobs stored or re-put within `grace_seconds` are kept: an
+        identical frame may belong to a reading still in the writer queue.
+
+        Args:
+            conn (sqlite3.Connection): Database whose sensor_data rows
+                reference frames, or None
+            digests (iterable): Hashes of the removed readings
+            grace_seconds (float): Minimum age of a deleted blob
+            referenced (set): Hashes still referenced elsewhere (e.g. by
+                segment log records)
+
+        Returns:
+            int: Number of blobs deleted
+        """
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        for digest in set(d for d in digests if d):
+            mtime = self._mtime(digest)
+            if mtime is None or mtime >= cutoff:
+                continue
+            if referenced is not None and digest in referenced:
+                continue
+            if conn is not None and conn.execute("SELECT 1 FROM sensor_data WHERE image_hash = ? LIMIT 1", (digest,)).fetchone():
+                continue
+            try:
+                deleted += self.delete(digest)
+            except OSError as e:
+                # Left for the next gc(); one stuck blob must not stop retention
+                logger.warning(f"Cannot delete frame {digest}: {e}")
+        return deleted
+
+    def gc(self, conn, grace_seconds=3600, referenced=None):
+        """
+        Full sweep for blobs no reading refers to
+
+        Blobs younger than `grace_seconds` are kept, since their rows may
+        still be waiting in the writer queue.
+
+        Args:
+            conn (sqlite3.Connection): Database whose sensor_data rows
+                reference frames, or None
+            grace_seconds (float): Minimum age of a deleted blob
+            referenced (set): Hashes referenced outside the database (e.g.
+                by segment log records)
+
+        Returns:
+            int: Number of blobs deleted
+        """
+        referenced = set(referenced or ())
+        if conn is not None:
+            referenced.update(row[0] for row in conn.execute(
+                "SELECT DISTINCT image_hash FROM sensor_data WHERE image_hash IS NOT NULL"))
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        for digest, mtime in self.iter_digests():
+            if digest not in referenced and mtime < cutoff:
+                try:
+                    deleted += self.delete(digest)
+                except OSError as e:
+                    logger.warning(f"Cannot delete frame {digest}: {e}")
+        logger.info(f"Frame GC removed {deleted} unreferenced blobs from {self.root}")
+        return deleted
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] != "gc":
+        print(__doc__)
+        sys.exit(1)
+    db_path = sys.argv[2] if len(sys.argv) > 2 else sensor_db.DB_PATH
+    frames_dir = sys.argv[3] if len(sys.argv) > 3 else FRAME_STORE_DIR
+    log_dir = sys.argv[4] if len(sys.argv) > 4 else segment_log.SEGMENT_LOG_DIR
+    # Frames written through the segment log backend have no database row
+    log_hashes = segment_log.SegmentLogSet(log_dir).image_hashes()
+    conn = sqlite3.connect(db_path) if os.path.exists(db_path) else None
+    try:
+        removed = FrameStore(frames_dir).gc(conn, referenced=log_hashes)
+    finally:
+        if conn is not None:
+            conn.close()
+    print(f"Removed {removed} unreferenced frames from {frames_dir}/")
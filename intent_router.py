@@ -0,0 +1,154 @@
+"""
+Intent Router Module for Common Commands
+Deterministic fast path ahead of the LLM: normalized text is matched against
+one compiled pattern per intent and dispatched straight to a tool call.
+A tiny bag-of-words classifier can optionally catch close paraphrases.
+Anything compound, conditional or negated is left to the LLM.
+"""
+
+import re
+
+# Intent name -> (tool name, arguments)
+INTENTS = {
+    "fan_on": ("control_fan", {"state": "on"}),
+    "fan_off": ("control_fan", {"state": "off"}),
+    "drain_open": ("control_drain", {"state": "open"}),
+    "drain_closed": ("control_drain", {"state": "closed"}),
+    "sensor_data": ("get_sensor_data", {}),
+}
+
+# Patterns run on normalized text (see normalize); one alternation per intent
+INTENT_PATTERNS = {
+    "fan_on": [
+        r"(turn|switch|put|set) (the )?fans? on",
+        r"(turn|switch) on (the )?fans?",
+        r"(start|enable|run) (the )?fans?",
+        r"fans? on",
+    ],
+    "fan_off": [
+        r"(turn|switch|put|set) (the )?fans? off",
+        r"(turn|switch) off (the )?fans?",
+        r"(stop|disable|kill) (the )?fans?",
+        r"fans? off",
+    ],
+    "drain_open": [
+        r"open (up )?(the )?drains?",
+        r"drains? open",
+    ],
+    "drain_closed": [
+        r"(close|shut) (the )?drains?",
+        r"drains? (closed|close|shut)",
+    ],
+    "sensor_data": [
+        r"(what is|what are|show( me)?|get( me)?|read|check|give me) (the )?(current |latest |)"
+        r"(sensor data|sensor readings|readings|gauges?|gauge readings|conditions|temperature|pressure|rain)",
+        r"(current|latest) (sensor data|sensor readings|readings|conditions|temperature|pressure|rain)",
+        r"how (hot|cold|warm) is it",
+        r"is it raining",
+    ],
+}
+
+# Inputs that need reasoning (conditions, several actions, negation) go to the LLM
+DEFER_PATTERN = re.compile(r"\b(and|then|if|unless|but|not|dont|never|when|after|before|or)\b")
+
+_CONTRACTIONS = {"what's": "what is", "whats": "what is", "don't": "dont", "it's": "it is"}
+_POLITE = re.compile(r"^(please |could you |can you |would you |hey |ok |okay )+|( please| thanks| thank you)$")
+_PUNCTUATION = re.compile(r"[^a-z0-9' ]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text):
+    """Lowercase, expand contractions, drop punctuation and politeness padding"""
+    text = _SPACES.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+    text = " ".join(_CONTRACTIONS.get(word, word) for word in text.split(" "))
+    while True:
+        stripped = _POLITE.sub("", text).strip()
+        if stripped == text:
+            return text.replace("'", "")
+        text = stripped
+
+
+class KeywordClassifier:
+    """
+    Tiny nearest-example classifier over word sets
+
+    Scores an input by the best Jaccard overlap with each intent's example
+    phrases; only a score at or above `threshold` counts as a match.
+    """
+
+    def __init__(self, examples, threshold=0.75):
+        """
+        Args:
+            examples (dict): Intent name -> list of example phrases
+            threshold (float): Minimum overlap score in [0, 1]
+        """
+        self.threshold = threshold
+        self.examples = [(intent, frozenset(normalize(phrase).split()))
+                         for intent, phrases in examples.items() for phrase in phrases]
+
+    def classify(self, normalized_text):
+        """Return (intent, score) of the best match above threshold, else (None, score)"""
+        words = frozenset(normalized_text.split())
+        best_intent, best_score = None, 0.0
+        for intent, example in self.examples:
+            score = len(words & example) / len(words | example)
+            if score > best_score:
+                best_intent, best_score = intent, score
+        if best_score < self.threshold:
+            return None, best_score
+        return best_intent, best_score
+
+
+DEFAULT_EXAMPLES = {
+    "fan_on": ["turn on the fan", "fan on now", "i need the fan running", "get the fan going"],
+    "fan_off": ["turn off the fan", "fan off now", "i want the fan stopped", "shut the fan down"],
+    "drain_open": ["open the drain", "let the water drain out", "drain the water"],
+    "drain_closed": ["close the drain", "seal the drain", "keep the water in"],
+    "sensor_data": ["current sensor readings", "latest gauge values", "how are the conditions",
+                    "what do the gauges say"],
+}
+
+
+class IntentRouter:
+    """Compiled pattern router with an optional classifier fallback"""
+
+    def __init__(self, patterns=INTENT_PATTERNS, intents=INTENTS, classifier=None):
+        """
+        Args:
+            patterns (dict): Intent name -> list of regexes over normalized text
+            intents (dict): Intent name -> (tool name, arguments)
+            classifier (KeywordClassifier): Consulted when no pattern matches
+        """
+        self.intents = intents
+        self.classifier = classifier
+        # One anchored alternation with a named group per intent: a single match call
+        alternatives = [f"(?P<{intent}>{'|'.join(regexes)})" for intent, regexes in patterns.items()]
+        self.pattern = re.compile(f"^(?:{'|'.join(alternatives)})$")
+
+    def route(self, text):
+        """
+        Map a user input to a tool call without the LLM
+
+        Args:
+            text (str): Raw user input
+
+        Returns:
+            dict: {intent, tool, args, source, score}, or None to use the LLM
+        """
+        normalized = normalize(text)
+        if not normalized or DEFER_PATTERN.search(normalized):
+            return None
+
+        match = self.pattern.match(normalized)
+        if match is not None:
+            intent, source, score = match.lastgroup, "pattern", 1.0
+        elif self.classifier is not None:
+            intent, score = self.classifier.classify(normalized)
+            if intent is None:
+                return None
+            source = "classifier"
+        else:
+            return None
+
+        tool, args = self.intents[intent]
+        return {"intent": intent, "tool": tool, "args": dict(args), "source": source, "score": score}
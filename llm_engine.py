@@ -0,0 +1,530 @@
+"""
+LLM Engine Module for the Tool-Calling Assistant
+Helpers around a transformers causal LM that avoid redundant work: the
+tool-list system prompt is prefilled once and every request continues from
+a copy of that key/value state, and concurrent requests are decoded
+together in batches by a single scheduler thread.
+"""
+
+import collections
+import copy
+import hashlib
+import logging
+import queue
+import threading
+import time
+
+import torch
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def copy_cache(past_key_values):
+    """Independent copy of a cache object so the original can be reused"""
+    return copy.deepcopy(past_key_values)
+
+
+def cache_nbytes(past_key_values):
+    """Bytes held by the tensors of a cache object"""
+    total = 0
+    seen = set()
+    pending = [past_key_values]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if torch.is_tensor(item):
+            total += item.numel() * item.element_size()
+        elif isinstance(item, (list, tuple)):
+            pending.extend(item)
+        elif isinstance(item, dict):
+            pending.extend(item.values())
+        elif hasattr(item, "__dict__"):
+            pending.extend(vars(item).values())
+    return total
+
+
+def select_cache_rows(past_key_values, indices):
+    """
+    Keep only the given batch rows of a cache, in place
+
+    Hybrid caches (LFM2) hold per-layer conv state next to keys and values,
+    which the generic batch_select_indices() does not know about, so their
+    tensor lists are indexed directly.
+
+    Args:
+        past_key_values: transformers cache object
+        indices (torch.Tensor): Batch rows to keep, in order
+    """
+    if not hasattr(past_key_values, "conv_cache") and hasattr(past_key_values, "batch_select_indices"):
+        past_key_values.batch_select_indices(indices)
+        return
+    for name in ("key_cache", "value_cache", "conv_cache"):
+        tensors = getattr(past_key_values, name, None)
+        if not isinstance(tensors, list):
+            continue
+        for layer, tensor in enumerate(tensors):
+            # Unused slots of hybrid caches are empty placeholder tensors
+            if torch.is_tensor(tensor) and tensor.numel():
+                tensors[layer] = tensor.index_select(0, indices.to(tensor.device))
+
+
+def sample_next_tokens(logits, histories, temperature, min_p, repetition_penalty, do_sample=True, allowed=None):
+    """
+    Pick one token per row with the same controls generate() was given
+
+    Args:
+        logits (torch.Tensor): [rows, vocab] next-token logits
+        histories (list): Per row, the token ids seen so far (for the penalty)
+        temperature (float): Softmax temperature
+        min_p (float): Drop tokens below min_p * the top probability
+        repetition_penalty (float): >1 discourages tokens already seen
+        do_sample (bool): False for greedy decoding
+        allowed (list): Per row, the only token ids it may pick, or None
+
+    Returns:
+        torch.Tensor: [rows] chosen token ids
+    """
+    logits = logits.float()
+    if repetition_penalty != 1.0:
+        for row, history in enumerate(histories):
+            seen = torch.tensor(sorted(set(history)), device=logits.device, dtype=torch.long)
+            scores = logits[row, seen]
+            logits[row, seen] = torch.where(scores < 0, scores * repetition_penalty, scores / repetition_penalty)
+    for row, token_ids in enumerate(allowed or ()):
+        if token_ids is not None:
+            mask = torch.full_like(logits[row], float("-inf"))
+            mask[torch.tensor(token_ids, device=logits.device, dtype=torch.long)] = 0.0
+            logits[row] += mask
+    if not do_sample:
+        return logits.argmax(dim=-1)
+    probs = torch.softmax(logits / max(temperature, 1e-5), dim=-1)
+    if min_p:
+        probs = torch.where(probs < min_p * probs.max(dim=-1, keepdim=True).values, 0.0, probs)
+    return torch.multinomial(probs, 1).squeeze(-1)
+
+
+class GenerationRequest:
+    """One queued generation; result() blocks until its sequence finishes"""
+
+    def __init__(self, input_ids, max_new_tokens, stop_ids, streamer=None, constraint=None,
+                 past_key_values=None, keep_cache=False):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        self.stop_ids = stop_ids
+        self.streamer = streamer
+        self.constraint = constraint
+        # In: cache covering a prefix of input_ids. Out (keep_cache): cache
+        # covering input_ids + output_ids[:-1], ready to be resumed
+        self.past_key_values = past_key_values
+        self.keep_cache = keep_cache
+        self.output_ids = []
+        self.error = None
+        self._done = threading.Event()
+
+    def finish(self, error=None):
+        self.error = error
+        if self.streamer is not None:
+            self.streamer.end()
+        self._done.set()
+
+    def result(self, timeout=None):
+        """Generated token ids (including the stop token that ended them)"""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Generation did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.output_ids
+
+
+class PrefixCache:
+    """
+    Prefilled key/value state for a fixed prompt prefix
+
+    The prefix is tokenized with the chat template and run through the model
+    once; requests whose token ids start with it only prefill their own
+    suffix. The state is rebuilt whenever the prefix text changes, so
+    editing the tool list invalidates it automatically.
+
+    The prefix ids and their state are published together as one immutable
+    (key, prefix ids, cache) entry and never advanced in place: readers
+    take the entry once and copy its cache, so a concurrent prepare() can
+    never pair one prefix's ids with another's cache.
+
+    Hybrid models such as LFM2 keep short-convolution state next to the
+    attention cache, and some implementations only advance that state one
+    token at a time. calibrate() checks once whether a multi-token
+    continuation matches a full prefill and otherwise feeds suffixes token
+    by token (still skipping the long prefix).
+    """
+
+    def __init__(self, model, tokenizer, device):
+        """
+        Args:
+            model: transformers causal LM
+            tokenizer: Matching tokenizer with a chat template
+            device (torch.device): Device the model runs on
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self._entry = None  # (key, prefix ids, cache), replaced as a whole
+        self.chunk_size = None  # None = whole suffix in one forward pass
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(text):
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def prepare(self, system_message, prefix_ids=None):
+        """
+        Make sure the cached state belongs to `system_message`
+
+        Args:
+            system_message (str): System prompt the prefix is built from
+            prefix_ids (list): Its already tokenized system turn, if known
+
+        Returns:
+            bool: True if the prefix had to be (re)computed
+        """
+        key = self.fingerprint(system_message)
+        entry = self._entry
+        if entry is not None and entry[0] == key:
+            return False
+        # One prefill at a time; readers keep using the previous entry meanwhile
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == key:
+                return False
+            with metrics.timed("prefix_prefill"):
+                if prefix_ids is None:
+                    prefix_ids = self.tokenizer.apply_chat_template(
+                        [{"role": "system", "content": system_message}],
+                        add_generation_prompt=False,
+                        tokenize=True,
+                    )
+                prefix_ids = torch.tensor([list(prefix_ids)], device=self.device)
+                with torch.no_grad():
+                    output = self.model(input_ids=prefix_ids, use_cache=True)
+            self._entry = (key, prefix_ids, output.past_key_values)
+            logger.info(f"Prefilled {prefix_ids.shape[1]} prompt prefix tokens")
+        return True
+
+    def matches(self, input_ids, entry=None):
+        """True if input_ids starts with the cached (or given) prefix and has a suffix"""
+        entry = self._entry if entry is None else entry
+        if entry is None:
+            return False
+        prefix_ids = entry[1]
+        length = prefix_ids.shape[1]
+        return input_ids.shape[1] > length and torch.equal(input_ids[:, :length], prefix_ids)
+
+    def extend(self, past_key_values, token_ids):
+        """
+        Feed token_ids into an existing cache
+
+        Args:
+            past_key_values: Cache to advance in place
+            token_ids (torch.Tensor): [1, n] ids following the cached tokens
+
+        Returns:
+            torch.Tensor: Logits for the last fed token
+        """
+        step = token_ids.shape[1] if self.chunk_size is None else self.chunk_size
+        logits = None
+        with torch.no_grad():
+            for start in range(0, token_ids.shape[1], step):
+                output = self.model(input_ids=token_ids[:, start:start + step],
+                                    past_key_values=past_key_values, use_cache=True)
+                logits = output.logits[:, -1, :]
+        return logits
+
+    def start(self, input_ids):
+        """
+        Cache for generating from input_ids, or None if the prefix does not apply
+
+        Everything but the last prompt token is fed into a copy of the prefix
+        state; generate() then only runs that token before decoding.
+        """
+        entry = self._entry
+        if not self.matches(input_ids, entry):
+            return None
+        _, prefix_ids, cached = entry
+        past_key_values = copy_cache(cached)
+        suffix = input_ids[:, prefix_ids.shape[1]:-1]
+        if suffix.shape[1]:
+            self.extend(past_key_values, suffix)
+        return past_key_values
+
+    def calibrate(self, probe_text="What are the current readings?", atol=1e-2):
+        """
+        Pick the suffix chunk size: continue the cached prefix with a probe in
+        one pass and compare against a full prefill of prefix + probe
+
+        Returns:
+            int or None: The chosen chunk size
+        """
+        entry = self._entry
+        if entry is None:
+            return self.chunk_size
+        _, prefix_ids, cached = entry
+        probe_ids = self.tokenizer(probe_text, add_special_tokens=False, return_tensors="pt").input_ids.to(self.device)
+        with torch.no_grad():
+            reference = self.model(input_ids=torch.cat([prefix_ids, probe_ids], dim=1)).logits[:, -1, :]
+        self.chunk_size = None
+        continued = self.extend(copy_cache(cached), probe_ids)
+        if not torch.allclose(continued.float(), reference.float(), atol=atol):
+            self.chunk_size = 1
+        logger.info(f"Prefix continuation uses {'single-token' if self.chunk_size else 'chunked'} steps")
+        return self.chunk_size
+
+
+class TokenStream(metrics.GenerationTimer):
+    """
+    Streamer that hands generated tokens from the scheduler thread to a
+    consumer thread, keeping GenerationTimer's prefill/decode timings
+    """
+
+    def __init__(self, tokenizer):
+        super().__init__()
+        self.tokenizer = tokenizer
+        self._tokens = queue.Queue()
+        self._prompt_seen = False
+
+    def put(self, value):
+        super().put(value)
+        # The first call carries the prompt, every later one a single new token
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        for token_id in value.reshape(-1).tolist():
+            self._tokens.put(token_id)
+
+    def end(self):
+        self._tokens.put(None)
+
+    def __iter__(self):
+        while True:
+            token_id = self._tokens.get()
+            if token_id is None:
+                return
+            yield token_id
+
+    def iter_text(self):
+        """
+        Yield (token id, new text) per token; special tokens yield no text,
+        and text is held back while it ends in an incomplete UTF-8 sequence
+        """
+        ids = []
+        emitted = ""
+        for token_id in self:
+            ids.append(token_id)
+            text = self.tokenizer.decode(ids, skip_special_tokens=True)
+            if text.endswith("\ufffd"):
+                yield token_id, ""
+                continue
+            yield token_id, text[len(emitted):]
+            emitted = text
+
+
+class BatchScheduler:
+    """
+    Single decode loop shared by every request
+
+    Requests are queued; the scheduler thread takes the first one, waits up
+    to `max_wait` seconds for more (up to `max_batch_size`), prefills them
+    together with left padding and decodes them step by step. A sequence
+    that hits a stop token or its length limit is handed back to its caller
+    at once and its row is dropped from the batch, so short answers never
+    wait for long ones. A lone request reuses the prefix cache instead.
+    """
+
+    def __init__(self, model, tokenizer, device, prefix_cache=None, max_batch_size=4, max_wait=0.02,
+                 temperature=0.3, min_p=0.15, repetition_penalty=1.05, do_sample=True):
+        """
+        Args:
+            model: transformers causal LM
+            tokenizer: Matching tokenizer
+            device (torch.device): Device the model runs on
+            prefix_cache (PrefixCache): Used for batches of one request
+            max_batch_size (int): Most requests decoded together
+            max_wait (float): Seconds to wait for more requests after the first
+            temperature (float): Sampling temperature
+            min_p (float): Min-p sampling cutoff
+            repetition_penalty (float): Penalty on already seen tokens
+            do_sample (bool): False for greedy decoding
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = device
+        self.prefix_cache = prefix_cache
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.sampling = {"temperature": temperature, "min_p": min_p,
+                         "repetition_penalty": repetition_penalty, "do_sample": do_sample}
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+        self.queue = queue.Queue()
+        self._held = collections.deque()  # resumed requests waiting for their own batch
+        self.thread = threading.Thread(target=self._run, name="llm_scheduler", daemon=True)
+        self.thread.start()
+        metrics.QUEUE_DEPTH.labels("llm_scheduler").set_function(self.queue.qsize)
+
+    def submit(self, input_ids, max_new_tokens=512, stop_ids=None, streamer=None, constraint=None,
+               past_key_values=None, keep_cache=False):
+        """
+        Queue a prompt for generation
+
+        Args:
+            input_ids (torch.Tensor): [1, n] prompt ids
+            max_new_tokens (int): Length limit for this request
+            stop_ids (set): Token ids that end the sequence (default: end of turn)
+            streamer: Optional object with put()/end(), fed like generate()'s streamer
+            constraint: Optional object with allowed_tokens()/advance(token_id)
+                restricting what this sequence may generate
+            past_key_values: Cache already covering a prefix of input_ids (e.g.
+                from an earlier request with keep_cache); only the rest is fed
+            keep_cache (bool): Hand the sequence's cache back on the request
+                as `past_key_values` so a follow-up can resume from it (only
+                when it was decoded unbatched; otherwise it is left as None)
+
+        Returns:
+            GenerationRequest: Call result() to wait for the new token ids
+        """
+        if stop_ids is None:
+            stop_ids = self.default_stop_ids()
+        request = GenerationRequest(input_ids[0].tolist(), max_new_tokens, set(stop_ids), streamer, constraint,
+                                    past_key_values, keep_cache)
+        self.queue.put(request)
+        return request
+
+    def default_stop_ids(self):
+        """End-of-turn ids from the model's generation config, as generate() uses"""
+        eos = getattr(getattr(self.model, "generation_config", None), "eos_token_id", None)
+        if eos is None:
+            eos = self.tokenizer.eos_token_id
+        return set(eos) if isinstance(eos, (list, tuple)) else {eos}
+
+    def generate(self, input_ids, **options):
+        """Blocking submit(): returns the new token ids"""
+        return self.submit(input_ids, **options).result()
+
+    def _collect(self):
+        # Requests resuming their own cache cannot share a padded batch
+        first = self._held.popleft() if self._held else self.queue.get()
+        if first.past_key_values is not None:
+            return [first]
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request.past_key_values is not None:
+                self._held.append(request)
+            else:
+                batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            metrics.LLM_BATCH_SIZE.observe(len(batch))
+            try:
+                with torch.no_grad():
+                    self._decode(batch)
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} failed: {e}")
+                for request in batch:
+                    if not request._done.is_set():
+                        request.finish(e)
+
+    def _resume(self, input_ids, past_key_values):
+        """Feed the tokens past_key_values does not cover yet, all but the last"""
+        pending = input_ids[:, past_key_values.get_seq_length():-1]
+        if not pending.shape[1]:
+            return
+        if self.prefix_cache is not None:
+            self.prefix_cache.extend(past_key_values, pending)
+        else:
+            self.model(input_ids=pending, past_key_values=past_key_values, use_cache=True)
+
+    def _prefill(self, batch):
+        """Run the prompts; returns (last logits, cache, attention mask)"""
+        if len(batch) == 1:
+            request = batch[0]
+            input_ids = torch.tensor([request.input_ids], device=self.device)
+            past_key_values = request.past_key_values
+            if past_key_values is not None:
+                metrics.CACHE_HITS_TOTAL.labels("kv_resume").inc()
+                self._resume(input_ids, past_key_values)
+            elif self.prefix_cache is not None:
+                past_key_values = self.prefix_cache.start(input_ids)
+                if past_key_values is not None:
+                    metrics.CACHE_HITS_TOTAL.labels("prompt_prefix").inc()
+            if past_key_values is not None:
+                output = self.model(input_ids=input_ids[:, -1:], past_key_values=past_key_values, use_cache=True)
+                return output.logits[:, -1, :], output.past_key_values, torch.ones_like(input_ids)
+
+        length = max(len(request.input_ids) for request in batch)
+        input_ids = torch.full((len(batch), length), self.pad_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+        for row, request in enumerate(batch):
+            input_ids[row, length - len(request.input_ids):] = torch.tensor(request.input_ids)
+            attention_mask[row, length - len(request.input_ids):] = 1
+        input_ids, attention_mask = input_ids.to(self.device), attention_mask.to(self.device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+        output = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                            position_ids=position_ids, use_cache=True)
+        return output.logits[:, -1, :], output.past_key_values, attention_mask
+
+    def _decode(self, batch):
+        for request in batch:
+            if request.streamer is not None:
+                request.streamer.put(torch.tensor([request.input_ids]))
+        with metrics.timed("batch_prefill"):
+            logits, past_key_values, attention_mask = self._prefill(batch)
+
+        active = list(batch)
+        while active:
+            histories = [request.input_ids + request.output_ids for request in active]
+            allowed = [None if request.constraint is None else request.constraint.allowed_tokens()
+                       for request in active]
+            next_tokens = sample_next_tokens(logits, histories, allowed=allowed, **self.sampling)
+
+            keep = []
+            for row, (request, token) in enumerate(zip(active, next_tokens.tolist())):
+                request.output_ids.append(token)
+                if request.constraint is not None:
+                    request.constraint.advance(token)
+                if request.streamer is not None:
+                    request.streamer.put(torch.tensor([token]))
+                if token in request.stop_ids or len(request.output_ids) >= request.max_new_tokens:
+                    if request.keep_cache and len(batch) == 1:
+                        # Padded rows would misalign a resumed prompt, so only
+                        # unbatched sequences hand their cache back
+                        request.past_key_values = past_key_values
+                    request.finish()
+                else:
+                    keep.append(row)
+            if not keep:
+                break
+            if len(keep) < len(active):
+                # Finished sequences leave the batch; the rest keep decoding
+                indices = torch.tensor(keep, device=self.device)
+                select_cache_rows(past_key_values, indices)
+                attention_mask = attention_mask.index_select(0, indices)
+                next_tokens = next_tokens.index_select(0, indices.to(next_tokens.device))
+                active = [active[row] for row in keep]
+
+            attention_mask = torch.cat([attention_mask, attention_mask.new_ones((len(active), 1))], dim=-1)
+            position_ids = attention_mask.sum(-1, keepdim=True) - 1
+            output = self.model(input_ids=next_tokens.unsqueeze(-1).to(self.device), attention_mask=attention_mask,
+                                position_ids=position_ids, past_key_values=past_key_values, use_cache=True)
+            logits, past_key_values = output.logits[:, -1, :], output.past_key_values
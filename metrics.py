@@ -0,0 +1,331 @@
+"""
+Metrics Module for the Smart Gauge System
+Lightweight Prometheus-style counters, gauges and histograms shared by the
+VLM and LLM Flask apps, rendered in the text exposition format on /metrics
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond DB writes up to slow CPU generations
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class holding one child per label-value combination"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def labels(self, *labelvalues):
+        """Return the child metric for the given label values"""
+        key = tuple(str(v) for v in labelvalues)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.metric_type}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (frames, cache hits, failures)"""
+
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._value = 0.0
+        self._function = None
+
+    def set(self, value):
+        self._value = value
+
+    def set_function(self, function):
+        """Evaluate `function` lazily at scrape time instead of storing a value"""
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            try:
+                return self._function()
+            except Exception:
+                return float("nan")
+        return self._value
+
+
+class Gauge(_Metric):
+    """Point-in-time value (queue depth, model memory)"""
+
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def set_function(self, function):
+        self._default.set_function(function)
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._upper_bounds = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Histogram(_Metric):
+    """Bucketed latency distribution; observe() is a bisect plus two adds"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render_child(self, key, child):
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry shared by every module in the process
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "gauge_stage_seconds",
+    "Latency of each pipeline stage in seconds.",
+    labelnames=("stage",),
+)
+FRAMES_TOTAL = registry.counter(
+    "gauge_frames_total", "Frames sent to stream clients.")
+CACHE_HITS_TOTAL = registry.counter(
+    "gauge_cache_hits_total", "Requests served from a cache.", labelnames=("cache",))
+PARSE_FAILURES_TOTAL = registry.counter(
+    "gauge_parse_failures_total", "Model outputs that could not be parsed.", labelnames=("source",))
+DROPPED_FRAMES_TOTAL = registry.counter(
+    "gauge_dropped_frames_total", "Frames dropped before reaching stream clients.", labelnames=("reason",))
+QUEUE_DEPTH = registry.gauge(
+    "gauge_queue_depth", "Items waiting in an internal queue.", labelnames=("queue",))
+INTERACT_REQUESTS_TOTAL = registry.counter(
+    "gauge_interact_requests_total", "Interact requests by the path that served them.", labelnames=("path",))
+LLM_BATCH_SIZE = registry.histogram(
+    "gauge_llm_batch_size", "Requests decoded together in one LLM batch.", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+CACHE_EVICTIONS_TOTAL = registry.counter(
+    "gauge_cache_evictions_total", "Entries evicted from a bounded cache.", labelnames=("cache",))
+SESSION_CACHE_BYTES = registry.gauge(
+    "gauge_session_cache_bytes", "Memory held by the KV caches of conversation sessions.")
+MODEL_MEMORY_BYTES = registry.gauge(
+    "gauge_model_memory_bytes", "Memory held by loaded model parameters and buffers.", labelnames=("model",))
+
+
+def observe_stage(stage, seconds):
+    """Record one latency sample for a pipeline stage"""
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Context manager timing the enclosed block as `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def model_memory_bytes(model):
+    """Bytes used by a torch module's parameters and buffers"""
+    if model is None:
+        return 0
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class GenerationTimer:
+    """
+    Streamer passed to `model.generate` that timestamps every step so prefill
+    can be told apart from decode. generate() only calls put() and end(), so
+    this does not need to subclass transformers' BaseStreamer.
+    """
+
+    def __init__(self):
+        self.prompt_time = None
+        self.token_times = []
+
+    def put(self, value):
+        now = time.perf_counter()
+        # generate() first passes the prompt ids, then one tensor per new token
+        if self.prompt_time is None:
+            self.prompt_time = now
+        else:
+            self.token_times.append(now)
+
+    def end(self):
+        pass
+
+    @property
+    def time_to_first_token(self):
+        """Seconds from the start of generate() to the first new token (prefill)"""
+        if self.prompt_time is None or not self.token_times:
+            return None
+        return self.token_times[0] - self.prompt_time
+
+    @property
+    def decode_time(self):
+        """Seconds spent producing every token after the first"""
+        if len(self.token_times) < 2:
+            return 0.0
+        return self.token_times[-1] - self.token_times[0]
+
+    @property
+    def tokens_per_second(self):
+        """Decode throughput, excluding the prefill step"""
+        decode_time = self.decode_time
+        if decode_time <= 0:
+            return None
+        return (len(self.token_times) - 1) / decode_time
+
+    def record_metrics(self):
+        """Feed prefill and per-token decode latencies into the stage histogram"""
+        if self.prompt_time is None or not self.token_times:
+            return
+        observe_stage("prefill", self.token_times[0] - self.prompt_time)
+        decode_child = STAGE_SECONDS.labels("decode_step")
+        for previous, current in zip(self.token_times, self.token_times[1:]):
+            decode_child.observe(current - previous)
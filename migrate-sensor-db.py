@@ -0,0 +1,53 @@
+"""
+Migrate sensor_data tables to the indexed epoch-millisecond `ts` schema
+and build the per-minute/hour/day rollups for existing readings. Also turns
+on incremental auto-vacuum so retention can return space without a full VACUUM,
+and copies legacy rows into the long-format `readings` table.
+
+Usage:
+    python3 migrate-sensor-db.py [db_path ...]
+
+Defaults to sensors-json.db and sensors.db. Existing rows are kept; the TEXT
+timestamp column stays alongside the new integer column.
+"""
+
+import os
+import sys
+import time
+
+import sensor_db
+
+DEFAULT_DBS = ["sensors-json.db", "sensors.db"]
+
+
+def migrate(db_path):
+    if not os.path.exists(db_path):
+        print(f"Skipping {db_path}: file not found")
+        return
+
+    start = time.time()
+    # enable_incremental_vacuum below converts the file, so no warning here
+    conn = sensor_db.connect(db_path, check_auto_vacuum=False)
+    try:
+        backfilled = sensor_db.migrate_timestamps(conn)
+        sensor_db.migrate_metadata_columns(conn)
+        conn.executescript(sensor_db.ROLLUP_SCHEMA)
+        rolled_up = sensor_db.backfill_rollups(conn)
+        conn.executescript(sensor_db.READINGS_SCHEMA)
+        copied = sensor_db.backfill_readings(conn)
+        if sensor_db.enable_incremental_vacuum(conn):
+            print(f"{db_path}: enabled incremental auto-vacuum")
+        plan = conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT * FROM sensor_data ORDER BY {sensor_db.TS_COLUMN} DESC LIMIT 1"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    print(f"{db_path}: backfilled {backfilled} rows, rolled up {rolled_up} rows, "
+          f"copied {copied} rows to readings in {time.time() - start:.2f}s")
+    print(f"  latest-row plan: {plan[-1][-1] if plan else 'n/a'}")
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:] or DEFAULT_DBS:
+        migrate(path)
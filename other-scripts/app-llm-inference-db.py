@@ -146,7 +146,10 @@ def monitor_sensors_db(db_path="sensors-json.db", interval_seconds=10):
             conn = sqlite3.connect(db_path)
             # Fetch the latest entry (assuming 'timestamp' column exists and is ordered)
             # You might need to adjust the query based on your table structure
-            query = "SELECT * FROM sensor_data ORDER BY timestamp DESC LIMIT 1"
+            # Databases not migrated yet (migrate-sensor-db.py) have no ts column
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(sensor_data)")]
+            order = "ts" if "ts" in columns else "timestamp"
+            query = f"SELECT * FROM sensor_data ORDER BY {order} DESC LIMIT 1"
             df = pd.read_sql_query(query, conn)
             conn.close()
             
@@ -70,7 +70,10 @@ def get_sensor_data():
         # Select the latest temperature, pressure, and rain from the sensor_data table
         # Note: The error "no such column: humidity" suggests your database might not have a 'humidity' column.
         # I've adjusted the query to only include columns that are present in your original code (temperature, pressure, rain).
-        query = "SELECT temperature, pressure, rain FROM sensor_data ORDER BY timestamp DESC LIMIT 1"
+        # Databases not migrated yet (migrate-sensor-db.py) have no ts column
+        columns = [column[1] for column in conn.execute("PRAGMA table_info(sensor_data)")]
+        order = "ts" if "ts" in columns else "timestamp"
+        query = f"SELECT temperature, pressure, rain FROM sensor_data ORDER BY {order} DESC LIMIT 1"
         df = pd.read_sql_query(query, conn)
         conn.close()
 
@@ -30,7 +30,10 @@ def get_sensor_data():
     try:
         conn = sqlite3.connect(db_path)
         # Select the latest temperature, pressure and rain  from the sensor_data table
-        query = "SELECT temperature, pressure, rain FROM sensor_data ORDER BY timestamp DESC LIMIT 1"
+        # Databases not migrated yet (migrate-sensor-db.py) have no ts column
+        columns = [column[1] for column in conn.execute("PRAGMA table_info(sensor_data)")]
+        order = "ts" if "ts" in columns else "timestamp"
+        query = f"SELECT temperature, pressure, rain FROM sensor_data ORDER BY {order} DESC LIMIT 1"
         df = pd.read_sql_query(query, conn)
         conn.close()
 
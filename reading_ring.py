@@ -0,0 +1,202 @@
+"""
+Reading Ring Module for Recent Gauge Values
+Fixed-size, memory-mapped NumPy ring buffer of the latest readings, written
+by the VLM server and read lock-free by the LLM server, monitors and dashboards.
+SQLite stays the durable store; the ring only answers "latest" and
+short-window questions without touching the database.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+import sensor_db
+
+MAGIC = 0x474155474552494E  # "GAUGERIN"
+HEADER_SLOTS = 4  # magic, capacity, n_gauges, count
+DEFAULT_CAPACITY = 4096
+
+# Prefer shared memory so the ring never hits the SD card
+RING_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+RING_PATH = os.path.join(RING_DIR, "smart-gauge-readings.ring")
+
+
+class ReadingRing:
+    """
+    Single-writer, multi-reader ring of (ts, gauge values) rows
+
+    Layout: int64 header, int64 per-slot sequence numbers, int64 timestamps
+    and a float64 [capacity, n_gauges] value matrix (NaN = gauge missing).
+    The writer clears a slot's sequence number, fills the slot, stamps the
+    new sequence number and only then publishes the new count. Readers
+    check the sequence numbers before and after copying and discard any
+    slot that was being written or was overwritten meanwhile.
+    """
+
+    def __init__(self, path=RING_PATH, gauges=sensor_db.GAUGE_COLUMNS, capacity=DEFAULT_CAPACITY, create=False):
+        """
+        Args:
+            path (str): Backing file, ideally on tmpfs
+            gauges (tuple): Gauge names, one value column each
+            capacity (int): Number of rows retained
+            create (bool): Create or reset the file (writer side)
+        """
+        self.path = path
+        self.gauges = tuple(gauges)
+        self.capacity = capacity
+        n_gauges = len(self.gauges)
+        size = 8 * (HEADER_SLOTS + 2 * capacity + capacity * n_gauges)
+
+        if create:
+            if not (os.path.exists(path) and os.path.getsize(path) == size):
+                # Build the new file aside and swap it in, so readers still
+                # mapping an old layout never see it truncated underneath them
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.truncate(size)
+                os.replace(tmp_path, path)
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+        else:
+            self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+            header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self._mm)
+            if header[0] != MAGIC:
+                raise ValueError(f"{path} is not a reading ring")
+            self.capacity = capacity = int(header[1])
+            if int(header[2]) != n_gauges:
+                raise ValueError(f"{path} holds {int(header[2])} gauges, expected {n_gauges}")
+
+        self._inode = os.stat(path).st_ino
+        offset = 0
+        self._header = np.ndarray((HEADER_SLOTS,), dtype=np.int64, buffer=self._mm, offset=offset)
+        offset += 8 * HEADER_SLOTS
+        self._seq = np.ndarray((capacity,), dtype=np.int64, buffer=self._mm, offset=offset)
+        offset += 8 * capacity
+        self._ts = np.ndarray((capacity,), dtype=np.int64, buffer=self._mm, offset=offset)
+        offset += 8 * capacity
+        self._values = np.ndarray((capacity, n_gauges), dtype=np.float64, buffer=self._mm, offset=offset)
+
+        if create and (self._header[0] != MAGIC or self._header[1] != capacity
+                       or self._header[2] != n_gauges):
+            self._header[:] = (0, capacity, n_gauges, 0)
+            self._seq[:] = 0
+            self._header[0] = MAGIC
+
+    def is_stale(self):
+        """True if the writer has replaced the backing file since it was opened"""
+        try:
+            return os.stat(self.path).st_ino != self._inode
+        except OSError:
+            return True
+
+    @property
+    def count(self):
+        """Total rows ever appended (not capped at capacity)"""
+        return int(self._header[3])
+
+    @property
+    def version(self):
+        """
+        Changes whenever a reading is appended or the writer replaces the
+        file; caches of answers derived from the readings key on it
+        """
+        return (self._inode, self.count)
+
+    def append(self, ts, readings):
+        """
+        Add one row (writer side only)
+
+        Args:
+            ts (int): Epoch milliseconds
+            readings (dict): Gauge name -> value, missing or None stored as NaN
+        """
+        count = int(self._header[3])
+        slot = count % self.capacity
+        self._seq[slot] = 0  # invalid while the slot is rewritten
+        self._ts[slot] = ts
+        self._values[slot] = [np.nan if readings.get(g) is None else readings[g] for g in self.gauges]
+        self._seq[slot] = count + 1
+        self._header[3] = count + 1
+
+    def _snapshot(self, n):
+        """Copy the newest n rows in time order, dropping slots overwritten mid-copy"""
+        count = int(self._header[3])
+        n = min(n, count, self.capacity)
+        if n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty((0, len(self.gauges)))
+        expected = np.arange(count - n + 1, count + 1, dtype=np.int64)
+        slots = (expected - 1) % self.capacity
+        before = self._seq[slots].copy()
+        ts = self._ts[slots].copy()
+        values = self._values[slots].copy()
+        valid = (before == expected) & (self._seq[slots] == expected)
+        return ts[valid], values[valid]
+
+    def latest(self):
+        """
+        Newest reading
+
+        Returns:
+            dict: ts plus one value per gauge (None if missing), or None when empty
+        """
+        while True:
+            count = int(self._header[3])
+            if count == 0:
+                return None
+            slot = (count - 1) % self.capacity
+            if int(self._seq[slot]) != count:
+                continue  # the writer is already rewriting this slot
+            ts = int(self._ts[slot])
+            values = self._values[slot].tolist()
+            # A mismatch means the writer lapped the ring mid-read; try again
+            if int(self._seq[slot]) == count:
+                break
+        row = {"ts": ts}
+        for gauge, value in zip(self.gauges, values):
+            row[gauge] = None if value != value else value
+        return row
+
+    def window(self, since_ms=None, n=None):
+        """
+        Recent rows as arrays
+
+        Args:
+            since_ms (int): Only rows with ts >= since_ms
+            n (int): At most this many newest rows (default: whole ring)
+
+        Returns:
+            tuple: (ts int64 array, values float64 [rows, gauges] array)
+        """
+        ts, values = self._snapshot(self.capacity if n is None else n)
+        if since_ms is not None:
+            keep = ts >= since_ms
+            ts, values = ts[keep], values[keep]
+        return ts, values
+
+    def stats(self, gauge, since_ms=None, n=None):
+        """Count/mean/min/max/last of one gauge over a recent window, ignoring NaN"""
+        ts, values = self.window(since_ms=since_ms, n=n)
+        column = values[:, self.gauges.index(gauge)]
+        column = column[~np.isnan(column)]
+        if len(column) == 0:
+            return None
+        return {
+            "count": int(len(column)),
+            "mean": float(column.mean()),
+            "min": float(column.min()),
+            "max": float(column.max()),
+            "last": float(column[-1]),
+        }
+
+    def close(self):
+        self._mm.flush()
+        del self._header, self._seq, self._ts, self._values
+        self._mm = None
+
+
+def open_reader(path=RING_PATH, gauges=sensor_db.GAUGE_COLUMNS):
+    """Open an existing ring for reading, or None if no writer has created it"""
+    try:
+        return ReadingRing(path, gauges=gauges)
+    except (OSError, ValueError):
+        return None
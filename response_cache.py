@@ -0,0 +1,76 @@
+"""
+Response Cache Module for Repeated Questions
+Small LRU caches whose entries are only valid for the data version they
+were computed at. The version comes from a callable (the reading ring's
+version, which the VLM writer advances with every new reading), so answers
+stay correct while identical questions between two readings cost nothing.
+"""
+
+import collections
+import logging
+import threading
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedCache:
+    """
+    LRU mapping key -> value, tagged with the data version at compute time
+
+    Read the version *before* computing a value and store it with that
+    version; a reading that lands mid-computation then just causes a miss.
+    """
+
+    def __init__(self, name, version, max_entries=256):
+        """
+        Args:
+            name (str): Label for the cache hit/eviction metrics
+            version (callable): Current data version, or None when unknown
+                (nothing is cached or served then)
+            max_entries (int): Entries kept before the least recent is evicted
+        """
+        self.name = name
+        self._version = version
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # key -> (version, value)
+        self._lock = threading.Lock()
+
+    def version(self):
+        """Current data version, or None if it cannot be determined"""
+        try:
+            return self._version()
+        except Exception as e:
+            logger.warning(f"Cannot read the data version for the {self.name} cache: {e}")
+            return None
+
+    def get(self, key, version):
+        """Cached value for key at `version`, or None"""
+        if version is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+        metrics.CACHE_HITS_TOTAL.labels(self.name).inc()
+        return entry[1]
+
+    def put(self, key, version, value):
+        """Store a value computed at `version`"""
+        if version is None:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.CACHE_EVICTIONS_TOTAL.labels(self.name).inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,451 @@
+"""
+Segment Log Module for High-Rate Readings
+Append-only alternative to the SQLite writer: fixed-size binary records in
+rotating segment files, one directory per stream, with a sparse time index
+per segment and mmap-based range scans. Appends are one write() per batch
+and fsyncs are batched, so SD-card-backed devices keep up with high frame
+rates.
+
+Layout:
+    <root>/<stream>/<seq>-<first_ts>.log   64-byte header + records
+    <root>/<stream>/<seq>-<first_ts>.idx   (ts, record number) every N records
+"""
+
+import atexit
+import glob
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+import metrics
+import sensor_db
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_LOG_DIR = "readings-log"
+SEGMENT_MAGIC = b"GAUGELOG"
+SEGMENT_VERSION = 1
+HEADER = struct.Struct("<8sHHI")  # magic, version, n_gauges, record size
+HEADER_SIZE = 64
+SEGMENT_RECORDS = 65536  # records per segment before rotating
+INDEX_INTERVAL = 256  # one sparse index entry per this many records
+INDEX_DTYPE = np.dtype([("ts", "<i8"), ("record", "<i8")])
+
+
+def record_dtype(gauges=sensor_db.GAUGE_COLUMNS):
+    """
+    Fixed-size record: epoch ms, float32 value and confidence per gauge
+    (NaN = missing), latency and the raw SHA-256 of the frame
+    """
+    n = len(gauges)
+    return np.dtype([
+        ("ts", "<i8"),
+        ("values", "<f4", (n,)),
+        ("confidence", "<f4", (n,)),
+        ("latency_ms", "<f4"),
+        ("image_hash", "u1", (32,)),
+    ])
+
+
+def _segment_key(path):
+    seq, first_ts = os.path.splitext(os.path.basename(path))[0].split("-")
+    return int(seq), int(first_ts)
+
+
+class SegmentLog:
+    """Segments of one stream; read-only unless opened with open_for_append()"""
+
+    def __init__(self, root=SEGMENT_LOG_DIR, stream=sensor_db.DEFAULT_STREAM,
+                 gauges=sensor_db.GAUGE_COLUMNS, segment_records=SEGMENT_RECORDS,
+                 index_interval=INDEX_INTERVAL):
+        """
+        Args:
+            root (str): Directory holding one sub-directory per stream
+            stream (str): Stream whose segments this log reads or writes
+            gauges (tuple): Gauge columns, one value slot each
+            segment_records (int): Records per segment before rotating
+            index_interval (int): Records between sparse index entries
+        """
+        self.directory = os.path.join(root, stream)
+        self.gauges = tuple(gauges)
+        self.dtype = record_dtype(self.gauges)
+        self.segment_records = segment_records
+        self.index_interval = index_interval
+        self._file = None
+        self._index_file = None
+        self._seq = 0
+        self._count = 0
+        self._last_ts = None
+
+    # ---- read side ----
+
+    def segments(self):
+        """Segment paths in creation order"""
+        return sorted(glob.glob(os.path.join(self.directory, "*.log")), key=_segment_key)
+
+    def _records(self, path):
+        """Complete records of a segment as a read-only memmap (None if empty)"""
+        count = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize
+        if count <= 0:
+            return None
+        return np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+
+    @staticmethod
+    def _index(path):
+        index_path = path[:-4] + ".idx"
+        if not os.path.exists(index_path):
+            return np.empty(0, dtype=INDEX_DTYPE)
+        raw = np.fromfile(index_path, dtype=np.uint8)
+        return raw[:len(raw) - len(raw) % INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+
+    def _slice(self, path, records, start_ms, end_ms):
+        """Bounds of start_ms <= ts < end_ms in one segment, narrowed by its index"""
+        lo, hi = 0, len(records)
+        index = self._index(path)
+        index = index[index["record"] < hi]
+        if len(index):
+            block = np.searchsorted(index["ts"], start_ms, side="left") - 1
+            if block > 0:
+                lo = int(index["record"][block])
+            block = np.searchsorted(index["ts"], end_ms, side="left")
+            if block < len(index):
+                hi = int(index["record"][block])
+        ts = records["ts"][lo:hi]
+        return lo + int(np.searchsorted(ts, start_ms)), lo + int(np.searchsorted(ts, end_ms))
+
+    def latest(self):
+        """
+        Newest reading of the stream
+
+        Returns:
+            dict: ts plus one value per gauge (None if missing), or None when empty
+        """
+        for path in reversed(self.segments()):
+            records = self._records(path)
+            if records is not None:
+                return self._row(records[-1])
+        return None
+
+    def _row(self, record):
+        row = {"ts": int(record["ts"])}
+        for gauge, value in zip(self.gauges, record["values"].tolist()):
+            row[gauge] = None if value != value else value
+        return row
+
+    def fetch_range(self, start_ms, end_ms):
+        """
+        Records with start_ms <= ts < end_ms, in time order
+
+        Only segments whose [first, last] ts overlaps the range are mapped,
+        and within each one the sparse index bounds the binary search.
+
+        Returns:
+            numpy.ndarray: Structured array with record_dtype() fields
+        """
+        parts = []
+        for path in self.segments():
+            if _segment_key(path)[1] >= end_ms:
+                continue
+            records = self._records(path)
+            if records is None or records["ts"][-1] < start_ms:
+                continue
+            lo, hi = self._slice(path, records, start_ms, end_ms)
+            if hi > lo:
+                parts.append(np.array(records[lo:hi]))
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        result = np.concatenate(parts)
+        # Segments are sorted internally; a clock step back starts a new one
+        if len(parts) > 1 and np.any(np.diff(result["ts"]) < 0):
+            result = result[np.argsort(result["ts"], kind="stable")]
+        return result
+
+    # ---- write side ----
+
+    def open_for_append(self):
+        """Reopen the newest segment, dropping a torn trailing record, or start one"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        if not segments:
+            return
+        path = segments[-1]
+        self._seq, _ = _segment_key(path)
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        # A crash while rotating can leave an empty or torn header behind
+        if len(header) < HEADER_SIZE:
+            logger.warning(f"{path} has a truncated header, starting a new segment")
+            return
+        magic, version, n_gauges, record_size = HEADER.unpack_from(header)
+        if magic != SEGMENT_MAGIC or n_gauges != len(self.gauges) or record_size != self.dtype.itemsize:
+            logger.warning(f"{path} has a different record layout, starting a new segment")
+            return
+        count = max(0, (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize)
+        os.truncate(path, HEADER_SIZE + count * self.dtype.itemsize)
+        records = self._records(path)
+        self._count = count
+        self._last_ts = int(records["ts"][-1]) if records is not None else None
+        # The index may lag the data after a crash; it is cheap to rebuild
+        index = np.empty(0, dtype=INDEX_DTYPE)
+        if records is not None:
+            positions = np.arange(0, count, self.index_interval)
+            index = np.empty(len(positions), dtype=INDEX_DTYPE)
+            index["ts"] = records["ts"][positions]
+            index["record"] = positions
+        with open(path[:-4] + ".idx", "wb") as f:
+            f.write(index.tobytes())
+        self._file = open(path, "ab")
+        self._index_file = open(path[:-4] + ".idx", "ab")
+
+    def _rotate(self, first_ts):
+        self._close_files()
+        self._seq += 1
+        path = os.path.join(self.directory, f"{self._seq:08d}-{first_ts}.log")
+        self._file = open(path, "ab")
+        header = HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, len(self.gauges), self.dtype.itemsize)
+        self._file.write(header.ljust(HEADER_SIZE, b"\0"))
+        # The header must be durable before any record depends on it
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        self._index_file = open(path[:-4] + ".idx", "ab")
+        self._count = 0
+        self._last_ts = None
+
+    def encode(self, readings):
+        """Pack reading dicts (as submitted to the DB writer) into records"""
+        records = np.zeros(len(readings), dtype=self.dtype)
+        for i, reading in enumerate(readings):
+            confidence = reading.get("confidence") or {}
+            records["ts"][i] = reading["ts"]
+            records["values"][i] = [np.nan if reading.get(g) is None else reading[g] for g in self.gauges]
+            records["confidence"][i] = [np.nan if confidence.get(g) is None else confidence[g]
+                                        for g in self.gauges]
+            latency = reading.get("latency_ms")
+            records["latency_ms"][i] = np.nan if latency is None else latency
+            if reading.get("image_hash"):
+                records["image_hash"][i] = np.frombuffer(bytes.fromhex(reading["image_hash"]), dtype=np.uint8)
+        return records
+
+    def append(self, readings):
+        """
+        Append a batch of readings; each segment gets a single write()
+
+        A segment is rotated when full or when a timestamp goes backwards,
+        so every segment stays sorted by ts.
+        """
+        records = self.encode(readings)
+        start = 0
+        while start < len(records):
+            if (self._file is None or self._count >= self.segment_records
+                    or (self._last_ts is not None and records["ts"][start] < self._last_ts)):
+                self._rotate(int(records["ts"][start]))
+            # Longest sorted run that still fits in this segment
+            end = min(len(records), start + self.segment_records - self._count)
+            backwards = np.nonzero(np.diff(records["ts"][start:end]) < 0)[0]
+            if len(backwards):
+                end = start + int(backwards[0]) + 1
+            chunk = records[start:end]
+
+            positions = np.arange(len(chunk)) + self._count
+            marks = positions % self.index_interval == 0
+            if marks.any():
+                index = np.empty(int(marks.sum()), dtype=INDEX_DTYPE)
+                index["ts"] = chunk["ts"][marks]
+                index["record"] = positions[marks]
+                self._index_file.write(index.tobytes())
+            self._file.write(chunk.tobytes())
+            self._count += len(chunk)
+            self._last_ts = int(chunk["ts"][-1])
+            start = end
+        if self._file is not None:
+            self._file.flush()
+            self._index_file.flush()
+
+    def sync(self):
+        """fsync the active segment and its index"""
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            os.fsync(self._index_file.fileno())
+
+    def image_hashes(self, paths=None):
+        """
+        Hex SHA-256 of every frame the records refer to
+
+        Args:
+            paths (list): Segments to scan, None for all of them
+
+        Returns:
+            set: Frame hashes (records without a frame are skipped)
+        """
+        hashes = set()
+        for path in self.segments() if paths is None else paths:
+            records = self._records(path)
+            if records is None:
+                continue
+            digests = np.unique(np.ascontiguousarray(records["image_hash"]).view("V32"))
+            hashes.update(bytes(digest).hex() for digest in digests if any(bytes(digest)))
+        return hashes
+
+    def drop_before(self, cutoff_ms, image_hashes=None):
+        """
+        Delete whole segments whose newest record is older than cutoff_ms
+
+        Args:
+            cutoff_ms (int): Segments entirely before this are dropped
+            image_hashes (set): If given, receives the frame hashes of the
+                dropped records, so the frame store can release them
+        """
+        dropped = 0
+        active = self._file.name if self._file is not None else None
+        for path in self.segments():
+            if path == active:
+                continue
+            records = self._records(path)
+            if records is not None and records["ts"][-1] >= cutoff_ms:
+                continue
+            del records
+            if image_hashes is not None:
+                image_hashes.update(self.image_hashes([path]))
+            os.remove(path)
+            if os.path.exists(path[:-4] + ".idx"):
+                os.remove(path[:-4] + ".idx")
+            dropped += 1
+        return dropped
+
+    def _close_files(self):
+        for f in (self._file, self._index_file):
+            if f is not None:
+                f.close()
+        self._file = self._index_file = None
+
+    def close(self):
+        self.sync()
+        self._close_files()
+
+
+class SegmentLogSet:
+    """Append-side SegmentLog per stream, created on first use"""
+
+    def __init__(self, root=SEGMENT_LOG_DIR, **log_options):
+        self.root = root
+        self.log_options = log_options
+        self.logs = {}
+
+    def log(self, stream):
+        if stream not in self.logs:
+            log = SegmentLog(self.root, stream, **self.log_options)
+            log.open_for_append()
+            self.logs[stream] = log
+        return self.logs[stream]
+
+    def append(self, readings):
+        by_stream = {}
+        for reading in readings:
+            by_stream.setdefault(reading.get("stream") or sensor_db.DEFAULT_STREAM, []).append(reading)
+        for stream, stream_readings in by_stream.items():
+            self.log(stream).append(stream_readings)
+
+    def sync(self):
+        for log in self.logs.values():
+            log.sync()
+
+    def _streams(self):
+        """Every stream on disk, not only those written since start"""
+        streams = os.listdir(self.root) if os.path.isdir(self.root) else []
+        return [self.logs.get(stream) or SegmentLog(self.root, stream, **self.log_options) for stream in streams]
+
+    def drop_before(self, cutoff_ms, image_hashes=None):
+        """Apply retention to every stream (see SegmentLog.drop_before)"""
+        return sum(log.drop_before(cutoff_ms, image_hashes) for log in self._streams())
+
+    def image_hashes(self):
+        """Frame hashes referenced by any stream's records"""
+        hashes = set()
+        for log in self._streams():
+            hashes |= log.image_hashes()
+        return hashes
+
+    def close(self):
+        for log in self.logs.values():
+            log.close()
+
+
+class SegmentLogWriter(sensor_db.SensorDBWriter):
+    """
+    Drop-in replacement for SensorDBWriter that appends to a SegmentLogSet
+
+    Batching, flush() and stop() behave exactly as for the SQLite writer;
+    data reaches the page cache once per batch and is fsynced at most every
+    `fsync_interval` seconds (0 = every batch).
+    """
+
+    queue_name = "segment_log"
+
+    def __init__(self, root=SEGMENT_LOG_DIR, batch_size=32, flush_interval=1.0, fsync_interval=5.0,
+                 max_queue=10000, retention=None):
+        """
+        Args:
+            root (str): Segment log directory
+            batch_size (int): Append as soon as this many readings are pending
+            flush_interval (float): Append pending readings at least this often (seconds)
+            fsync_interval (float): Seconds between fsyncs of the active segments
+            max_queue (int): Readings buffered before submit() starts dropping
+            retention (RetentionPolicy): Its raw_days drops whole old segments
+        """
+        super().__init__(root, batch_size=batch_size, flush_interval=flush_interval,
+                         max_queue=max_queue, retention=retention)
+        self.fsync_interval = fsync_interval
+        self._last_sync = time.monotonic()
+
+    def _open(self):
+        return SegmentLogSet(self.db_path)
+
+    def _commit(self, logs, batch):
+        start = time.perf_counter()
+        logs.append(batch)
+        if time.monotonic() - self._last_sync >= self.fsync_interval:
+            logs.sync()
+            self._last_sync = time.monotonic()
+        metrics.observe_stage("log_write", time.perf_counter() - start)
+
+    def _apply_retention(self, logs):
+        if self.retention.raw_days is not None:
+            cutoff = sensor_db.now_ms() - int(self.retention.raw_days * sensor_db.ROLLUP_RESOLUTIONS["day"])
+            try:
+                dropped_hashes = set()
+                logs.drop_before(cutoff, dropped_hashes)
+                frames = self.retention.frame_store
+                if frames is not None and dropped_hashes:
+                    # A frame may also belong to a record that is kept
+                    frames.release(None, dropped_hashes, referenced=logs.image_hashes())
+            except Exception:
+                logger.exception("Segment retention failed")
+        return self.retention.check_interval
+
+
+# Global writer instance
+log_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer(root=SEGMENT_LOG_DIR, retention=None):
+    """Get or start the global segment log writer (arguments apply on first call)"""
+    global log_writer
+    with _writer_lock:
+        if log_writer is None:
+            # Publish the writer only once it started: a failed start raises
+            # here and the next call tries again
+            writer = SegmentLogWriter(root, retention=retention)
+            writer.start()
+            atexit.register(writer.stop)
+            log_writer = writer
+    return log_writer
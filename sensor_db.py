@@ -0,0 +1,953 @@
+"""
+Sensor Database Module for Gauge Reading Storage
+Owns the long-lived SQLite writer used by the VLM server to persist readings
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import zlib
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "sensors-json.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    temperature REAL,
+    pressure REAL,
+    rain REAL,
+    ts INTEGER,
+    image_hash TEXT,
+    model TEXT,
+    prompt_version TEXT,
+    raw_response BLOB,
+    prompt_tokens INTEGER,
+    generated_tokens INTEGER,
+    latency_ms REAL,
+    null_gauges TEXT
+)
+"""
+
+# Per-reading provenance, added to older tables by migrate_metadata_columns
+METADATA_COLUMNS = {
+    "image_hash": "TEXT",
+    "model": "TEXT",
+    "prompt_version": "TEXT",
+    "raw_response": "BLOB",
+    "prompt_tokens": "INTEGER",
+    "generated_tokens": "INTEGER",
+    "latency_ms": "REAL",
+    "null_gauges": "TEXT",
+}
+
+INSERT_SQL = """
+INSERT INTO sensor_data (timestamp, temperature, pressure, rain, ts, image_hash, model,
+                         prompt_version, raw_response, prompt_tokens, generated_tokens,
+                         latency_ms, null_gauges)
+VALUES (:timestamp, :temperature, :pressure, :rain, :ts, :image_hash, :model,
+        :prompt_version, :raw_response, :prompt_tokens, :generated_tokens,
+        :latency_ms, :null_gauges)
+"""
+
+# Optional keys of a submitted reading
+READING_DEFAULTS = dict.fromkeys(METADATA_COLUMNS)
+
+# Readings are keyed by epoch milliseconds; `timestamp` is kept for display
+TS_COLUMN = "ts"
+
+# Gauge registry: the VLM output key, the legacy wide sensor_data column and
+# the unit. A new gauge only needs an entry here (and in the VLM prompt);
+# it is stored in the long-format `readings` table without schema changes.
+GAUGE_REGISTRY = [
+    {"name": "thermometer", "column": "temperature", "unit": "°C"},
+    {"name": "pressure_gauge", "column": "pressure", "unit": "bar"},
+    {"name": "rain_gauge", "column": "rain", "unit": "mm", "aliases": ("length",)},
+]
+
+GAUGE_NAMES = tuple(gauge["name"] for gauge in GAUGE_REGISTRY)
+GAUGE_COLUMNS = tuple(gauge["column"] for gauge in GAUGE_REGISTRY)
+
+DEFAULT_STREAM = "camera-0"
+
+READINGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS streams (
+    stream_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS gauges (
+    gauge_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    column_name TEXT,
+    unit TEXT
+);
+CREATE TABLE IF NOT EXISTS readings (
+    stream_id INTEGER NOT NULL,
+    gauge_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    value REAL,
+    confidence REAL,
+    PRIMARY KEY (stream_id, gauge_id, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts);
+"""
+
+READINGS_INSERT_SQL = """
+INSERT OR REPLACE INTO readings (stream_id, gauge_id, ts, value, confidence)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+# Rollup resolutions and their bucket width in milliseconds
+ROLLUP_RESOLUTIONS = {
+    "minute": 60 * 1000,
+    "hour": 60 * 60 * 1000,
+    "day": 24 * 60 * 60 * 1000,
+}
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sensor_rollup (
+    resolution TEXT NOT NULL,
+    gauge TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    last REAL NOT NULL,
+    last_ts INTEGER NOT NULL,
+    PRIMARY KEY (resolution, gauge, bucket)
+) WITHOUT ROWID
+"""
+
+# Merge a partial bucket into the stored one
+ROLLUP_UPSERT_SQL = """
+INSERT INTO sensor_rollup (resolution, gauge, bucket, count, sum, min, max, last, last_ts)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, gauge, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    sum = sum + excluded.sum,
+    min = MIN(min, excluded.min),
+    max = MAX(max, excluded.max),
+    last = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last ELSE last END,
+    last_ts = MAX(last_ts, excluded.last_ts)
+"""
+
+
+def now_ms():
+    """Current time as integer epoch milliseconds"""
+    return int(time.time() * 1000)
+
+
+# Databases already warned about, so the message appears once per process
+_auto_vacuum_warned = set()
+
+
+def stored_gauge_columns(columns):
+    """
+    Registry gauges present in a wide table, matched through their aliases
+
+    Args:
+        columns (iterable): Column names of the table
+
+    Returns:
+        list: (registry column, stored column) pairs in registry order, e.g.
+            ("rain", "length") for sensors.db
+    """
+    columns = set(columns)
+    pairs = []
+    for gauge in GAUGE_REGISTRY:
+        for column in (gauge["column"],) + tuple(gauge.get("aliases", ())):
+            if column in columns:
+                pairs.append((gauge["column"], column))
+                break
+    return pairs
+
+
+def connect(db_path=DB_PATH, check_auto_vacuum=True):
+    """
+    Open a connection configured for concurrent use of the readings DB
+
+    Args:
+        db_path (str): Path to the SQLite database
+        check_auto_vacuum (bool): Log once if an existing file cannot be
+            shrunk by incremental vacuum
+
+    Returns:
+        sqlite3.Connection: Connection in WAL mode
+    """
+    conn = sqlite3.connect(db_path, timeout=5.0)
+    # Must precede the first table: new files are created ready for the
+    # retention policy's incremental vacuum (a no-op on existing files)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    if (check_auto_vacuum and db_path not in _auto_vacuum_warned
+            and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2):
+        _auto_vacuum_warned.add(db_path)
+        logger.warning(f"{db_path} is not in incremental auto-vacuum mode, so retention cannot shrink it; "
+                       f"run migrate-sensor-db.py once to convert it")
+    # WAL lets the LLM service keep reading while the writer commits;
+    # the mode is persistent, so plain connections to the file benefit too
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def migrate_timestamps(conn, table="sensor_data", batch_size=5000):
+    """
+    Add the integer `ts` column and its covering index to a readings table
+
+    Existing rows are kept and backfilled from their TEXT `timestamp` (local
+    time) in small batches, so a large table never holds one long write lock.
+    Safe to run repeatedly.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database
+        table (str): Table holding the readings
+        batch_size (int): Rows updated per transaction while backfilling
+
+    Returns:
+        int: Number of rows backfilled
+    """
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not columns:
+        return 0
+    names = [column[1] for column in columns]
+    if TS_COLUMN not in names:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {TS_COLUMN} INTEGER")
+        conn.commit()
+
+    backfilled = 0
+    low, high = conn.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE {TS_COLUMN} IS NULL").fetchone()
+    if low is not None:
+        for start in range(low - 1, high, batch_size):
+            with conn:
+                cursor = conn.execute(f"""
+                    UPDATE {table}
+                    SET {TS_COLUMN} = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000
+                    WHERE id > ? AND id <= ? AND {TS_COLUMN} IS NULL
+                """, (start, start + batch_size))
+            backfilled += cursor.rowcount
+
+    # Index ts together with the gauge columns so latest-value and range
+    # reads are answered from the index alone. Fresh and migrated tables get
+    # the same index; one built with another column set is rebuilt.
+    index_columns = [TS_COLUMN] + [stored for _, stored in stored_gauge_columns(names)]
+    index = f"idx_{table}_ts"
+    existing = [row[2] for row in conn.execute(f"PRAGMA index_info({index})")]
+    if existing != index_columns:
+        with conn:
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+            conn.execute(f"CREATE INDEX {index} ON {table} ({', '.join(index_columns)})")
+    return backfilled
+
+
+def migrate_metadata_columns(conn, table="sensor_data"):
+    """Add missing METADATA_COLUMNS and the image hash index; safe to rerun"""
+    names = [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+    if not names:
+        return
+    with conn:
+        for name, column_type in METADATA_COLUMNS.items():
+            if name not in names:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_image_hash ON {table} (image_hash)")
+
+
+def compress_payload(text):
+    """zlib-compress a text payload (raw model output) for storage"""
+    if text is None:
+        return None
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_payload(blob):
+    """Inverse of compress_payload"""
+    if blob is None:
+        return None
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def reading_from_vlm_result(vlm_result, ts, stream=DEFAULT_STREAM):
+    """
+    Build the row submitted to the writer from a VLM result
+
+    Gauges the model reported as null (or left out) stay None instead of
+    being stored as 0, and are listed in `null_gauges`.
+
+    Args:
+        vlm_result (dict): Output of VLMProcessor.process_image plus
+            `latency_ms` (or the rounded `processing_time` in seconds)
+            and optionally `image_hash`
+        ts (int): Epoch milliseconds of the reading
+        stream (str): Stream the frame came from
+
+    Returns:
+        dict: Reading with gauge values and provenance columns
+    """
+    readings = vlm_result.get("gauge_readings") or {}
+    timings = vlm_result.get("timings") or {}
+    reading = {"ts": ts, "stream": stream}
+    null_gauges = []
+    for gauge in GAUGE_REGISTRY:
+        value = readings.get(gauge["name"])
+        reading[gauge["column"]] = None if value is None else float(value)
+        if value is None:
+            null_gauges.append(gauge["name"])
+    latency_ms = vlm_result.get("latency_ms")
+    if latency_ms is None and vlm_result.get("processing_time") is not None:
+        latency_ms = vlm_result["processing_time"] * 1000
+    reading.update({
+        "image_hash": vlm_result.get("image_hash"),
+        "model": vlm_result.get("model"),
+        "prompt_version": vlm_result.get("prompt_version"),
+        "raw_response": compress_payload(vlm_result.get("raw_response")),
+        "prompt_tokens": timings.get("prompt_tokens"),
+        "generated_tokens": timings.get("generated_tokens"),
+        "latency_ms": latency_ms,
+        "null_gauges": json.dumps(null_gauges) if null_gauges else None,
+    })
+    return reading
+
+
+def order_column(conn, table="sensor_data"):
+    """
+    Column to order readings by: the indexed ts, or the TEXT timestamp of a
+    database that has not been migrated yet (see migrate-sensor-db.py)
+    """
+    columns = [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+    return TS_COLUMN if TS_COLUMN in columns else "timestamp"
+
+
+def fetch_latest(conn, columns=("temperature", "pressure", "rain"), table="sensor_data"):
+    """Return the newest reading as a dict, or None if the table is empty"""
+    cursor = conn.execute(
+        f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order_column(conn, table)} DESC LIMIT 1")
+    row = cursor.fetchone()
+    return dict(zip(columns, row)) if row else None
+
+
+def fetch_range(conn, start_ms, end_ms, columns=("temperature", "pressure", "rain"), table="sensor_data"):
+    """Iterate (ts, *columns) rows with start_ms <= ts < end_ms in time order"""
+    return conn.execute(
+        f"SELECT {TS_COLUMN}, {', '.join(columns)} FROM {table} "
+        f"WHERE {TS_COLUMN} >= ? AND {TS_COLUMN} < ? ORDER BY {TS_COLUMN}",
+        (start_ms, end_ms))
+
+
+class GaugeCatalog:
+    """Name -> id lookups for the `streams` and `gauges` tables"""
+
+    def __init__(self, conn, registry=GAUGE_REGISTRY):
+        self.conn = conn
+        self.gauge_ids = {}
+        self.stream_ids = {}
+        with conn:
+            for gauge in registry:
+                conn.execute("""
+                    INSERT INTO gauges (name, column_name, unit) VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET column_name = excluded.column_name, unit = excluded.unit
+                """, (gauge["name"], gauge["column"], gauge.get("unit")))
+        for gauge_id, name, column in conn.execute("SELECT gauge_id, name, column_name FROM gauges"):
+            self.gauge_ids[name] = gauge_id
+            if column:
+                self.gauge_ids.setdefault(column, gauge_id)
+        for stream_id, name in conn.execute("SELECT stream_id, name FROM streams"):
+            self.stream_ids[name] = stream_id
+
+    def stream_id(self, name):
+        """Id of a stream, registering it on first use (caller commits)"""
+        stream_id = self.stream_ids.get(name)
+        if stream_id is None:
+            self.conn.execute("INSERT OR IGNORE INTO streams (name) VALUES (?)", (name,))
+            stream_id = self.conn.execute("SELECT stream_id FROM streams WHERE name = ?", (name,)).fetchone()[0]
+            self.stream_ids[name] = stream_id
+        return stream_id
+
+    def long_rows(self, batch, registry=GAUGE_REGISTRY):
+        """Adapt wide reading dicts to (stream_id, gauge_id, ts, value, confidence) rows"""
+        rows = []
+        for reading in batch:
+            stream_id = self.stream_id(reading.get("stream", DEFAULT_STREAM))
+            confidence = reading.get("confidence") or {}
+            for gauge in registry:
+                value = reading.get(gauge["column"])
+                if value is None:
+                    continue
+                rows.append((stream_id, self.gauge_ids[gauge["name"]], reading[TS_COLUMN],
+                             value, confidence.get(gauge["name"])))
+        return rows
+
+
+def backfill_readings(conn, batch_size=5000, stream=DEFAULT_STREAM):
+    """
+    Copy legacy sensor_data rows into the long-format `readings` table
+
+    Only runs when `readings` is empty. Legacy columns are matched through
+    the registry, including aliases such as `length` in sensors.db.
+
+    Returns:
+        int: Number of legacy rows copied
+    """
+    if conn.execute("SELECT 1 FROM readings LIMIT 1").fetchone():
+        return 0
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(sensor_data)")]
+    if not columns:
+        return 0
+    catalog = GaugeCatalog(conn)
+    gauge_names = {gauge["column"]: gauge["name"] for gauge in GAUGE_REGISTRY}
+    mapping = [(stored, catalog.gauge_ids[gauge_names[gauge]]) for gauge, stored in stored_gauge_columns(columns)]
+    if not mapping:
+        return 0
+
+    with conn:
+        stream_id = catalog.stream_id(stream)
+    cursor = conn.execute(
+        f"SELECT {TS_COLUMN}, {', '.join(column for column, _ in mapping)} FROM sensor_data "
+        f"WHERE {TS_COLUMN} IS NOT NULL ORDER BY id")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        long_rows = [(stream_id, gauge_id, row[0], row[i + 1], None)
+                     for row in rows for i, (_, gauge_id) in enumerate(mapping) if row[i + 1] is not None]
+        with conn:
+            conn.executemany(READINGS_INSERT_SQL, long_rows)
+        total += len(rows)
+    return total
+
+
+def fetch_gauge_range(conn, gauge, start_ms, end_ms, stream=DEFAULT_STREAM):
+    """
+    (ts, value, confidence) rows for one gauge of one stream, in time order
+
+    Served straight from the (stream_id, gauge_id, ts) primary key.
+    `gauge` may be the registry name or its legacy column name.
+    """
+    return conn.execute("""
+        SELECT r.ts, r.value, r.confidence FROM readings r
+        WHERE r.stream_id = (SELECT stream_id FROM streams WHERE name = ?)
+          AND r.gauge_id = (SELECT gauge_id FROM gauges WHERE name = ? OR column_name = ?)
+          AND r.ts >= ? AND r.ts < ?
+        ORDER BY r.ts
+    """, (stream, gauge, gauge, start_ms, end_ms))
+
+
+def accumulate_rollups(rows, gauges=GAUGE_COLUMNS):
+    """
+    Fold readings into partial rollup buckets
+
+    Args:
+        rows (iterable): Dicts with `ts` and one value per gauge
+        gauges (tuple): Gauge columns to aggregate
+
+    Returns:
+        dict: (resolution, gauge, bucket) -> [count, sum, min, max, last, last_ts]
+    """
+    buckets = {}
+    for row in rows:
+        ts = row[TS_COLUMN]
+        for gauge in gauges:
+            value = row.get(gauge)
+            if value is None or ts is None:
+                continue
+            for resolution, width in ROLLUP_RESOLUTIONS.items():
+                key = (resolution, gauge, ts - ts % width)
+                entry = buckets.get(key)
+                if entry is None:
+                    buckets[key] = [1, value, value, value, value, ts]
+                else:
+                    entry[0] += 1
+                    entry[1] += value
+                    entry[2] = min(entry[2], value)
+                    entry[3] = max(entry[3], value)
+                    if ts >= entry[5]:
+                        entry[4] = value
+                        entry[5] = ts
+    return buckets
+
+
+def apply_rollups(conn, buckets):
+    """Upsert partial buckets from `accumulate_rollups` (caller commits)"""
+    conn.executemany(ROLLUP_UPSERT_SQL, [key + tuple(entry) for key, entry in buckets.items()])
+
+
+def backfill_rollups(conn, batch_size=5000):
+    """
+    Build rollups for readings written before the rollup table existed
+
+    Only runs when the rollup table is empty, streaming raw rows in batches.
+
+    Returns:
+        int: Number of raw rows folded in
+    """
+    if conn.execute("SELECT 1 FROM sensor_rollup LIMIT 1").fetchone():
+        return 0
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(sensor_data)")]
+    # Roll up under the registry column, as the writer does for live readings
+    # (sensors.db stores rain as `length`)
+    pairs = stored_gauge_columns(columns)
+    if not pairs:
+        return 0
+    gauges = tuple(gauge for gauge, _ in pairs)
+
+    cursor = conn.execute(
+        f"SELECT {TS_COLUMN}, {', '.join(stored for _, stored in pairs)} FROM sensor_data "
+        f"WHERE {TS_COLUMN} IS NOT NULL ORDER BY {TS_COLUMN}")
+    total = 0
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        buckets = accumulate_rollups((dict(zip((TS_COLUMN,) + gauges, row)) for row in rows), gauges)
+        with conn:
+            apply_rollups(conn, buckets)
+        total += len(rows)
+    return total
+
+
+def column_for_gauge(gauge):
+    """Legacy column name for a registry name or column, or None if unknown"""
+    for entry in GAUGE_REGISTRY:
+        if gauge in (entry["name"], entry["column"]):
+            return entry["column"]
+    return None
+
+
+def iter_rollups(conn, gauge, resolution, start_ms, end_ms):
+    """Stream rollup buckets for one gauge column, see `fetch_rollups`"""
+    if resolution not in ROLLUP_RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    width = ROLLUP_RESOLUTIONS[resolution]
+    cursor = conn.execute("""
+        SELECT bucket, count, sum / count, min, max, last FROM sensor_rollup
+        WHERE resolution = ? AND gauge = ? AND bucket >= ? AND bucket < ?
+        ORDER BY bucket
+    """, (resolution, gauge, start_ms - start_ms % width, end_ms))
+    keys = ("bucket", "count", "mean", "min", "max", "last")
+    for row in cursor:
+        yield dict(zip(keys, row))
+
+
+def iter_series(conn, gauge, start_ms, end_ms, bucket="raw", stream=None, chunk_size=1000):
+    """
+    Stream a gauge's history, raw or aggregated, without materializing it
+
+    Named buckets (minute/hour/day) without a stream are served from the
+    rollup tables, which combine all streams. Any other bucket width, or a
+    specific stream, is aggregated on the fly from the `readings` primary
+    key, one bucket at a time.
+
+    Args:
+        conn (sqlite3.Connection): Open connection
+        gauge (str): Registry name or legacy column
+        start_ms (int): Inclusive range start (epoch ms)
+        end_ms (int): Exclusive range end (epoch ms)
+        bucket (str|int): "raw", a ROLLUP_RESOLUTIONS name or a width in ms
+        stream (str): Stream name, None for all streams / the default stream
+        chunk_size (int): Rows fetched from SQLite at a time
+
+    Yields:
+        dict: {ts, value, confidence} for raw, else
+            {bucket, count, mean, min, max, last}
+    """
+    column = column_for_gauge(gauge)
+    if column is None:
+        raise ValueError(f"Unknown gauge: {gauge}")
+
+    if bucket in ROLLUP_RESOLUTIONS and stream is None:
+        yield from iter_rollups(conn, column, bucket, start_ms, end_ms)
+        return
+
+    cursor = fetch_gauge_range(conn, column, start_ms, end_ms, stream=stream or DEFAULT_STREAM)
+    if bucket == "raw":
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for ts, value, confidence in rows:
+                yield {"ts": ts, "value": value, "confidence": confidence}
+
+    width = ROLLUP_RESOLUTIONS.get(bucket) or int(bucket)
+    if width <= 0:
+        raise ValueError(f"Bucket width must be positive: {bucket}")
+    current = None
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for ts, value, _ in rows:
+            if value is None:
+                continue
+            start = ts - ts % width
+            if current is None or current["bucket"] != start:
+                if current is not None:
+                    current["mean"] = current.pop("sum") / current["count"]
+                    yield current
+                current = {"bucket": start, "count": 0, "sum": 0.0, "min": value, "max": value}
+            current["count"] += 1
+            current["sum"] += value
+            current["min"] = min(current["min"], value)
+            current["max"] = max(current["max"], value)
+            current["last"] = value
+    if current is not None:
+        current["mean"] = current.pop("sum") / current["count"]
+        yield current
+
+
+def fetch_rollups(conn, gauge, resolution, start_ms, end_ms):
+    """
+    Aggregated buckets for one gauge, served from the rollup table
+
+    Args:
+        conn (sqlite3.Connection): Open connection
+        gauge (str): Gauge column name, e.g. "temperature"
+        resolution (str): One of ROLLUP_RESOLUTIONS
+        start_ms (int): Inclusive range start (epoch ms)
+        end_ms (int): Exclusive range end (epoch ms)
+
+    Returns:
+        list: Dicts with bucket, count, mean, min, max and last
+    """
+    return list(iter_rollups(conn, gauge, resolution, start_ms, end_ms))
+
+
+def summarize_range(conn, gauge, start_ms, end_ms, resolution="hour"):
+    """Combine rollup buckets into one min/max/mean/count/last over a range"""
+    buckets = fetch_rollups(conn, gauge, resolution, start_ms, end_ms)
+    if not buckets:
+        return None
+    count = sum(b["count"] for b in buckets)
+    return {
+        "count": count,
+        "mean": sum(b["mean"] * b["count"] for b in buckets) / count,
+        "min": min(b["min"] for b in buckets),
+        "max": max(b["max"] for b in buckets),
+        "last": buckets[-1]["last"],
+    }
+
+
+def enable_incremental_vacuum(conn):
+    """
+    Switch the database to incremental auto-vacuum
+
+    Changing auto_vacuum on an existing file needs one full VACUUM, so this
+    belongs in the offline migration rather than the running service.
+
+    Returns:
+        bool: True if the file had to be rebuilt
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return False
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+
+# Database files already brought up to date by this process
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(conn):
+    """
+    Create missing tables and run the migrations and backfills
+
+    Done once per database file and process, under a lock, so readers can
+    call it before querying a database the writer has not opened yet
+    without two connections backfilling the same rows.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database
+    """
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    with _schema_lock:
+        if path and path in _schema_ready:
+            return
+        conn.executescript(SCHEMA + ";" + ROLLUP_SCHEMA + ";" + READINGS_SCHEMA)
+        conn.commit()
+        migrate_timestamps(conn)
+        migrate_metadata_columns(conn)
+        backfill_rollups(conn)
+        backfill_readings(conn)
+        if path:
+            _schema_ready.add(path)
+
+
+class RetentionPolicy:
+    """
+    Bounded-size retention for the readings DB
+
+    Raw rows older than `raw_days` are deleted (they already live on in the
+    rollup tables, and can be handed to `archive` first). Rollup buckets are
+    trimmed per resolution. All deletes happen in small batches with an
+    incremental vacuum after each one, so no step holds a long write lock.
+    """
+
+    def __init__(self, raw_days=7, rollup_days=None, batch_size=500,
+                 vacuum_pages=200, check_interval=300.0, archive=None, frame_store=None):
+        """
+        Args:
+            raw_days (float): Days of raw rows to keep, None to keep everything
+            rollup_days (dict): Days to keep per rollup resolution, None = forever
+            batch_size (int): Rows deleted per transaction
+            vacuum_pages (int): Free pages returned to the OS per step
+            check_interval (float): Seconds between steps once caught up
+            archive (callable): Called with each batch of raw rows before deletion
+            frame_store (FrameStore): Frames whose last reading is deleted are
+                released from this store
+        """
+        self.raw_days = raw_days
+        self.rollup_days = {"minute": 30, "hour": 365, "day": None}
+        if rollup_days:
+            self.rollup_days.update(rollup_days)
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.check_interval = check_interval
+        self.archive = archive
+        self.frame_store = frame_store
+
+    @staticmethod
+    def _cutoff(days, now):
+        return None if days is None else now - int(days * ROLLUP_RESOLUTIONS["day"])
+
+    def run_step(self, conn, now=None):
+        """
+        Delete at most one batch per table
+
+        Returns:
+            int: Rows deleted; equal to a full batch means more are pending
+        """
+        now = now_ms() if now is None else now
+        deleted = 0
+
+        cutoff = self._cutoff(self.raw_days, now)
+        if cutoff is not None:
+            with conn:
+                if self.archive is not None:
+                    rows = conn.execute(
+                        f"SELECT * FROM sensor_data WHERE {TS_COLUMN} < ? ORDER BY {TS_COLUMN} LIMIT ?",
+                        (cutoff, self.batch_size)).fetchall()
+                    if rows:
+                        self.archive(rows)
+                image_hashes = []
+                if self.frame_store is not None:
+                    image_hashes = [row[0] for row in conn.execute(
+                        f"SELECT image_hash FROM sensor_data WHERE {TS_COLUMN} < ? ORDER BY {TS_COLUMN} LIMIT ?",
+                        (cutoff, self.batch_size))]
+                cursor = conn.execute(f"""
+                    DELETE FROM sensor_data WHERE id IN (
+                        SELECT id FROM sensor_data WHERE {TS_COLUMN} < ? ORDER BY {TS_COLUMN} LIMIT ?
+                    )
+                """, (cutoff, self.batch_size))
+            deleted = max(deleted, cursor.rowcount)
+            if image_hashes:
+                # After the commit, so a blob is only removed once no row can reference it
+                self.frame_store.release(conn, image_hashes)
+            with conn:
+                cursor = conn.execute("""
+                    DELETE FROM readings WHERE (stream_id, gauge_id, ts) IN (
+                        SELECT stream_id, gauge_id, ts FROM readings WHERE ts < ? LIMIT ?
+                    )
+                """, (cutoff, self.batch_size))
+            deleted = max(deleted, cursor.rowcount)
+
+        for resolution, days in self.rollup_days.items():
+            cutoff = self._cutoff(days, now)
+            if cutoff is None:
+                continue
+            with conn:
+                cursor = conn.execute("""
+                    DELETE FROM sensor_rollup WHERE (resolution, gauge, bucket) IN (
+                        SELECT resolution, gauge, bucket FROM sensor_rollup
+                        WHERE resolution = ? AND bucket < ? LIMIT ?
+                    )
+                """, (resolution, cutoff, self.batch_size))
+            deleted = max(deleted, cursor.rowcount)
+
+        if deleted and self.vacuum_pages:
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        return deleted
+
+
+class SensorDBWriter:
+    """Background writer that owns one connection and group-commits readings"""
+
+    queue_name = "db_writer"
+
+    def __init__(self, db_path=DB_PATH, batch_size=32, flush_interval=1.0, max_queue=10000,
+                 retention=None):
+        """
+        Args:
+            db_path (str): Path to the SQLite database
+            batch_size (int): Commit as soon as this many readings are pending
+            flush_interval (float): Commit pending readings at least this often (seconds)
+            max_queue (int): Readings buffered before submit() starts dropping
+            retention (RetentionPolicy): Applied between batches, None to keep everything
+        """
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.thread = None
+        self._stop_marker = object()
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        """Open the connection, create the schema and start the writer thread"""
+        if self.thread is not None:
+            return
+        self.thread = threading.Thread(target=self._run, name=self.queue_name, daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        metrics.QUEUE_DEPTH.labels(self.queue_name).set_function(self.queue.qsize)
+        logger.info(f"{type(self).__name__} started on {self.db_path}")
+
+    def is_alive(self):
+        """True while the writer thread is running"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def submit(self, reading):
+        """
+        Queue one reading for the next batch
+
+        Args:
+            reading (dict): Row with timestamp, ts, one value per GAUGE_COLUMNS
+                entry and optionally `stream` and per-gauge `confidence`
+
+        Returns:
+            bool: False if the queue is full and the reading was dropped
+        """
+        if not self.is_alive():
+            metrics.DROPPED_FRAMES_TOTAL.labels("db_writer_down").inc()
+            logger.error(f"{type(self).__name__} is not running, dropping reading")
+            return False
+        try:
+            self.queue.put_nowait(reading)
+            return True
+        except queue.Full:
+            metrics.DROPPED_FRAMES_TOTAL.labels("db_queue_full").inc()
+            logger.warning("Sensor DB writer queue full, dropping reading")
+            return False
+
+    def flush(self, timeout=None):
+        """Block until every reading submitted so far has been committed"""
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        """Commit pending readings and close the connection"""
+        if self.thread is None:
+            return
+        self.queue.put(self._stop_marker)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _open(self):
+        conn = connect(self.db_path)
+        ensure_schema(conn)
+        self.catalog = GaugeCatalog(conn)
+        return conn
+
+    def _commit(self, conn, batch):
+        start = time.perf_counter()
+        buckets = accumulate_rollups(batch)
+        with conn:
+            # The wide sensor_data table stays the adapter for existing readers
+            conn.executemany(INSERT_SQL, [dict(READING_DEFAULTS, **reading) for reading in batch])
+            conn.executemany(READINGS_INSERT_SQL, self.catalog.long_rows(batch))
+            apply_rollups(conn, buckets)
+        metrics.observe_stage("db_write", time.perf_counter() - start)
+
+    def _apply_retention(self, conn):
+        """Run one retention step; returns seconds until the next one"""
+        try:
+            deleted = self.retention.run_step(conn)
+        except Exception:
+            # Archive callbacks and frame deletion can fail in any way; the
+            # writer must keep committing readings regardless
+            logger.exception("Retention step failed")
+            return self.retention.check_interval
+        # Keep going quickly while there is a backlog, but yield to new readings
+        return self.flush_interval if deleted >= self.retention.batch_size else self.retention.check_interval
+
+    def _run(self):
+        try:
+            conn = self._open()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        batch = []
+        waiters = []
+        deadline = None
+        next_retention = time.monotonic() if self.retention is not None else None
+        running = True
+        while running:
+            wake_times = [t for t in (deadline, next_retention) if t is not None]
+            timeout = max(0.0, min(wake_times) - time.monotonic()) if wake_times else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._stop_marker:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.batch_size or due or waiters or not running):
+                try:
+                    self._commit(conn, batch)
+                except Exception:
+                    logger.exception(f"Failed to commit {len(batch)} readings")
+                batch = []
+                deadline = None
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+            if running and not batch and next_retention is not None and time.monotonic() >= next_retention:
+                next_retention = time.monotonic() + self._apply_retention(conn)
+
+        conn.close()
+
+
+# Global writer instance
+db_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_db_writer(db_path=DB_PATH, retention=None):
+    """Get or start the global sensor DB writer (arguments apply on first call)"""
+    global db_writer
+    with _writer_lock:
+        if db_writer is None:
+            # Publish the writer only once it started: a failed start raises
+            # here and the next call tries again
+            writer = SensorDBWriter(db_path, retention=retention)
+            writer.start()
+            atexit.register(writer.stop)
+            db_writer = writer
+    return db_writer
@@ -0,0 +1,57 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+import archive_export
+
+DAY_MS = 86_400_000
+START = 1_757_808_000_000  # 2025-09-14 00:00 UTC
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "sensors.db")
+    conn = sqlite3.connect(path)
+    # sensors.db layout (rain stored as `length`) plus a non-gauge REAL column
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, "
+                 "pressure REAL, temperature REAL, length REAL, ts INTEGER, latency_ms REAL)")
+    conn.executemany("INSERT INTO sensor_data (pressure, temperature, length, ts, latency_ms) VALUES (?, ?, ?, ?, ?)",
+                     [(1.5, 21.0, 3.0, START + 1000, 850.0),
+                      (1.6, None, 4.0, START + DAY_MS + 1000, 900.0),
+                      (1.7, 23.0, 5.0, None, 910.0)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_gauge_columns_come_from_the_registry(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        assert archive_export._gauge_columns(conn) == [
+            ("temperature", "temperature"), ("pressure", "pressure"), ("rain", "length")]
+    finally:
+        conn.close()
+
+
+def test_series_export_round_trip(db_path, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    assert archive_export.export_readings(db_path, archive_dir, codec="series") == 2
+    # The high-water mark keeps a second run from exporting rows again
+    assert archive_export.export_readings(db_path, archive_dir, codec="series") == 0
+
+    result = archive_export.read_series_range(START, START + 2 * DAY_MS, archive_dir)
+    assert set(result) == {"ts", "id", "temperature", "pressure", "rain"}
+    assert result["ts"].tolist() == [START + 1000, START + DAY_MS + 1000]
+    assert result["rain"].tolist() == [3.0, 4.0]
+    assert np.isnan(result["temperature"][1])
+
+    only_day_two = archive_export.read_series_range(START + DAY_MS, START + 2 * DAY_MS, archive_dir,
+                                                   columns=["pressure"])
+    assert list(only_day_two) == ["pressure"]
+    assert only_day_two["pressure"].tolist() == pytest.approx([1.6])
+
+
+def test_rejects_unknown_codec(db_path, tmp_path):
+    with pytest.raises(ValueError):
+        archive_export.export_readings(db_path, str(tmp_path / "archive"), codec="csv")
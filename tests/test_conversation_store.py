@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+import conversation_store
+
+
+class FakeCache:
+    def __init__(self, size):
+        self.size = size
+
+
+def new_store(**options):
+    return conversation_store.ConversationStore(lambda cache: cache.size, **options)
+
+
+def test_stateless_turns_are_never_stored():
+    store = new_store()
+    with store.checkout(None) as session:
+        store.update(session, [1, 2, 3], FakeCache(10))
+    assert len(store) == 0 and store.cache_bytes() == 0
+
+
+def test_update_keeps_history_and_cache():
+    store = new_store()
+    with store.checkout("a") as session:
+        assert session.context_ids == [] and session.past_key_values is None
+        store.update(session, [1, 2, 3], FakeCache(10), system_message="sys")
+    with store.checkout("a") as session:
+        assert session.context_ids == [1, 2, 3]
+        assert session.system_message == "sys"
+        assert session.past_key_values.size == 10 and session.turns == 1
+    assert store.cache_bytes() == 10
+
+
+def test_failed_turn_drops_the_cache_but_keeps_history():
+    store = new_store()
+    with store.checkout("a") as session:
+        store.update(session, [1, 2], FakeCache(10))
+    with pytest.raises(RuntimeError):
+        with store.checkout("a") as session:
+            raise RuntimeError("generation failed")
+    with store.checkout("a") as session:
+        assert session.context_ids == [1, 2]
+        assert session.past_key_values is None
+
+
+def test_caches_are_evicted_least_recent_first_to_fit_the_budget():
+    store = new_store(max_cache_bytes=25)
+    for session_id in ("a", "b", "c"):
+        with store.checkout(session_id) as session:
+            store.update(session, [1], FakeCache(10))
+    assert store.cache_bytes() == 20
+    with store.checkout("a") as session:
+        # "a" lost its cache to "c" but kept its history
+        assert session.past_key_values is None and session.context_ids == [1]
+    with store.checkout("b") as session:
+        assert session.past_key_values is not None
+
+
+def test_oversized_cache_is_not_kept():
+    store = new_store(max_cache_bytes=5)
+    with store.checkout("a") as session:
+        store.update(session, [1], FakeCache(10))
+    assert store.cache_bytes() == 0
+    assert len(store) == 1
+
+
+def test_least_recent_sessions_over_the_limit_are_dropped():
+    store = new_store(max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        with store.checkout(session_id) as session:
+            store.update(session, [1], None)
+    assert len(store) == 2
+    with store.checkout("a") as session:
+        assert session.context_ids == []
+
+
+def test_idle_sessions_expire():
+    store = new_store(idle_seconds=0)
+    with store.checkout("a") as session:
+        store.update(session, [1], None)
+    with store.checkout("b"):
+        pass
+    assert len(store) == 1
+
+
+def test_a_session_in_use_is_never_evicted():
+    store = new_store(max_cache_bytes=15)
+    started, release = threading.Event(), threading.Event()
+
+    def long_turn():
+        with store.checkout("busy") as session:
+            store.update(session, [1], FakeCache(10))
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=long_turn)
+    thread.start()
+    started.wait(5)
+    with store.checkout("other") as session:
+        store.update(session, [1], FakeCache(10))
+    release.set()
+    thread.join(5)
+    with store.checkout("busy") as session:
+        assert session.past_key_values is not None
+    # Both caches were in use; the next update brings the total back in budget
+    with store.checkout("third") as session:
+        store.update(session, [1], None)
+    assert store.cache_bytes() <= 15
+
+
+def test_new_session_ids_are_unique():
+    ids = {conversation_store.ConversationStore.new_session_id() for _ in range(100)}
+    assert len(ids) == 100
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+import pytest
+
+import frame_store
+
+FRAME = b"\xff\xd8 not really a jpeg \xff\xd9"
+DIGEST = hashlib.sha256(FRAME).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return frame_store.FrameStore(str(tmp_path / "frames"))
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE sensor_data (id INTEGER PRIMARY KEY, image_hash TEXT)")
+    yield conn
+    conn.close()
+
+
+def age(store, digest, seconds):
+    past = time.time() - seconds
+    os.utime(store.path_for(digest), (past, past))
+
+
+def test_put_is_content_addressed_and_deduplicated(store):
+    assert store.put(FRAME) == DIGEST
+    assert store.put(FRAME) == DIGEST
+    assert DIGEST in store and store.get(DIGEST) == FRAME
+    assert store.path_for(DIGEST).endswith(os.path.join(DIGEST[:2], DIGEST[2:4], f"{DIGEST}.jpg"))
+    assert [digest for digest, _ in store.iter_digests()] == [DIGEST]
+
+
+def test_get_and_delete_missing(store):
+    assert store.get(DIGEST) is None
+    assert store.delete(DIGEST) is False
+
+
+def test_re_put_restarts_the_grace_period(store):
+    store.put(FRAME)
+    age(store, DIGEST, 7200)
+    store.put(FRAME)
+    assert time.time() - os.path.getmtime(store.path_for(DIGEST)) < 60
+
+
+def test_release_keeps_referenced_and_recent_blobs(store, conn):
+    store.put(FRAME)
+    # Recent blobs may belong to a reading still in the writer queue
+    assert store.release(conn, [DIGEST, None]) == 0
+
+    age(store, DIGEST, 7200)
+    conn.execute("INSERT INTO sensor_data (image_hash) VALUES (?)", (DIGEST,))
+    assert store.release(conn, [DIGEST]) == 0
+
+    conn.execute("DELETE FROM sensor_data")
+    assert store.release(conn, [DIGEST]) == 1
+    assert DIGEST not in store
+    assert store.release(conn, [DIGEST]) == 0
+
+
+def test_release_keeps_a_blob_re_put_by_a_queued_reading(store, conn):
+    store.put(FRAME)
+    age(store, DIGEST, 7200)
+    # The old row was deleted by retention, but an identical frame was just
+    # stored for a reading whose row is not committed yet
+    store.put(FRAME)
+    assert store.release(conn, [DIGEST]) == 0
+    assert store.get(DIGEST) == FRAME
+
+
+def test_gc_removes_only_old_unreferenced_blobs(store, conn):
+    kept = store.put(b"referenced")
+    young = store.put(b"young")
+    old = store.put(b"old")
+    conn.execute("INSERT INTO sensor_data (image_hash) VALUES (?)", (kept,))
+    age(store, kept, 7200)
+    age(store, old, 7200)
+    assert store.gc(conn) == 1
+    assert kept in store and young in store and old not in store
+
+
+def test_release_skips_blobs_that_cannot_be_deleted(store, conn, monkeypatch):
+    stuck = store.put(b"stuck")
+    free = store.put(b"free")
+    age(store, stuck, 7200)
+    age(store, free, 7200)
+    remove = os.remove
+
+    def failing_remove(path):
+        if stuck in path:
+            raise PermissionError(13, "Permission denied", path)
+        remove(path)
+
+    monkeypatch.setattr(os, "remove", failing_remove)
+    assert store.release(conn, [stuck, free]) == 1
+    assert stuck in store and free not in store
+    assert store.gc(conn) == 0
+
+
+def test_references_outside_the_database_keep_blobs(store):
+    kept = store.put(b"in a segment")
+    old = store.put(b"old")
+    age(store, kept, 7200)
+    age(store, old, 7200)
+    assert store.release(None, [kept], referenced={kept}) == 0
+    assert store.gc(None, referenced={kept}) == 1
+    assert kept in store and old not in store
@@ -0,0 +1,72 @@
+import pytest
+
+import intent_router
+
+
+@pytest.fixture(scope="module")
+def router():
+    return intent_router.IntentRouter()
+
+
+def test_normalize():
+    assert intent_router.normalize("  Please, turn ON the FAN!!  ") == "turn on the fan"
+    assert intent_router.normalize("What's the temperature? Thanks") == "what is the temperature"
+    assert intent_router.normalize("Don't open the drain") == "dont open the drain"
+    assert intent_router.normalize("?!") == ""
+
+
+@pytest.mark.parametrize("text,intent", [
+    ("Turn on the fan", "fan_on"),
+    ("please switch the fans on", "fan_on"),
+    ("FAN ON", "fan_on"),
+    ("stop the fan", "fan_off"),
+    ("could you turn off the fan please", "fan_off"),
+    ("Open the drain.", "drain_open"),
+    ("shut the drain", "drain_closed"),
+    ("drain closed", "drain_closed"),
+    ("What's the current temperature?", "sensor_data"),
+    ("show me the latest readings", "sensor_data"),
+    ("is it raining", "sensor_data"),
+])
+def test_patterns_route_without_the_llm(router, text, intent):
+    route = router.route(text)
+    assert route is not None
+    assert route["intent"] == intent
+    assert (route["tool"], route["args"]) == intent_router.INTENTS[intent]
+    assert route["source"] == "pattern" and route["score"] == 1.0
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "turn on the fan and open the drain",
+    "if it rains, open the drain",
+    "don't turn on the fan",
+    "do not open the drain",
+    "turn on the fan then off",
+    "tell me a joke",
+    "turn on the fan for ten minutes",
+])
+def test_compound_negated_and_unknown_inputs_go_to_the_llm(router, text):
+    assert router.route(text) is None
+
+
+def test_routes_do_not_share_argument_dicts(router):
+    route = router.route("fan on")
+    route["args"]["state"] = "off"
+    assert router.route("fan on")["args"] == {"state": "on"}
+
+
+def test_classifier_catches_paraphrases():
+    classifier = intent_router.KeywordClassifier(intent_router.DEFAULT_EXAMPLES)
+    router = intent_router.IntentRouter(classifier=classifier)
+    route = router.route("get the fan going now")
+    assert route["intent"] == "fan_on" and route["source"] == "classifier"
+    assert 0.75 <= route["score"] < 1.0
+    assert router.route("what is the meaning of life") is None
+
+
+def test_classifier_threshold():
+    classifier = intent_router.KeywordClassifier({"fan_on": ["turn on the fan"]}, threshold=1.0)
+    assert classifier.classify("turn on the fan") == ("fan_on", 1.0)
+    intent, score = classifier.classify("turn on the big fan")
+    assert intent is None and score == pytest.approx(0.8)
@@ -0,0 +1,45 @@
+import numpy as np
+
+import lttb
+
+
+def test_short_series_and_small_budgets_are_returned_whole():
+    x = np.arange(5)
+    assert lttb.lttb_indices(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb.lttb_indices(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb.lttb_indices(x, x, 2).tolist() == [0, 1, 2, 3, 4]
+    assert lttb.lttb_indices([], [], 3).tolist() == []
+
+
+def test_keeps_endpoints_and_returns_sorted_unique_indices():
+    rng = np.random.default_rng(0)
+    x = np.arange(10_000) * 1000.0
+    y = rng.normal(size=len(x))
+    idx = lttb.lttb_indices(x, y, 100)
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+
+
+def test_picks_one_point_per_bucket():
+    n, n_out = 1000, 12
+    idx = lttb.lttb_indices(np.arange(n), np.zeros(n), n_out)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    for i, index in enumerate(idx[1:-1]):
+        assert edges[i] <= index < edges[i + 1]
+
+
+def test_keeps_spikes_that_decimation_misses():
+    n = 100_000
+    x = np.arange(n, dtype=np.float64)
+    y = np.zeros(n)
+    spikes = [12_345, 54_321, 87_654]
+    y[spikes] = 50.0
+    idx = lttb.lttb_indices(x, y, 500)
+    assert set(spikes) <= set(idx.tolist())
+    assert not set(spikes) & set(lttb.decimate_indices(n, 500).tolist())
+
+
+def test_decimate_indices():
+    assert lttb.decimate_indices(3, 5).tolist() == [0, 1, 2]
+    assert lttb.decimate_indices(101, 3).tolist() == [0, 50, 100]
@@ -0,0 +1,94 @@
+import math
+
+import numpy as np
+import pytest
+
+import reading_ring
+
+GAUGES = ("temperature", "pressure", "rain")
+
+
+@pytest.fixture
+def ring(tmp_path):
+    return reading_ring.ReadingRing(str(tmp_path / "readings.ring"), gauges=GAUGES, capacity=4, create=True)
+
+
+def test_empty_ring(ring):
+    assert ring.latest() is None
+    assert ring.stats("temperature") is None
+    ts, values = ring.window()
+    assert len(ts) == 0 and values.shape == (0, len(GAUGES))
+
+
+def test_latest_maps_missing_values_to_none(ring):
+    ring.append(1000, {"temperature": 21.5, "pressure": None})
+    assert ring.latest() == {"ts": 1000, "temperature": 21.5, "pressure": None, "rain": None}
+
+
+def test_wraps_and_keeps_newest_rows_in_order(ring):
+    for i in range(10):
+        ring.append(i * 1000, {"temperature": float(i)})
+    assert ring.count == 10
+    ts, values = ring.window()
+    assert ts.tolist() == [6000, 7000, 8000, 9000]
+    assert values[:, 0].tolist() == [6.0, 7.0, 8.0, 9.0]
+
+    ts, _ = ring.window(since_ms=8000)
+    assert ts.tolist() == [8000, 9000]
+    ts, _ = ring.window(n=1)
+    assert ts.tolist() == [9000]
+
+
+def test_stats_ignore_missing_values(ring):
+    ring.append(1, {"temperature": 20.0})
+    ring.append(2, {"temperature": None})
+    ring.append(3, {"temperature": 30.0})
+    stats = ring.stats("temperature")
+    assert stats == {"count": 2, "mean": 25.0, "min": 20.0, "max": 30.0, "last": 30.0}
+
+
+def test_reader_sees_writer_rows_and_version_changes(ring):
+    reader = reading_ring.open_reader(ring.path, gauges=GAUGES)
+    assert reader is not None and reader.capacity == 4
+    version = reader.version
+    ring.append(5, {"rain": 1.25})
+    assert reader.version != version
+    assert reader.latest()["rain"] == 1.25
+    assert not math.isnan(reader.window()[1][-1, 2])
+
+
+def test_open_reader_rejects_missing_or_mismatched_files(tmp_path, ring):
+    assert reading_ring.open_reader(str(tmp_path / "missing.ring"), gauges=GAUGES) is None
+    assert reading_ring.open_reader(ring.path, gauges=("temperature",)) is None
+    (tmp_path / "junk.ring").write_bytes(b"\0" * 64)
+    assert reading_ring.open_reader(str(tmp_path / "junk.ring"), gauges=GAUGES) is None
+
+
+def test_recreating_with_another_layout_marks_readers_stale(tmp_path, ring):
+    reader = reading_ring.open_reader(ring.path, gauges=GAUGES)
+    assert not reader.is_stale()
+    reading_ring.ReadingRing(ring.path, gauges=GAUGES, capacity=8, create=True)
+    assert reader.is_stale()
+
+
+def test_skips_slots_overwritten_during_a_copy(ring):
+    for i in range(4):
+        ring.append(i, {"temperature": float(i)})
+    # Simulate a writer that lapped slot 0 mid-copy: its sequence number no
+    # longer matches the row the reader expected there
+    ring._seq[0] = 99
+    ts, _ = ring.window()
+    assert ts.tolist() == [1, 2, 3]
+    assert np.array_equal(ring.window(n=2)[0], [2, 3])
+
+
+def test_skips_a_slot_the_writer_is_rewriting(ring):
+    for i in range(1, 5):
+        ring.append(i * 1000, {"temperature": float(i)})
+    # First half of the next append: slot 0 is invalidated and its ts
+    # rewritten, but the row is not published yet
+    ring._seq[0] = 0
+    ring._ts[0] = 99000
+    ts, _ = ring.window(since_ms=1500)
+    assert ts.tolist() == [2000, 3000, 4000]
+    assert ring.latest()["ts"] == 4000
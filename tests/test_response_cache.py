@@ -0,0 +1,64 @@
+import metrics
+import response_cache
+
+
+def new_cache(version=1, **options):
+    state = {"version": version}
+    cache = response_cache.VersionedCache("test_answers", lambda: state["version"], **options)
+    return cache, state
+
+
+def test_entries_are_only_served_at_their_version():
+    cache, state = new_cache()
+    version = cache.version()
+    cache.put("q", version, "answer")
+    assert cache.get("q", cache.version()) == "answer"
+    state["version"] = 2
+    assert cache.get("q", cache.version()) is None
+    cache.put("q", cache.version(), "new answer")
+    assert cache.get("q", 2) == "new answer"
+    assert len(cache) == 1
+
+
+def test_a_reading_during_computation_causes_a_miss():
+    cache, state = new_cache()
+    version = cache.version()
+    state["version"] = 2  # a reading lands while the answer is computed
+    cache.put("q", version, "stale answer")
+    assert cache.get("q", cache.version()) is None
+
+
+def test_unknown_version_disables_caching():
+    def broken():
+        raise OSError("ring not created yet")
+
+    cache = response_cache.VersionedCache("test_answers", broken)
+    assert cache.version() is None
+    cache.put("q", None, "answer")
+    assert cache.get("q", None) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    evictions = metrics.CACHE_EVICTIONS_TOTAL.labels("test_lru")
+    before = evictions.value
+    cache = response_cache.VersionedCache("test_lru", lambda: 1, max_entries=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 1) == "A"  # "b" is now the least recent
+    cache.put("c", 1, "C")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A" and cache.get("c", 1) == "C"
+    assert evictions.value == before + 1
+
+
+def test_hits_are_counted_and_clear_empties_the_cache():
+    hits = metrics.CACHE_HITS_TOTAL.labels("test_hits")
+    before = hits.value
+    cache = response_cache.VersionedCache("test_hits", lambda: 1)
+    cache.put("q", 1, "answer")
+    cache.get("q", 1)
+    cache.get("missing", 1)
+    assert hits.value == before + 1
+    cache.clear()
+    assert len(cache) == 0
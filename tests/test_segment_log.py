@@ -0,0 +1,207 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+import segment_log
+
+GAUGES = ("temperature", "pressure", "rain")
+HASH = "ab" * 32
+
+
+def reading(ts, temperature=20.0, **extra):
+    return dict({"ts": ts, "temperature": temperature, "pressure": 1.5, "rain": None}, **extra)
+
+
+def new_log(root, **options):
+    options = dict({"gauges": GAUGES, "segment_records": 100, "index_interval": 8}, **options)
+    return segment_log.SegmentLog(str(root), "cam", **options)
+
+
+def reopen(root, **options):
+    log = new_log(root, **options)
+    log.open_for_append()
+    return log
+
+
+def test_round_trip(tmp_path):
+    log = reopen(tmp_path)
+    log.append([reading(1000, confidence={"temperature": 0.9}, latency_ms=12.5, image_hash=HASH),
+                reading(2000, temperature=None)])
+    log.close()
+
+    records = new_log(tmp_path).fetch_range(0, 10_000)
+    assert records["ts"].tolist() == [1000, 2000]
+    assert records["values"][0].tolist()[:2] == [20.0, 1.5]
+    assert np.isnan(records["values"][0][2]) and np.isnan(records["values"][1][0])
+    assert records["confidence"][0][0] == pytest.approx(0.9)
+    assert records["latency_ms"][0] == 12.5
+    assert bytes(records["image_hash"][0]).hex() == HASH
+    assert new_log(tmp_path).latest() == {"ts": 2000, "temperature": None, "pressure": 1.5, "rain": None}
+
+
+def test_empty_log(tmp_path):
+    log = new_log(tmp_path)
+    assert log.latest() is None
+    assert len(log.fetch_range(0, 10)) == 0
+
+
+def test_rotates_full_segments_and_ranges_use_the_index(tmp_path):
+    log = reopen(tmp_path)
+    log.append([reading(ts) for ts in range(0, 250_000, 1000)])
+    log.close()
+
+    assert len(log.segments()) == 3
+    ts = new_log(tmp_path).fetch_range(95_500, 205_000)["ts"]
+    assert ts.tolist() == list(range(96_000, 205_000, 1000))
+    assert len(new_log(tmp_path).fetch_range(250_000, 300_000)) == 0
+
+
+def test_clock_step_back_starts_a_segment_and_ranges_stay_sorted(tmp_path):
+    log = reopen(tmp_path)
+    log.append([reading(5000), reading(6000), reading(3000), reading(4000)])
+    log.close()
+
+    assert len(log.segments()) == 2
+    assert new_log(tmp_path).fetch_range(0, 10_000)["ts"].tolist() == [3000, 4000, 5000, 6000]
+
+
+def test_reopen_drops_a_torn_record_and_keeps_appending(tmp_path):
+    log = reopen(tmp_path)
+    log.append([reading(1000), reading(2000)])
+    log.close()
+    path = log.segments()[-1]
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    log = reopen(tmp_path)
+    log.append([reading(3000)])
+    log.close()
+    assert log.segments() == [path]
+    assert new_log(tmp_path).fetch_range(0, 10_000)["ts"].tolist() == [1000, 2000, 3000]
+
+
+@pytest.mark.parametrize("header", [b"", b"GAUGE"])
+def test_reopen_after_a_torn_header_starts_a_new_segment(tmp_path, header):
+    log = reopen(tmp_path)
+    log.append([reading(1000)])
+    log.close()
+    # A crash while rotating leaves the next segment with a short header
+    torn = os.path.join(log.directory, "00000002-2000.log")
+    with open(torn, "wb") as f:
+        f.write(header)
+
+    log = reopen(tmp_path)
+    log.append([reading(3000)])
+    log.close()
+    assert len(log.segments()) == 3
+    assert new_log(tmp_path).fetch_range(0, 10_000)["ts"].tolist() == [1000, 3000]
+    assert new_log(tmp_path).latest()["ts"] == 3000
+
+
+def test_reopen_with_another_layout_starts_a_new_segment(tmp_path):
+    log = reopen(tmp_path, gauges=("temperature",))
+    log.append([reading(1000)])
+    log.close()
+
+    log = reopen(tmp_path)
+    log.append([reading(2000)])
+    log.close()
+    assert len(log.segments()) == 2
+    assert log.latest()["ts"] == 2000
+
+
+def test_drop_before_keeps_the_active_segment(tmp_path):
+    log = reopen(tmp_path)
+    log.append([reading(ts) for ts in range(0, 250_000, 1000)])
+    assert log.drop_before(150_000) == 1
+    assert log.drop_before(10**9) == 1
+    assert len(log.segments()) == 1
+    log.close()
+
+
+def test_log_set_splits_streams(tmp_path):
+    logs = segment_log.SegmentLogSet(str(tmp_path), gauges=GAUGES)
+    logs.append([reading(1000, stream="a"), reading(2000), reading(3000, stream="a")])
+    logs.close()
+    assert segment_log.SegmentLog(str(tmp_path), "a", gauges=GAUGES).fetch_range(0, 10_000)["ts"].tolist() == [1000, 3000]
+    default = segment_log.SegmentLog(str(tmp_path), gauges=GAUGES)
+    assert default.latest()["ts"] == 2000
+
+
+def test_writer_survives_a_torn_header(tmp_path):
+    directory = tmp_path / "camera-0"
+    directory.mkdir()
+    (directory / "00000001-1000.log").write_bytes(b"")
+
+    writer = segment_log.SegmentLogWriter(str(tmp_path), fsync_interval=0)
+    writer.start()
+    try:
+        assert writer.submit(reading(2000))
+        assert writer.flush(timeout=5)
+        assert writer.submit(reading(3000))
+        assert writer.flush(timeout=5)
+    finally:
+        writer.stop()
+    assert writer.thread is None
+    log = segment_log.SegmentLog(str(tmp_path))
+    assert log.fetch_range(0, 10_000)["ts"].tolist() == [2000, 3000]
+
+
+def test_image_hashes_and_drop_before_report_frames(tmp_path):
+    other = "cd" * 32
+    log = reopen(tmp_path)
+    log.append([reading(ts, image_hash=HASH) for ts in range(0, 100_000, 1000)])
+    log.append([reading(100_000, image_hash=other), reading(101_000)])
+    assert log.image_hashes() == {HASH, other}
+
+    dropped = set()
+    assert log.drop_before(150_000, dropped) == 1
+    assert dropped == {HASH}
+    assert log.image_hashes() == {other}
+    log.close()
+
+
+def test_writer_retention_releases_frames_of_dropped_segments(tmp_path):
+    import frame_store
+    import sensor_db
+
+    frames = frame_store.FrameStore(str(tmp_path / "frames"))
+    old, kept, shared = (frames.put(data) for data in (b"old", b"kept", b"shared"))
+    for digest in (old, kept, shared):
+        os.utime(frames.path_for(digest), (0, 0))
+
+    root = tmp_path / "log"
+    log = reopen(root, gauges=sensor_db.GAUGE_COLUMNS, segment_records=2)
+    now = sensor_db.now_ms()
+    log.append([reading(1000, image_hash=old), reading(2000, image_hash=shared),
+                reading(now, image_hash=kept), reading(now + 1, image_hash=shared)])
+    log.close()
+
+    retention = sensor_db.RetentionPolicy(raw_days=1, check_interval=60, frame_store=frames)
+    writer = segment_log.SegmentLogWriter(str(root), retention=retention)
+    writer.start()
+    try:
+        # The first retention step runs as soon as the writer is idle
+        deadline = time.monotonic() + 5
+        while old in frames and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        writer.stop()
+    assert old not in frames
+    assert kept in frames and shared in frames
+
+
+def test_writer_survives_a_reading_it_cannot_encode(tmp_path):
+    writer = segment_log.SegmentLogWriter(str(tmp_path), fsync_interval=0)
+    writer.start()
+    try:
+        assert writer.submit(reading(1000, image_hash="not hex"))
+        assert writer.flush(timeout=5)
+        assert writer.is_alive()
+        assert writer.submit(reading(2000))
+        assert writer.flush(timeout=5)
+    finally:
+        writer.stop()
+    assert segment_log.SegmentLog(str(tmp_path)).fetch_range(0, 10_000)["ts"].tolist() == [2000]
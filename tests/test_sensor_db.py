@@ -0,0 +1,179 @@
+import sqlite3
+import time
+
+import pytest
+
+import sensor_db
+
+# Wide table as shipped in sensors.db, where rain is stored as `length`
+LEGACY_SCHEMA = """
+CREATE TABLE sensor_data (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    pressure REAL,
+    temperature REAL,
+    length REAL
+)
+"""
+
+
+@pytest.fixture
+def legacy_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute(LEGACY_SCHEMA)
+    conn.executemany("INSERT INTO sensor_data (timestamp, pressure, temperature, length) VALUES (?, ?, ?, ?)",
+                     [("2025-09-14 08:48:05", 1.5, 21.0, 3.0), ("2025-09-14 08:49:05", 1.6, 22.0, 4.0)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def index_columns(conn, table="sensor_data"):
+    return [row[2] for row in conn.execute(f"PRAGMA index_info(idx_{table}_ts)")]
+
+
+def test_stored_gauge_columns_resolves_aliases():
+    assert sensor_db.stored_gauge_columns(["id", "pressure", "temperature", "length", "latency_ms"]) == [
+        ("temperature", "temperature"), ("pressure", "pressure"), ("rain", "length")]
+    assert sensor_db.stored_gauge_columns(["rain", "length"]) == [("rain", "rain")]
+    assert sensor_db.stored_gauge_columns(["id"]) == []
+
+
+def test_migrate_timestamps_backfills_ts(legacy_conn):
+    assert sensor_db.migrate_timestamps(legacy_conn, batch_size=1) == 2
+    assert sensor_db.migrate_timestamps(legacy_conn) == 0
+    ts = [row[0] for row in legacy_conn.execute("SELECT ts FROM sensor_data ORDER BY id")]
+    assert None not in ts and ts[1] - ts[0] == 60_000
+
+
+def test_fresh_and_migrated_tables_get_the_same_gauge_index(legacy_conn):
+    sensor_db.migrate_timestamps(legacy_conn)
+    assert index_columns(legacy_conn) == ["ts", "temperature", "pressure", "length"]
+
+    fresh = sqlite3.connect(":memory:")
+    fresh.executescript(sensor_db.SCHEMA)
+    sensor_db.migrate_timestamps(fresh)
+    # latency_ms is REAL too, but it is not a gauge
+    assert index_columns(fresh) == ["ts", "temperature", "pressure", "rain"]
+
+
+def test_migrate_timestamps_rebuilds_an_index_with_other_columns(legacy_conn):
+    sensor_db.migrate_timestamps(legacy_conn)
+    legacy_conn.execute("DROP INDEX idx_sensor_data_ts")
+    legacy_conn.execute("CREATE INDEX idx_sensor_data_ts ON sensor_data (ts)")
+    sensor_db.migrate_timestamps(legacy_conn)
+    assert index_columns(legacy_conn) == ["ts", "temperature", "pressure", "length"]
+
+
+def test_backfill_rollups_uses_the_registry_column_for_aliases(legacy_conn):
+    sensor_db.migrate_timestamps(legacy_conn)
+    legacy_conn.executescript(sensor_db.ROLLUP_SCHEMA)
+    assert sensor_db.backfill_rollups(legacy_conn) == 2
+    assert sensor_db.backfill_rollups(legacy_conn) == 0
+
+    gauges = {row[0] for row in legacy_conn.execute("SELECT DISTINCT gauge FROM sensor_rollup")}
+    assert gauges == {"temperature", "pressure", "rain"}
+    count, total, low, high, last = legacy_conn.execute(
+        "SELECT count, sum, min, max, last FROM sensor_rollup WHERE resolution = 'day' AND gauge = 'rain'").fetchone()
+    assert (count, total, low, high, last) == (2, 7.0, 3.0, 4.0, 4.0)
+
+
+def test_backfill_rollups_matches_live_rollups():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(sensor_db.SCHEMA + ";" + sensor_db.ROLLUP_SCHEMA)
+    rows = [{"ts": 60_000 * i, "temperature": 20.0 + i, "pressure": None, "rain": 1.0} for i in range(5)]
+    conn.executemany("INSERT INTO sensor_data (ts, temperature, pressure, rain) "
+                     "VALUES (:ts, :temperature, :pressure, :rain)", rows)
+    sensor_db.backfill_rollups(conn)
+    backfilled = set(conn.execute("SELECT * FROM sensor_rollup"))
+
+    conn.execute("DELETE FROM sensor_rollup")
+    sensor_db.apply_rollups(conn, sensor_db.accumulate_rollups(rows))
+    assert set(conn.execute("SELECT * FROM sensor_rollup")) == backfilled
+
+
+def writer_reading(ts):
+    return {"timestamp": "2025-09-14 08:48:05", "ts": ts, "temperature": 21.0, "pressure": 1.5, "rain": None}
+
+
+def test_writer_survives_a_failing_retention_step(tmp_path):
+    archived = []
+
+    def archive(rows):
+        archived.append(len(rows))
+        raise OSError("archive volume is read-only")
+
+    path = str(tmp_path / "sensors.db")
+    retention = sensor_db.RetentionPolicy(raw_days=1, check_interval=0.01, archive=archive)
+    writer = sensor_db.SensorDBWriter(path, flush_interval=0.01, retention=retention)
+    writer.start()
+    try:
+        assert writer.submit(writer_reading(1000))
+        assert writer.flush(timeout=5)
+        deadline = time.monotonic() + 5
+        while not archived and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert archived
+        assert writer.is_alive()
+        assert writer.submit(writer_reading(sensor_db.now_ms()))
+        assert writer.flush(timeout=5)
+    finally:
+        writer.stop()
+
+    conn = sqlite3.connect(path)
+    try:
+        # The failed step rolled back, so the old row is kept for the next one
+        assert conn.execute("SELECT COUNT(*) FROM sensor_data").fetchone()[0] == 2
+    finally:
+        conn.close()
+
+
+def test_stopped_writer_rejects_readings(tmp_path):
+    writer = sensor_db.SensorDBWriter(str(tmp_path / "sensors.db"))
+    assert not writer.submit(writer_reading(1000))
+    writer.start()
+    writer.stop()
+    assert not writer.is_alive()
+    assert not writer.submit(writer_reading(1000))
+    assert writer.flush(timeout=1) is False
+
+
+def test_ensure_schema_prepares_an_untouched_database(tmp_path):
+    path = str(tmp_path / "sensors.db")
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA)
+    conn.execute("INSERT INTO sensor_data (timestamp, pressure, temperature, length) "
+                 "VALUES ('2025-09-14 08:48:05', 1.5, 21.0, 3.0)")
+    conn.commit()
+    conn.close()
+
+    conn = sensor_db.connect(path, check_auto_vacuum=False)
+    try:
+        sensor_db.ensure_schema(conn)
+        sensor_db.ensure_schema(conn)
+        points = list(sensor_db.iter_series(conn, "rain_gauge", 0, 2**62, bucket="raw"))
+        assert [point["value"] for point in points] == [3.0]
+        buckets = list(sensor_db.iter_series(conn, "rain_gauge", 0, 2**62, bucket="day"))
+        assert [bucket["count"] for bucket in buckets] == [1]
+        # Readings and rollups were backfilled exactly once
+        assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 3
+    finally:
+        conn.close()
+
+
+def test_fetch_latest_works_before_and_after_migration(legacy_conn):
+    columns = ("temperature", "pressure", "length")
+    assert sensor_db.order_column(legacy_conn) == "timestamp"
+    assert sensor_db.fetch_latest(legacy_conn, columns) == {"temperature": 22.0, "pressure": 1.6, "length": 4.0}
+    sensor_db.migrate_timestamps(legacy_conn)
+    assert sensor_db.order_column(legacy_conn) == "ts"
+    assert sensor_db.fetch_latest(legacy_conn, columns) == {"temperature": 22.0, "pressure": 1.6, "length": 4.0}
+
+
+def test_reading_keeps_the_unrounded_vlm_latency():
+    result = {"success": True, "gauge_readings": {"temperature": 21.5}, "processing_time": 0.0, "latency_ms": 3.25}
+    assert sensor_db.reading_from_vlm_result(result, 1000)["latency_ms"] == 3.25
+    # Results from before latency_ms fall back to the rounded seconds
+    del result["latency_ms"]
+    result["processing_time"] = 1.25
+    assert sensor_db.reading_from_vlm_result(result, 1000)["latency_ms"] == 1250.0
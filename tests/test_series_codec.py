@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import series_codec
+
+
+@pytest.mark.parametrize("values", [
+    [],
+    [42],
+    [5, -7],
+    [1_700_000_000_000, 1_700_000_010_003, 1_700_000_019_998, 1_700_000_030_001],
+    np.arange(1000, dtype=np.int64) * 10_000,
+    [np.iinfo(np.int64).min // 4, 0, np.iinfo(np.int64).max // 4],
+])
+def test_ints_round_trip(values):
+    values = np.asarray(values, dtype=np.int64)
+    blob = series_codec.encode_ints(values)
+    decoded, offset = series_codec.decode_ints(blob, 0, len(values))
+    assert decoded.tolist() == values.tolist()
+    assert offset == len(blob)
+
+
+@pytest.mark.parametrize("kind,dtype", [(series_codec.KIND_FLOAT32, np.float32),
+                                        (series_codec.KIND_FLOAT64, np.float64)])
+def test_floats_round_trip_with_specials(kind, dtype):
+    values = np.array([0.0, -0.0, 21.5, 21.5, np.nan, np.inf, -np.inf, 1e-30, 3.14159], dtype=dtype)
+    blob = series_codec.encode_floats(values, kind)
+    decoded, offset = series_codec.decode_floats(blob, 0, len(values), kind)
+    assert decoded.dtype == dtype
+    # Compare bit patterns so -0.0 and NaN must survive exactly
+    assert decoded.tobytes() == values.tobytes()
+    assert offset == len(blob)
+
+
+def test_block_boundaries_round_trip():
+    rng = np.random.default_rng(1)
+    for n in (series_codec.BLOCK - 1, series_codec.BLOCK, series_codec.BLOCK + 1, 3 * series_codec.BLOCK + 5):
+        ints = rng.integers(-10**12, 10**12, n)
+        floats = rng.normal(size=n).astype(np.float32)
+        table = series_codec.decode_table(series_codec.encode_table({"i": ints, "f": floats}))
+        assert np.array_equal(table["i"], ints)
+        assert np.array_equal(table["f"], floats)
+
+
+def test_table_round_trip_and_column_selection():
+    table = {
+        "ts": np.array([1000, 2000, 3000], dtype=np.int64),
+        "temperature": np.array([20.5, np.nan, 21.0], dtype=np.float32),
+        "pressure": np.array([1.2, 1.2, 1.3], dtype=np.float64),
+    }
+    blob = series_codec.encode_table(table)
+    decoded = series_codec.decode_table(blob)
+    assert list(decoded) == ["ts", "temperature", "pressure"]
+    for name, values in table.items():
+        assert decoded[name].dtype == values.dtype
+        assert np.array_equal(decoded[name], values, equal_nan=True)
+    assert list(series_codec.decode_table(blob, columns=["pressure"])) == ["pressure"]
+
+
+def test_empty_table():
+    assert series_codec.decode_table(series_codec.encode_table({})) == {}
+    decoded = series_codec.decode_table(series_codec.encode_table({"ts": np.zeros(0, dtype=np.int64)}))
+    assert len(decoded["ts"]) == 0
+
+
+def test_slowly_changing_series_compress():
+    n = 10_000
+    ts = 1_700_000_000_000 + np.arange(n, dtype=np.int64) * 10_000
+    values = np.repeat(np.float32(21.5), n)
+    blob = series_codec.encode_table({"ts": ts, "value": values})
+    assert len(blob) < (ts.nbytes + values.nbytes) / 20
+
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        series_codec.encode_table({"a": np.zeros(3), "b": np.zeros(2)})
+    with pytest.raises(ValueError):
+        series_codec.decode_table(b"NOPE" + bytes(16))
@@ -0,0 +1,104 @@
+import threading
+import time
+
+import pytest
+
+import response_cache
+import tool_executor
+
+
+def test_parse_single_and_multiple_calls():
+    assert tool_executor.parse_tool_calls('control_fan(state="on")') == [("control_fan", {"state": "on"})]
+    assert tool_executor.parse_tool_calls(' [control_fan(state="on"), get_sensor_data()] ') == [
+        ("control_fan", {"state": "on"}), ("get_sensor_data", {})]
+    assert tool_executor.parse_tool_calls("[set(values=[1, 2.5], flag=True, extra=None)]") == [
+        ("set", {"values": [1, 2.5], "flag": True, "extra": None})]
+    assert tool_executor.parse_tool_calls("[]") == []
+
+
+@pytest.mark.parametrize("block", [
+    "control_fan(state=",
+    '[control_fan(state="on")',
+    "control_fan",
+    '"on"',
+    'tools.control_fan(state="on")',
+    'control_fan("on")',
+    "control_fan(**options)",
+    "control_fan(state=__import__('os').system('true'))",
+    "control_fan(state=value)",
+])
+def test_parse_rejects_anything_but_literal_keyword_calls(block):
+    with pytest.raises(ValueError):
+        tool_executor.parse_tool_calls(block)
+
+
+@pytest.fixture
+def executor():
+    calls = []
+    lock = threading.Lock()
+
+    def record(name, delay=0.0):
+        def tool(**args):
+            time.sleep(delay)
+            with lock:
+                calls.append((name, args))
+            return f"{name} {args}"
+        return tool
+
+    def broken():
+        raise RuntimeError("sensor offline")
+
+    executor = tool_executor.ToolExecutor({
+        "fan": record("fan", delay=0.05),
+        "drain": record("drain"),
+        "slow": record("slow", delay=0.5),
+        "broken": broken,
+    }, timeout=0.2)
+    executor.calls = calls
+    yield executor
+    executor.pool.shutdown(wait=True)
+
+
+def test_results_keep_call_order(executor):
+    results = executor.run([("fan", {"state": "on"}), ("drain", {"state": "open"}), ("fan", {"state": "off"})])
+    assert results == ["fan {'state': 'on'}", "drain {'state': 'open'}", "fan {'state': 'off'}"]
+    # Calls to the same tool keep their order
+    assert [args for name, args in executor.calls if name == "fan"] == [{"state": "on"}, {"state": "off"}]
+
+
+def test_errors_are_reported_as_results(executor):
+    results = executor.run([("missing", {}), ("broken", {}), ("fan", {"bogus": 1})])
+    assert results[0] == "Error: Unsupported tool call."
+    assert results[1] == "Error executing tool call: sensor offline"
+    assert results[2] == "fan {'bogus': 1}"
+
+
+def test_timeouts_do_not_hold_up_other_tools(executor):
+    start = time.monotonic()
+    results = executor.run([("slow", {}), ("drain", {})])
+    assert time.monotonic() - start < 0.45
+    assert results[0] == "Error: slow timed out after 0.2s."
+    assert results[1] == "drain {}"
+
+
+def test_cacheable_results_are_reused_until_the_version_changes():
+    version = [1]
+    count = [0]
+
+    def read_sensors(gauge="all"):
+        count[0] += 1
+        return f"{gauge} #{count[0]}"
+
+    cache = response_cache.VersionedCache("test_tools", lambda: version[0])
+    executor = tool_executor.ToolExecutor({"read_sensors": read_sensors, "fan": lambda: "ok"},
+                                          result_cache=cache, cacheable={"read_sensors"})
+    try:
+        assert executor.run([("read_sensors", {}), ("read_sensors", {})]) == ["all #1", "all #1"]
+        assert executor.run([("read_sensors", {"gauge": "rain"})]) == ["rain #2"]
+        version[0] = 2
+        assert executor.run([("read_sensors", {})]) == ["all #3"]
+        # Actuators are never cached
+        executor.run([("fan", {})])
+        assert len(cache) == 2
+    finally:
+        executor.pool.shutdown(wait=True)
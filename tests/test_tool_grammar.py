@@ -0,0 +1,114 @@
+import random
+import string
+
+import pytest
+
+import metrics
+import tool_executor
+import tool_grammar
+
+TOOLS = [
+    {"name": "control_fan", "parameters": {"type": "object", "properties": {
+        "state": {"type": "string", "enum": ["on", "off"]}}, "required": ["state"]}},
+    {"name": "control_drain", "parameters": {"type": "object", "properties": {
+        "state": {"type": "string", "enum": ["open", "closed"]},
+        "force": {"type": "boolean"}}, "required": ["state"]}},
+]
+
+
+class FakeTokenizer:
+    """Single characters plus a few merged tokens, like a BPE vocabulary"""
+
+    special = ["<|endoftext|>", tool_grammar.TOOL_CALL_START, tool_grammar.TOOL_CALL_END]
+
+    def __init__(self):
+        merged = ["control_", "fan", "drain", "(state=", '"on"', '"off"', '"open"', '"closed"', ", ",
+                  "force=", "True", "False", ")]", "Hello"]
+        self.vocab = self.special + list(string.printable[:95]) + merged
+        self.all_special_ids = [0]
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def convert_tokens_to_ids(self, token):
+        return self.vocab.index(token)
+
+    def batch_decode(self, batch):
+        return ["" if ids[0] < len(self.special) else self.vocab[ids[0]] for ids in batch]
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return FakeTokenizer()
+
+
+@pytest.fixture(scope="module")
+def grammar(tokenizer):
+    return tool_grammar.ToolCallGrammar(TOOLS, tokenizer)
+
+
+def test_enumerate_calls():
+    calls = tool_grammar.enumerate_calls(TOOLS)
+    assert 'control_fan(state="on")' in calls
+    assert 'control_drain(state="closed")' in calls
+    assert 'control_drain(state="open", force=True)' in calls
+    assert len(calls) == 2 + 2 * 3
+
+
+def test_enumerate_calls_rejects_free_form_parameters():
+    with pytest.raises(ValueError):
+        tool_grammar.enumerate_calls([{"name": "say", "parameters": {"properties": {"text": {"type": "string"}}}}])
+
+
+def test_constraint_is_inactive_outside_tool_calls(grammar, tokenizer):
+    constraint = grammar.new_state()
+    assert constraint.allowed_tokens() is None
+    constraint.advance(tokenizer.convert_tokens_to_ids("Hello"))
+    assert constraint.allowed_tokens() is None
+    constraint.advance(grammar.start_id)
+    assert [tokenizer.vocab[i] for i in constraint.allowed_tokens()] == ["["]
+
+
+def test_random_walks_only_produce_schema_valid_calls(grammar, tokenizer):
+    rng = random.Random(0)
+    valid = set(tool_grammar.enumerate_calls(TOOLS))
+    for _ in range(200):
+        constraint = grammar.new_state()
+        constraint.advance(grammar.start_id)
+        text = ""
+        while True:
+            token = rng.choice(constraint.allowed_tokens())
+            constraint.advance(token)
+            if token == grammar.end_id:
+                break
+            text += tokenizer.vocab[token]
+        assert constraint.allowed_tokens() is None
+        calls = tool_executor.parse_tool_calls(text)
+        for name, args in calls:
+            rendered = ", ".join(f"{key}={value!r}".replace("'", '"') for key, value in args.items())
+            assert f"{name}({rendered})" in valid
+
+
+def test_merged_tokens_are_allowed_when_they_fit(grammar, tokenizer):
+    constraint = grammar.new_state()
+    constraint.advance(grammar.start_id)
+    constraint.advance(tokenizer.convert_tokens_to_ids("["))
+    allowed = {tokenizer.vocab[i] for i in constraint.allowed_tokens()}
+    assert {"c", "control_"} <= allowed
+    assert "fan" not in allowed and "Hello" not in allowed
+
+
+def test_leaving_the_grammar_forces_the_end_token(grammar, tokenizer):
+    failures = metrics.PARSE_FAILURES_TOTAL.labels("tool_grammar")
+    before = failures.value
+    constraint = grammar.new_state()
+    constraint.advance(grammar.start_id)
+    constraint.advance(tokenizer.convert_tokens_to_ids("Hello"))
+    # The constraint stays active and only lets the block be closed
+    assert constraint.allowed_tokens() == [grammar.end_id]
+    constraint.advance(tokenizer.convert_tokens_to_ids("x"))
+    assert constraint.allowed_tokens() == [grammar.end_id]
+    assert failures.value == before + 1
+
+    constraint.advance(grammar.end_id)
+    assert constraint.allowed_tokens() is None
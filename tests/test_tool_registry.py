@@ -0,0 +1,123 @@
+import json
+from typing import Literal, Optional
+
+import pytest
+
+import tool_registry
+
+
+def control_drain(state: Literal["open", "closed"], force: bool = False, note: Optional[str] = None):
+    """
+    Open or close the drain valve.
+
+    Only affects the main basin.
+
+    Args:
+        state (str): Target valve state
+        force (bool): Skip the safety check, even when the
+            basin is empty
+        note: Free text for the log
+
+    Returns:
+        str: Confirmation
+    """
+
+
+def test_parse_docstring():
+    description, arguments = tool_registry.parse_docstring(control_drain.__doc__)
+    assert description == "Open or close the drain valve."
+    assert arguments == {
+        "state": "Target valve state",
+        "force": "Skip the safety check, even when the basin is empty",
+        "note": "Free text for the log",
+    }
+    assert tool_registry.parse_docstring(None) == ("", {})
+
+
+def test_parameter_schema():
+    assert tool_registry.parameter_schema(Literal["on", "off"]) == {"type": "string", "enum": ["on", "off"]}
+    assert tool_registry.parameter_schema(Literal[1, 2]) == {"type": "integer", "enum": [1, 2]}
+    assert tool_registry.parameter_schema(Optional[int]) == {"type": "integer"}
+    assert tool_registry.parameter_schema(list[str]) == {"type": "array"}
+    assert tool_registry.parameter_schema(bytes) == {"type": "string"}
+
+
+def test_function_schema():
+    schema = tool_registry.function_schema(control_drain)
+    assert schema["name"] == "control_drain"
+    assert schema["description"] == "Open or close the drain valve."
+    assert schema["parameters"]["required"] == ["state"]
+    properties = schema["parameters"]["properties"]
+    assert properties["state"] == {"type": "string", "enum": ["open", "closed"], "description": "Target valve state"}
+    assert properties["force"]["type"] == "boolean"
+    assert properties["note"]["type"] == "string"
+
+    def no_arguments(*args, **kwargs):
+        """Read the gauges"""
+    schema = tool_registry.function_schema(no_arguments, name="read", description="Read every gauge")
+    assert schema == {"name": "read", "description": "Read every gauge",
+                      "parameters": {"type": "object", "properties": {}}}
+
+
+class FakeTokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def apply_chat_template(self, messages, add_generation_prompt, tokenize):
+        self.calls += 1
+        return [ord(char) for char in messages[0]["content"]]
+
+
+@pytest.fixture
+def registry():
+    registry = tool_registry.ToolRegistry(system_template="tools={tools}")
+
+    @registry.tool(cacheable=True)
+    def get_sensor_data():
+        """Latest gauge readings"""
+        return "{}"
+
+    registry.tool(control_drain)
+    return registry
+
+
+def test_registration_and_subsets(registry):
+    assert list(registry.functions) == ["get_sensor_data", "control_drain"]
+    assert registry.cacheable == {"get_sensor_data"}
+    assert registry.key() == ("get_sensor_data", "control_drain")
+    assert registry.key({"control_drain", "get_sensor_data"}) == ("get_sensor_data", "control_drain")
+    with pytest.raises(KeyError):
+        registry.key(["control_fan"])
+    assert [schema["name"] for schema in registry.schemas(["control_drain"])] == ["control_drain"]
+
+
+def test_system_message_lists_the_enabled_tools(registry):
+    message = registry.system_message(["get_sensor_data"])
+    assert message.startswith("tools=")
+    assert [tool["name"] for tool in json.loads(message[len("tools="):])] == ["get_sensor_data"]
+    assert registry.system_message(["get_sensor_data"]) is message
+
+
+def test_prompt_ids_are_tokenized_once_per_subset(registry):
+    tokenizer = FakeTokenizer()
+    ids = registry.prompt_ids(tokenizer)
+    assert registry.prompt_ids(tokenizer) is ids
+    registry.prompt_ids(tokenizer, ["control_drain"])
+    assert tokenizer.calls == 2
+
+
+def test_re_registering_a_tool_invalidates_cached_prompts(registry):
+    tokenizer = FakeTokenizer()
+    before = registry.system_message()
+    registry.prompt_ids(tokenizer)
+
+    @registry.tool(name="get_sensor_data", description="Latest readings of every gauge")
+    def replacement():
+        return "{}"
+
+    assert "Latest readings of every gauge" in registry.system_message()
+    assert registry.system_message() != before
+    registry.prompt_ids(tokenizer)
+    assert tokenizer.calls == 2
+    # Replacing a read-only tool with an unmarked one makes it uncacheable
+    assert registry.cacheable == set()
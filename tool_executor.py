@@ -0,0 +1,151 @@
+"""
+Tool Executor Module for LLM Tool Calls
+Parses the Python-style call list inside an LFM2 tool-call block with the
+`ast` module and runs the calls on a thread pool, each with a timeout.
+
+Calls to different tools run concurrently; calls to the same tool keep
+their order (turning the fan on and then off must not be reordered).
+Results always come back in the order the model wrote the calls.
+Read-only tools can share results through a versioned cache.
+"""
+
+import ast
+import concurrent.futures
+import json
+import logging
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10.0
+
+
+def parse_tool_calls(block):
+    """
+    Parse `[name(arg=value, ...), ...]` (brackets optional for one call)
+
+    Argument values must be Python literals; positional arguments are
+    rejected since the tool schemas only name keyword parameters.
+
+    Args:
+        block (str): Text between the tool-call start and end tokens
+
+    Returns:
+        list: (function name, arguments dict) per call, in order
+
+    Raises:
+        ValueError: If the text is not a list of such calls
+    """
+    try:
+        tree = ast.parse(block.strip(), mode="eval").body
+    except SyntaxError as e:
+        raise ValueError(f"Invalid tool call syntax: {e.msg}") from None
+
+    nodes = tree.elts if isinstance(tree, (ast.List, ast.Tuple)) else [tree]
+    calls = []
+    for node in nodes:
+        if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+            raise ValueError(f"Not a function call: {ast.unparse(node)}")
+        if node.args:
+            raise ValueError(f"{node.func.id} takes keyword arguments only")
+        args = {}
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise ValueError(f"{node.func.id} cannot take **kwargs")
+            try:
+                args[keyword.arg] = ast.literal_eval(keyword.value)
+            except ValueError:
+                raise ValueError(f"{node.func.id}.{keyword.arg} is not a literal") from None
+        calls.append((node.func.id, args))
+    return calls
+
+
+class ToolExecutor:
+    """Runs parsed tool calls on a shared thread pool"""
+
+    def __init__(self, functions, max_workers=4, timeout=DEFAULT_TIMEOUT, result_cache=None, cacheable=()):
+        """
+        Args:
+            functions (dict): Tool name -> callable returning the tool's response
+            max_workers (int): Threads running tools at the same time
+            timeout (float): Seconds each call may take; a call that overruns
+                is reported as timed out (its thread cannot be interrupted and
+                finishes in the background)
+            result_cache (response_cache.VersionedCache): Cache for the
+                results of `cacheable` tools
+            cacheable (set): Names of read-only tools whose results may be reused
+        """
+        self.functions = functions
+        self.timeout = timeout
+        self.result_cache = result_cache
+        self.cacheable = cacheable
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def _call(self, func_name, args):
+        function = self.functions.get(func_name)
+        if function is None:
+            return "Error: Unsupported tool call."
+
+        cache = self.result_cache if func_name in self.cacheable else None
+        if cache is not None:
+            key = (func_name, json.dumps(args, sort_keys=True))
+            version = cache.version()
+            result = cache.get(key, version)
+            if result is not None:
+                return result
+        try:
+            with metrics.timed(f"tool_{func_name}"):
+                result = function(**args)
+        except Exception as e:
+            logger.exception(f"Tool {func_name} failed")
+            return f"Error executing tool call: {e}"
+        if cache is not None:
+            cache.put(key, version, result)
+        return result
+
+    def _run_sequence(self, calls, futures):
+        """Run one tool's calls in order, resolving each call's future"""
+        for (func_name, args), future in zip(calls, futures):
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._call(func_name, args))
+
+    def iter_results(self, calls):
+        """
+        Start every call and yield their responses in call order
+
+        Each call gets `timeout` seconds counted from when the calls before it
+        on the same tool were due, so a slow tool cannot eat into the budget
+        of another.
+
+        Args:
+            calls (list): (function name, arguments dict) pairs
+
+        Yields:
+            str: The response of each call (an error message on failure or timeout)
+        """
+        futures = [concurrent.futures.Future() for _ in calls]
+        by_tool = {}
+        for index, (func_name, _) in enumerate(calls):
+            by_tool.setdefault(func_name, []).append(index)
+
+        start = time.monotonic()
+        deadlines = [0.0] * len(calls)
+        for indices in by_tool.values():
+            for position, index in enumerate(indices):
+                deadlines[index] = start + self.timeout * (position + 1)
+            self.pool.submit(self._run_sequence, [calls[index] for index in indices],
+                             [futures[index] for index in indices])
+
+        for (func_name, _), future, deadline in zip(calls, futures, deadlines):
+            try:
+                yield future.result(timeout=max(deadline - time.monotonic(), 0))
+            except concurrent.futures.TimeoutError:
+                future.cancel()  # skipped if it has not started yet
+                logger.warning(f"Tool {func_name} timed out after {self.timeout}s")
+                yield f"Error: {func_name} timed out after {self.timeout:g}s."
+
+    def run(self, calls):
+        """Responses of every call, in call order (see iter_results)"""
+        return list(self.iter_results(calls))
@@ -0,0 +1,176 @@
+"""
+Tool Grammar Module for Constrained Tool Calls
+Builds a token-level constraint from tool JSON schemas so the model can
+only emit well-formed LFM2 tool-call blocks:
+
+    <|tool_call_start|>[name(arg="value"), ...]<|tool_call_end|>
+
+Every call allowed by the schemas (enum and boolean arguments) is
+enumerated; a small character automaton over `[call(, call)*]` decides
+which vocabulary tokens may come next, memoized per automaton state so a
+decode step costs one dict lookup.
+"""
+
+import itertools
+import json
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+TOOL_CALL_START = "<|tool_call_start|>"
+TOOL_CALL_END = "<|tool_call_end|>"
+MAX_TOKEN_CHARS = 24
+
+
+def _argument_values(schema):
+    """Literal renderings of every value a parameter schema allows, or None"""
+    if "enum" in schema:
+        return [json.dumps(value) for value in schema["enum"]]
+    if schema.get("type") == "boolean":
+        return ["True", "False"]
+    return None
+
+
+def enumerate_calls(tools):
+    """
+    Every call string the schemas allow, e.g. 'control_fan(state="on")'
+
+    Optional parameters may be left out. Tools with a free-form parameter
+    (no enum) cannot be enumerated and make this raise ValueError.
+    """
+    calls = []
+    for tool in tools:
+        parameters = tool.get("parameters", {})
+        properties = parameters.get("properties", {})
+        required = set(parameters.get("required", []))
+        choices = []
+        for name, schema in properties.items():
+            values = _argument_values(schema)
+            if values is None:
+                raise ValueError(f"{tool['name']}.{name} has no enum, cannot constrain it")
+            options = [f"{name}={value}" for value in values]
+            choices.append(options if name in required else options + [None])
+        for combination in itertools.product(*choices):
+            arguments = ", ".join(argument for argument in combination if argument is not None)
+            calls.append(f"{tool['name']}({arguments})")
+    return sorted(calls)
+
+
+class ToolCallGrammar:
+    """
+    Allowed-token sets for the text between TOOL_CALL_START and TOOL_CALL_END
+
+    Automaton states are (phase, text): "open" expects "[", "call" holds the
+    prefix of the call being typed, "sep" follows a comma, "space" follows
+    ", " and "done" follows "]" and only allows the end token. "failed" is
+    entered when a token left the grammar anyway and also only allows the
+    end token, so the broken block is closed and rejected by the parser.
+    """
+
+    def __init__(self, tools, tokenizer):
+        """
+        Args:
+            tools (list): Tool JSON schemas as listed in the system prompt
+            tokenizer: Tokenizer of the model being constrained
+        """
+        self.calls = enumerate_calls(tools)
+        self.start_id = tokenizer.convert_tokens_to_ids(TOOL_CALL_START)
+        self.end_id = tokenizer.convert_tokens_to_ids(TOOL_CALL_END)
+        special_ids = set(tokenizer.all_special_ids) | {self.start_id, self.end_id}
+
+        # Text of every regular token; special tokens never match grammar text
+        texts = tokenizer.batch_decode([[token_id] for token_id in range(len(tokenizer))])
+        self.token_text = {}
+        self.tokens_by_text = {}
+        for token_id, text in enumerate(texts):
+            if token_id in special_ids or not text:
+                continue
+            self.token_text[token_id] = text
+            if len(text) <= MAX_TOKEN_CHARS:
+                self.tokens_by_text.setdefault(text, []).append(token_id)
+        self._allowed = {}
+
+    def _next_chars(self, state):
+        phase, text = state
+        if phase == "open":
+            return {"[": ("call", "")}
+        if phase in ("call", "sep", "space"):
+            prefix = text if phase == "call" else ""
+            moves = {}
+            for call in self.calls:
+                if call.startswith(prefix) and len(call) > len(prefix):
+                    moves[call[len(prefix)]] = ("call", prefix + call[len(prefix)])
+            if phase == "call" and text in self.calls:
+                moves.update({",": ("sep", ""), "]": ("done", "")})
+            if phase == "sep":
+                moves[" "] = ("space", "")
+            return moves
+        return {}
+
+    def step(self, state, text):
+        """State after consuming `text`, or None if it leaves the grammar"""
+        for char in text:
+            state = self._next_chars(state).get(char)
+            if state is None:
+                return None
+        return state
+
+    def allowed_tokens(self, state):
+        """Token ids that keep the output inside the grammar from `state`"""
+        allowed = self._allowed.get(state)
+        if allowed is not None:
+            return allowed
+        allowed = set()
+        if state[0] in ("done", "failed"):
+            allowed.add(self.end_id)
+        # Walk every valid continuation up to the longest token
+        pending = [("", state)]
+        while pending:
+            text, current = pending.pop()
+            if text:
+                allowed.update(self.tokens_by_text.get(text, ()))
+            if len(text) < MAX_TOKEN_CHARS:
+                for char, following in self._next_chars(current).items():
+                    pending.append((text + char, following))
+        self._allowed[state] = allowed = sorted(allowed)
+        return allowed
+
+    def new_state(self):
+        """Per-sequence constraint, inactive until the model opens a tool call"""
+        return ToolCallConstraint(self)
+
+
+class ToolCallConstraint:
+    """Tracks one sequence; only masks logits inside a tool-call block"""
+
+    def __init__(self, grammar):
+        self.grammar = grammar
+        self.state = None  # None = free text outside a tool call
+
+    def allowed_tokens(self):
+        """Ids allowed next, or None when decoding is unconstrained"""
+        if self.state is None:
+            return None
+        return self.grammar.allowed_tokens(self.state)
+
+    def advance(self, token_id):
+        """
+        Move past a sampled token
+
+        A token outside the grammar (which masking should make impossible)
+        does not release the constraint: the block is forced to end and the
+        failure is counted, instead of decoding the rest unconstrained.
+        """
+        if token_id == self.grammar.start_id:
+            self.state = ("open", "")
+        elif token_id == self.grammar.end_id:
+            self.state = None
+        elif self.state is not None and self.state[0] != "failed":
+            following = self.grammar.step(self.state, self.grammar.token_text.get(token_id, ""))
+            if following is None:
+                logger.warning(f"Token {token_id} left the tool-call grammar, ending the tool call")
+                metrics.PARSE_FAILURES_TOTAL.labels("tool_grammar").inc()
+                following = ("failed", "")
+            self.state = following
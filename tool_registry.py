@@ -0,0 +1,209 @@
+"""
+Tool Registry Module for LLM Tool Use
+Tools are plain functions registered with a decorator; their JSON schemas
+are derived from the signature (types, `Literal` enums, defaults) and the
+Google-style docstring (description and `Args:` entries), and dispatch is a
+dict lookup.
+
+The rendered system prompt and its token ids are cached per subset of
+enabled tools, so requests never re-render or re-tokenize the tool list.
+"""
+
+import inspect
+import json
+import logging
+import re
+import threading
+import typing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_TEMPLATE = "List of tools: <|tool_list_start|>{tools}<|tool_list_end|>\nYou are a helpful assistant."
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+_SECTION = re.compile(r"^(Args|Arguments|Returns|Raises|Yields|Example|Examples|Note):\s*$")
+_ARG_LINE = re.compile(r"^(\w+)\s*(?:\([^)]*\))?\s*:\s*(.*)$")
+
+
+def parse_docstring(docstring):
+    """
+    Split a Google-style docstring into its description and argument docs
+
+    Returns:
+        tuple: (description, {argument name: description})
+    """
+    lines = inspect.cleandoc(docstring or "").splitlines()
+    description = []
+    arguments = {}
+    section = None
+    current = None
+    for line in lines:
+        stripped = line.strip()
+        header = _SECTION.match(stripped)
+        if header:
+            section = header.group(1)
+            continue
+        if section is None:
+            if not stripped and description:
+                section = "notes"  # the description is the first paragraph
+            elif stripped:
+                description.append(stripped)
+        elif section in ("Args", "Arguments") and stripped:
+            match = _ARG_LINE.match(stripped)
+            if match and not line.startswith(" " * 8):
+                current = match.group(1)
+                arguments[current] = match.group(2)
+            elif current is not None:
+                arguments[current] += " " + stripped
+    return " ".join(description), arguments
+
+
+def parameter_schema(annotation):
+    """JSON schema of one parameter from its type annotation"""
+    if typing.get_origin(annotation) is typing.Literal:
+        values = list(typing.get_args(annotation))
+        return {"type": _JSON_TYPES.get(type(values[0]), "string"), "enum": values}
+    if typing.get_origin(annotation) is typing.Union:
+        # Optional[X] documents X; the parameter is optional through its default
+        options = [option for option in typing.get_args(annotation) if option is not type(None)]
+        if len(options) == 1:
+            return parameter_schema(options[0])
+    origin = typing.get_origin(annotation) or annotation
+    return {"type": _JSON_TYPES.get(origin, "string")}
+
+
+def function_schema(function, name=None, description=None):
+    """
+    Tool schema in the format listed in the LFM2 system prompt
+
+    Args:
+        function (callable): Tool implementation
+        name (str): Tool name, defaults to the function name
+        description (str): Overrides the docstring's first paragraph
+
+    Returns:
+        dict: {"name", "description", "parameters"}
+    """
+    doc_description, argument_docs = parse_docstring(function.__doc__)
+    hints = typing.get_type_hints(function)
+    properties = {}
+    required = []
+    for parameter in inspect.signature(function).parameters.values():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        schema = parameter_schema(hints.get(parameter.name, str))
+        if parameter.name in argument_docs:
+            schema["description"] = argument_docs[parameter.name]
+        properties[parameter.name] = schema
+        if parameter.default is parameter.empty:
+            required.append(parameter.name)
+
+    parameters = {"type": "object", "properties": properties}
+    if required:
+        parameters["required"] = required
+    return {"name": name or function.__name__, "description": description or doc_description,
+            "parameters": parameters}
+
+
+class ToolRegistry:
+    """
+    Registered tools plus per-subset caches of the prompt built from them
+
+    Usage:
+        TOOL_REGISTRY = ToolRegistry()
+
+        @TOOL_REGISTRY.tool
+        def control_fan(state: Literal["on", "off"]):
+            ...
+    """
+
+    def __init__(self, system_template=DEFAULT_SYSTEM_TEMPLATE):
+        """
+        Args:
+            system_template (str): System prompt with a `{tools}` placeholder
+                for the JSON tool list
+        """
+        self.system_template = system_template
+        self.functions = {}  # tool name -> callable, in registration order
+        self.cacheable = set()  # read-only tools whose results may be cached
+        self._schemas = {}
+        self._messages = {}
+        self._prompt_ids = {}
+        self._lock = threading.Lock()
+
+    def tool(self, function=None, *, name=None, description=None, cacheable=False):
+        """
+        Decorator registering a tool; usable bare or with arguments
+
+        Args:
+            name (str): Tool name, defaults to the function name
+            description (str): Overrides the docstring's first paragraph
+            cacheable (bool): The tool only reads state, so its result may be
+                reused until that state changes (never set for actuators)
+        """
+        def register(function):
+            tool_name = name or function.__name__
+            schema = function_schema(function, tool_name, description)
+            with self._lock:
+                self.functions[tool_name] = function
+                self._schemas[tool_name] = schema
+                if cacheable:
+                    self.cacheable.add(tool_name)
+                else:
+                    self.cacheable.discard(tool_name)
+                # Every cached prompt may list the changed tool
+                self._messages.clear()
+                self._prompt_ids.clear()
+            return function
+
+        return register(function) if function is not None else register
+
+    def key(self, names=None):
+        """
+        Canonical form of a tool subset: names in registration order
+
+        Args:
+            names (iterable): Enabled tool names, None for every tool
+
+        Raises:
+            KeyError: If a name is not registered
+        """
+        if names is None:
+            return tuple(self.functions)
+        unknown = set(names) - set(self.functions)
+        if unknown:
+            raise KeyError(f"Unknown tools: {', '.join(sorted(unknown))}")
+        return tuple(tool_name for tool_name in self.functions if tool_name in names)
+
+    def schemas(self, names=None):
+        """JSON schemas of the enabled tools"""
+        return [self._schemas[tool_name] for tool_name in self.key(names)]
+
+    def system_message(self, names=None):
+        """System prompt listing the enabled tools, rendered once per subset"""
+        key = self.key(names)
+        message = self._messages.get(key)
+        if message is None:
+            message = self.system_template.format(tools=json.dumps(self.schemas(key)))
+            self._messages[key] = message
+        return message
+
+    def prompt_ids(self, tokenizer, names=None):
+        """
+        Token ids of the system turn (chat template applied), tokenized once
+        per subset and tokenizer
+
+        Returns:
+            list: Ids a conversation with these tools starts with
+        """
+        key = (self.key(names), id(tokenizer))
+        ids = self._prompt_ids.get(key)
+        if ids is None:
+            ids = list(tokenizer.apply_chat_template(
+                [{"role": "system", "content": self.system_message(key[0])}],
+                add_generation_prompt=False,
+                tokenize=True,
+            ))
+            self._prompt_ids[key] = ids
+            logger.info(f"Tokenized tool prompt for {', '.join(key[0]) or 'no tools'}: {len(ids)} tokens")
+        return ids
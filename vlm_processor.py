@@ -7,9 +7,14 @@ from transformers import AutoProcessor, AutoModelForImageTextToText, AutoModelFo
 from PIL import Image
 import torch
 import json
+import hashlib
 import logging
 import traceback
 import os
+import time
+
+import metrics
+import sensor_db
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -68,6 +73,10 @@ Analyze the image now and return the JSON response."""
                 ],
             },
         ]
+        
+        # Short content hash of the prompt, stored with each reading
+        prompt_text = self.conversation_template[0]["content"][1]["text"]
+        self.prompt_version = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:12]
     
     def initialize_models(self):
         """Initialize VLM models - should be called once at startup"""
@@ -99,6 +108,9 @@ Analyze the image now and return the JSON response."""
             
             # self.tokenizer_vlm = AutoTokenizer.from_pretrained(self.model_id_llm)
             
+            metrics.MODEL_MEMORY_BYTES.labels("vlm").set_function(
+                lambda: metrics.model_memory_bytes(self.model_vlm))
+
             self.is_initialized = True
             logger.info("VLM models initialized successfully!")
             
@@ -117,7 +129,8 @@ Analyze the image now and return the JSON response."""
             pil_image (PIL.Image): PIL Image object
             
         Returns:
-            dict: Processing result with gauge readings and metadata
+            dict: Processing result with gauge readings, metadata and a
+                'timings' block (see `summarize_generation`)
         """
         if not self.is_initialized:
             return {
@@ -128,7 +141,10 @@ Analyze the image now and return the JSON response."""
             }
         
         try:
+            timings = {}
+
             # Load and prepare image
+            load_start = time.perf_counter()
             if pil_image is not None:
                 image = pil_image
             elif image_path is not None:
@@ -141,9 +157,15 @@ Analyze the image now and return the JSON response."""
                     'raw_response': None
                 }
             
+            image.load()
+            convert_start = time.perf_counter()
+            timings['image_load'] = convert_start - load_start
+            
             # Ensure RGB format
             if image.mode != "RGB":
                 image = image.convert("RGB")
+            timings['rgb_convert'] = time.perf_counter() - convert_start
+            metrics.observe_stage("image_decode", timings['image_load'] + timings['rgb_convert'])
             
             # Prepare conversation with image
             conversation = self.conversation_template.copy()
@@ -151,6 +173,7 @@ Analyze the image now and return the JSON response."""
             
             # Process with VLM
             logger.info("Processing image with VLM...")
+            preprocess_start = time.perf_counter()
             inputs = self.processor_vlm.apply_chat_template(
                 conversation,
                 add_generation_prompt=True,
@@ -158,9 +181,14 @@ Analyze the image now and return the JSON response."""
                 return_dict=True,
                 tokenize=True,
             ).to(self.model_vlm.device)
+            timings['preprocess'] = time.perf_counter() - preprocess_start
+            metrics.observe_stage("preprocess", timings['preprocess'])
             
             # Generate response
-            outputs = self.model_vlm.generate(**inputs, max_new_tokens=512)
+            streamer = metrics.GenerationTimer()
+            outputs = self.model_vlm.generate(**inputs, max_new_tokens=512, streamer=streamer)
+            streamer.record_metrics()
+            timings.update(self.summarize_generation(inputs, outputs, streamer))
             decoded = self.processor_vlm.batch_decode(outputs, skip_special_tokens=True)[0]
             
             # Extract assistant's response
@@ -172,13 +200,21 @@ Analyze the image now and return the JSON response."""
             logger.info(f"VLM Raw Response: {response}")
             
             # Parse JSON response
+            parse_start = time.perf_counter()
             gauge_readings = self.parse_gauge_response(response)
+            timings['parse'] = time.perf_counter() - parse_start
+            metrics.observe_stage("parse", timings['parse'])
+            if gauge_readings is None:
+                metrics.PARSE_FAILURES_TOTAL.labels("vlm").inc()
             
             return {
                 'success': True,
                 'error': None,
                 'gauge_readings': gauge_readings,
-                'raw_response': response
+                'raw_response': response,
+                'model': self.model_id_vlm,
+                'prompt_version': self.prompt_version,
+                'timings': {k: round(v, 4) if isinstance(v, float) else v for k, v in timings.items()}
             }
             
         except Exception as e:
@@ -193,6 +229,39 @@ Analyze the image now and return the JSON response."""
                 'raw_response': None
             }
     
+    def summarize_generation(self, inputs, outputs, streamer):
+        """
+        Build the token and latency part of the timing block
+        
+        Args:
+            inputs (BatchFeature): Processor output passed to generate
+            outputs (torch.Tensor): Generated sequences including the prompt
+            streamer (metrics.GenerationTimer): Timer used during generation
+            
+        Returns:
+            dict: Token counts, prefill/decode durations, time-to-first-token
+                and decode tokens per second
+        """
+        input_ids = inputs["input_ids"]
+        prompt_tokens = int(input_ids.shape[-1])
+        generated_tokens = int(outputs.shape[-1]) - prompt_tokens
+        
+        image_token = getattr(self.processor_vlm, "image_token", None)
+        image_tokens = 0
+        if image_token is not None:
+            image_token_id = self.processor_vlm.tokenizer.convert_tokens_to_ids(image_token)
+            image_tokens = int((input_ids == image_token_id).sum().item())
+        
+        summary = {
+            'prompt_tokens': prompt_tokens,
+            'image_tokens': image_tokens,
+            'generated_tokens': generated_tokens,
+            'time_to_first_token': streamer.time_to_first_token,
+            'decode': streamer.decode_time,
+            'tokens_per_second': streamer.tokens_per_second,
+        }
+        return summary
+    
     def parse_gauge_response(self, response):
         """
         Parse the VLM response and extract gauge readings
@@ -216,7 +285,7 @@ Analyze the image now and return the JSON response."""
                 gauge_data = json.loads(json_str)
                 
                 # Validate expected structure
-                expected_keys = ['rain_gauge', 'thermometer', 'pressure_gauge']
+                expected_keys = sensor_db.GAUGE_NAMES
                 if all(key in gauge_data for key in expected_keys):
                     return gauge_data
                 else: